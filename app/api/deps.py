@@ -5,17 +5,19 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jwt import ExpiredSignatureError, InvalidSignatureError, DecodeError
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core import security
 from app.core.config import settings
 from app.core.logger import logger
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
 from app.models.user import User
 from app.schemas.common import TokenPayload
 
 reusable_oauth2 = HTTPBearer()
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[HTTPAuthorizationCredentials, Depends(reusable_oauth2)]
 
 
@@ -23,7 +25,7 @@ def get_auth_token(token_data: TokenDep) -> str:
     return token_data.credentials
 
 
-def get_current_user(session: SessionDep, token: str = Depends(get_auth_token)) -> User:
+def decode_access_token(token: str) -> TokenPayload:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
@@ -37,7 +39,7 @@ def get_current_user(session: SessionDep, token: str = Depends(get_auth_token))
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid access token"
             )
 
-        token_data = TokenPayload(**payload)
+        return TokenPayload(**payload)
 
     except (
         ExpiredSignatureError,
@@ -51,7 +53,8 @@ def get_current_user(session: SessionDep, token: str = Depends(get_auth_token))
             detail="Could not validate credentials",
         )
 
-    user = session.get(User, token_data.sub)
+
+def check_user(user: User | None) -> User:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -61,6 +64,18 @@ def get_current_user(session: SessionDep, token: str = Depends(get_auth_token))
     return user
 
 
+def get_current_user(session: SessionDep, token: str = Depends(get_auth_token)) -> User:
+    token_data = decode_access_token(token)
+    return check_user(session.get(User, token_data.sub))
+
+
+async def get_current_user_async(
+    session: AsyncSessionDep, token: str = Depends(get_auth_token)
+) -> User:
+    token_data = decode_access_token(token)
+    return check_user(await session.get(User, token_data.sub))
+
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
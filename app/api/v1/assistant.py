@@ -1,16 +1,19 @@
+import uuid
 from typing import List
 
 from fastapi import (
     APIRouter,
+    BackgroundTasks,
     Depends,
     File,
     UploadFile,
     HTTPException,
+    Query,
     status,
     Response,
 )
 
-from app.api.deps import get_current_user, SessionDep
+from app.api.deps import get_current_user_async, AsyncSessionDep
 from app.models.user import User
 from app.schemas.assistant import (
     AssistantCreate,
@@ -18,6 +21,7 @@ from app.schemas.assistant import (
     AssistantPublic,
     AssistantUpdate,
 )
+from app.schemas.ingestion import IngestionJobPublic, KnowledgeDocumentPage
 from app.crud.assistant import (
     create_assistant_service,
     get_all_assistants_service,
@@ -25,8 +29,30 @@ from app.crud.assistant import (
     delete_assistant_by_id_service,
     update_assistant_service,
 )
-from app.services.rag import add_doc_to_vector_store, files_in_collection
-from app.core.logger import logger
+from app.crud.ingestion_job import (
+    cancel_ingestion_job_service,
+    create_ingestion_job_service,
+    get_ingestion_job_service,
+    get_ingestion_jobs_service,
+    retry_ingestion_job_service,
+)
+from app.crud.knowledge_document import (
+    delete_document_service,
+    get_documents_service,
+    lock_knowledge_base,
+)
+from app.services.audio_cache import DEFAULT_FIRST_MESSAGE, audio_cache
+from app.services.assistant_cache import assistant_config_cache
+from app.services.ingestion import (
+    delete_unreferenced_job_chunks,
+    get_upload_path,
+    ingestion_queue,
+    save_upload,
+)
+from app.services.rag import delete_chunks
+from app.services.response_cache import response_cache
+from app.services.retrieval import refresh_lexical_index
+from app.core.concurrency import run_blocking
 
 
 routes = APIRouter(prefix="/assistant", tags=["Assistant"])
@@ -35,27 +61,35 @@ routes = APIRouter(prefix="/assistant", tags=["Assistant"])
 @routes.post("", description="Create Assistant", response_model=AssistantID)
 async def create_assistant(
     assistant: AssistantCreate,
-    session: SessionDep,
-    current_user: User = Depends(get_current_user),
+    session: AsyncSessionDep,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user_async),
 ):
     """
     Create new user assistant based on the settings
     """
-    assistant = create_assistant_service(
+    assistant = await create_assistant_service(
         assistant_create=assistant, session=session, current_user=current_user
     )
+    background_tasks.add_task(
+        audio_cache.prerender,
+        assistant.first_message or DEFAULT_FIRST_MESSAGE,
+        assistant.voice,
+    )
     return assistant
 
 
 @routes.get("", description="Get All Assistants", response_model=List[AssistantPublic])
 async def get_all_assistants(
-    session: SessionDep,
-    current_user: User = Depends(get_current_user),
+    session: AsyncSessionDep,
+    current_user: User = Depends(get_current_user_async),
 ):
     """
     Retrieve all assistants for the current user.
     """
-    assistants = get_all_assistants_service(session=session, current_user=current_user)
+    assistants = await get_all_assistants_service(
+        session=session, current_user=current_user
+    )
     return assistants
 
 
@@ -66,13 +100,13 @@ async def get_all_assistants(
 )
 async def get_assistant(
     assistant_id: str,
-    session: SessionDep,
-    current_user: User = Depends(get_current_user),
+    session: AsyncSessionDep,
+    current_user: User = Depends(get_current_user_async),
 ):
     """
     Retrieve a single assistant by its ID for the current user.
     """
-    assistant = get_assistant_by_id_service(
+    assistant = await get_assistant_by_id_service(
         session=session, current_user=current_user, assistant_id=assistant_id
     )
 
@@ -85,18 +119,24 @@ async def get_assistant(
 async def edit_assistant(
     assistant_id: str,
     assistant_update: AssistantUpdate,
-    session: SessionDep,
-    current_user: User = Depends(get_current_user),
+    session: AsyncSessionDep,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user_async),
 ):
     """
     Update an assistant's details.
     """
-    assistant = update_assistant_service(
+    assistant = await update_assistant_service(
         session=session,
         current_user=current_user,
         assistant_id=assistant_id,
         assistant_update=assistant_update,
     )
+    background_tasks.add_task(
+        audio_cache.prerender,
+        assistant.first_message or DEFAULT_FIRST_MESSAGE,
+        assistant.voice,
+    )
     return assistant
 
 
@@ -107,14 +147,14 @@ async def edit_assistant(
 )
 async def delete_assistant(
     assistant_id: str,
-    session: SessionDep,
-    current_user=Depends(get_current_user),
+    session: AsyncSessionDep,
+    current_user=Depends(get_current_user_async),
 ):
     """
     Delete a single assistant by its ID for the current user.
     Also deletes associated data from ChromaDB.
     """
-    delete_assistant_by_id_service(
+    await delete_assistant_by_id_service(
         session=session, current_user=current_user, assistant_id=assistant_id
     )
 
@@ -123,44 +163,183 @@ async def delete_assistant(
 
 @routes.get(
     "/{assistant_id}/knowledge_base",
-    description="Get Vector store file names of assistant",
-    response_model=List[str],
+    description="Get the documents in the knowledge base of an assistant",
+    response_model=KnowledgeDocumentPage,
 )
-async def get_assistant_knowledgebase(assistant_id: str):
+async def get_assistant_knowledgebase(
+    assistant_id: str,
+    session: AsyncSessionDep,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user_async),
+):
     """
-    Retrieve vector store file names of assistant
+    Retrieve a page of the assistant's knowledge base documents, with their
+    chunk counts, sizes and ingestion times.
     """
-    files = files_in_collection(str(assistant_id))
+    assistant = await get_assistant_by_id_service(
+        session=session, current_user=current_user, assistant_id=assistant_id
+    )
+    documents, total = await get_documents_service(
+        session=session, assistant_id=assistant.id, offset=offset, limit=limit
+    )
 
-    return files
+    return KnowledgeDocumentPage(
+        items=documents, total=total, offset=offset, limit=limit
+    )
 
 
 @routes.post(
     "/{assistant_id}/upload_document",
     description="Upload pdf files in assistant knowledge base",
-    response_model=str,
+    response_model=IngestionJobPublic,
+    status_code=status.HTTP_202_ACCEPTED,
 )
 async def upload_document(
-    session: SessionDep,
+    session: AsyncSessionDep,
     assistant_id: str,
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_async),
 ):
     """
-    Uploads a document via FormData and add it to vector store
+    Store an uploaded pdf and queue a job that adds it to the vector store.
+    Poll the returned job for progress. Files over MAX_UPLOAD_SIZE_BYTES are
+    rejected with 413 by UploadSizeLimitMiddleware.
     """
-
-    assistant = get_assistant_by_id_service(
+    assistant = await get_assistant_by_id_service(
         session=session, current_user=current_user, assistant_id=assistant_id
     )
 
+    job_id = uuid.uuid4()
+    file_path = get_upload_path(job_id)
     try:
-        await add_doc_to_vector_store(file, str(assistant.id))
-    except Exception as e:
-        logger.error(e)
+        content_hash = await run_blocking(save_upload, file.file, file_path)
+    except ValueError as e:
         raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail="Failed to upload document to vector store",
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e)
+        )
+    job = await create_ingestion_job_service(
+        session=session,
+        job_id=job_id,
+        assistant_id=assistant.id,
+        file_name=file.filename or f"{job_id}.pdf",
+        file_path=file_path,
+        content_hash=content_hash,
+    )
+    ingestion_queue.enqueue(job.id)
+
+    return job
+
+
+@routes.get(
+    "/{assistant_id}/ingestion_jobs",
+    description="Get the document ingestion jobs of an assistant",
+    response_model=List[IngestionJobPublic],
+)
+async def get_ingestion_jobs(
+    assistant_id: str,
+    session: AsyncSessionDep,
+    current_user: User = Depends(get_current_user_async),
+):
+    assistant = await get_assistant_by_id_service(
+        session=session, current_user=current_user, assistant_id=assistant_id
+    )
+    return await get_ingestion_jobs_service(session=session, assistant_id=assistant.id)
+
+
+@routes.get(
+    "/{assistant_id}/ingestion_jobs/{job_id}",
+    description="Get the status and progress of a document ingestion job",
+    response_model=IngestionJobPublic,
+)
+async def get_ingestion_job(
+    assistant_id: str,
+    job_id: str,
+    session: AsyncSessionDep,
+    current_user: User = Depends(get_current_user_async),
+):
+    assistant = await get_assistant_by_id_service(
+        session=session, current_user=current_user, assistant_id=assistant_id
+    )
+    return await get_ingestion_job_service(
+        session=session, assistant_id=assistant.id, job_id=job_id
+    )
+
+
+@routes.post(
+    "/{assistant_id}/ingestion_jobs/{job_id}/cancel",
+    description="Cancel a queued or running document ingestion job",
+    response_model=IngestionJobPublic,
+)
+async def cancel_ingestion_job(
+    assistant_id: str,
+    job_id: str,
+    session: AsyncSessionDep,
+    current_user: User = Depends(get_current_user_async),
+):
+    assistant = await get_assistant_by_id_service(
+        session=session, current_user=current_user, assistant_id=assistant_id
+    )
+    job = await get_ingestion_job_service(
+        session=session, assistant_id=assistant.id, job_id=job_id
+    )
+    job = await cancel_ingestion_job_service(session=session, job=job)
+    ingestion_queue.cancel(job.id)
+    # Also removes chunks of earlier attempts, or of a job running elsewhere
+    await delete_unreferenced_job_chunks(assistant.id, job.id)
+
+    return job
+
+
+@routes.post(
+    "/{assistant_id}/ingestion_jobs/{job_id}/retry",
+    description="Queue a failed or cancelled document ingestion job again",
+    response_model=IngestionJobPublic,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def retry_ingestion_job(
+    assistant_id: str,
+    job_id: str,
+    session: AsyncSessionDep,
+    current_user: User = Depends(get_current_user_async),
+):
+    assistant = await get_assistant_by_id_service(
+        session=session, current_user=current_user, assistant_id=assistant_id
+    )
+    job = await get_ingestion_job_service(
+        session=session, assistant_id=assistant.id, job_id=job_id
+    )
+    job = await retry_ingestion_job_service(session=session, job=job)
+    ingestion_queue.enqueue(job.id)
+
+    return job
+
+
+@routes.delete(
+    "/{assistant_id}/documents/{document_id}",
+    description="Delete a document from the knowledge base of an assistant",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def delete_document(
+    assistant_id: str,
+    document_id: str,
+    session: AsyncSessionDep,
+    current_user: User = Depends(get_current_user_async),
+):
+    """
+    Delete a document and the chunks no other document of the assistant uses.
+    """
+    assistant = await get_assistant_by_id_service(
+        session=session, current_user=current_user, assistant_id=assistant_id
+    )
+    # Running ingestion jobs check chunks for reuse under the same lock
+    async with lock_knowledge_base(assistant.id):
+        removed_hashes = await delete_document_service(
+            session=session, assistant_id=assistant.id, document_id=document_id
         )
+        await run_blocking(delete_chunks, str(assistant.id), removed_hashes)
+    response_cache.invalidate(str(assistant.id))
+    refresh_lexical_index(str(assistant.id))
+    await assistant_config_cache.invalidate(str(assistant.id))
 
-    return "Document added to vector store."
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
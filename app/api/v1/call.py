@@ -1,42 +1,98 @@
 import json
 import base64
+from functools import partial
+from uuid import uuid4
 
-from fastapi import APIRouter, WebSocket
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
 from twilio.rest import Client
 
 from app.services.transcriber import DeepgramTranscriber
 from app.core.logger import logger
 from app.core.config import settings
-from app.models.assistant import Assistant
-from app.api.deps import SessionDep
+from app.services.assistant_cache import assistant_config_cache
+from app.services.call_registry import NodeInfo, call_registry
 
 
 routes = APIRouter(prefix="/call", tags=["Call"])
 
 
+def get_node_websocket_url(node: NodeInfo, path: str) -> str:
+    """
+    :return: The websocket URL of ``path`` on another node.
+    """
+    base = node.url.rstrip("/")
+    if base.startswith("http"):
+        base = "ws" + base[len("http") :]
+    return f"{base}{path}"
+
+
+async def reject_call(websocket: WebSocket):
+    """
+    Turn away a call this node has no capacity for. Web clients are told
+    which node to reconnect to when another one has room.
+    """
+    node = await call_registry.choose_node()
+    if node is not None and node.node_id != call_registry.node_id and node.url:
+        url = get_node_websocket_url(node, websocket.url.path)
+        if websocket.url.query:
+            url = f"{url}?{websocket.url.query}"
+        await websocket.send_json({"event": "redirect", "url": url})
+    await websocket.close(
+        code=status.WS_1013_TRY_AGAIN_LATER, reason="Call capacity reached"
+    )
+
+
 @routes.websocket("/web_call")
-async def web_call(websocket: WebSocket, assistant_id: str, session: SessionDep):
-    assistant = session.query(Assistant).filter(Assistant.id == assistant_id).first()
+async def web_call(websocket: WebSocket, assistant_id: str):
+    assistant = await assistant_config_cache.get(assistant_id)
+    if assistant is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
     await websocket.accept()
-    deepgram_transcriber = DeepgramTranscriber(websocket, assistant)
-    await deepgram_transcriber.start()
+    call_id = uuid4().hex
+    close = partial(websocket.close, code=status.WS_1012_SERVICE_RESTART)
+    if not await call_registry.admit(call_id, assistant_id, "web", close=close):
+        await reject_call(websocket)
+        return
+
+    deepgram_transcriber = DeepgramTranscriber(websocket, assistant, call_id=call_id)
     try:
+        await deepgram_transcriber.start()
         await deepgram_transcriber.send_first_message()
         while True:
             audio_data = await websocket.receive_bytes()
             await deepgram_transcriber.send(audio_data)
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         logger.error(f"Error occured in web call socket {e}")
-        await deepgram_transcriber.stop()
+    finally:
+        # The call is released even if stopping the transcriber fails, so a
+        # drain does not wait for it until the timeout
+        try:
+            await deepgram_transcriber.stop()
+        finally:
+            await call_registry.release(call_id)
 
 
 @routes.post("/phone_call")
 async def make_call(assistant_id: str, phone_number: str):
+    node = await call_registry.choose_node()
+    if node is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No capacity for new calls",
+        )
+    stream_url = settings.NGROK_URL
+    if node.node_id != call_registry.node_id and node.url:
+        stream_url = get_node_websocket_url(node, "/api/call/stream")
+
     twilio_client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
     twiml = (
         f"""<Response>
                     <Connect>
-                        <Stream url="{settings.NGROK_URL}">
+                        <Stream url="{stream_url}">
                             <Parameter name="assistant_id" value="{assistant_id}"/>
                         </Stream>
                     </Connect>
@@ -54,11 +110,13 @@ async def make_call(assistant_id: str, phone_number: str):
 
 
 @routes.websocket("/stream")
-async def stream_audio(websocket: WebSocket, session: SessionDep):
+async def stream_audio(websocket: WebSocket):
     """Handles WebSocket connections from Twilio Media Streams."""
 
     logger.info("Connected to Twilio Media Stream")
     await websocket.accept()
+    deepgram_transcriber = None
+    call_id = None
 
     try:
         while True:
@@ -69,13 +127,28 @@ async def stream_audio(websocket: WebSocket, session: SessionDep):
                 streamSid = message["start"]["streamSid"]
                 assistant_id = message["start"]["customParameters"]["assistant_id"]
 
-                assistant = (
-                    session.query(Assistant)
-                    .filter(Assistant.id == assistant_id)
-                    .first()
-                )
+                assistant = await assistant_config_cache.get(assistant_id)
+                if assistant is None:
+                    logger.error(f"Unknown assistant {assistant_id} for Twilio stream")
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    return
+
+                call_id = message["start"].get("callSid") or streamSid
+                close = partial(websocket.close, code=status.WS_1012_SERVICE_RESTART)
+                if not await call_registry.admit(
+                    call_id, assistant_id, "twilio", close=close
+                ):
+                    logger.warning(f"Rejected Twilio call {call_id}, node is full")
+                    call_id = None
+                    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                    return
+
                 deepgram_transcriber = DeepgramTranscriber(
-                    websocket, assistant, call_type="twilio", sid=streamSid
+                    websocket,
+                    assistant,
+                    call_type="twilio",
+                    sid=streamSid,
+                    call_id=call_id,
                 )
                 await deepgram_transcriber.start()
                 await deepgram_transcriber.send_first_message()
@@ -87,8 +160,21 @@ async def stream_audio(websocket: WebSocket, session: SessionDep):
                     if deepgram_transcriber:
                         await deepgram_transcriber.send(payload)
 
+            elif event == "mark":
+                if deepgram_transcriber:
+                    deepgram_transcriber.on_mark(message["mark"]["name"])
+
             elif event == "stop":
-                await deepgram_transcriber.stop()
+                break
 
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
-        print("Error handling Twilio stream:", e)
+        logger.error(f"Error handling Twilio stream: {e}")
+    finally:
+        try:
+            if deepgram_transcriber is not None:
+                await deepgram_transcriber.stop()
+        finally:
+            if call_id is not None:
+                await call_registry.release(call_id)
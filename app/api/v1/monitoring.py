@@ -0,0 +1,88 @@
+from dataclasses import asdict
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.api.deps import get_current_active_superuser
+from app.core.telemetry import telemetry
+from app.db.pool import pool_metrics
+from app.services.assistant_cache import assistant_config_cache
+from app.services.call_registry import call_registry
+from app.services.chat_model import history_manager, retriever
+from app.services.rag import get_embedding_executor, get_embeddings
+from app.services.response_cache import response_cache
+
+
+routes = APIRouter(
+    prefix="/monitoring",
+    tags=["Monitoring"],
+    dependencies=[Depends(get_current_active_superuser)],
+)
+
+
+@routes.get(
+    "/db_pool", description="Database pool metrics", status_code=status.HTTP_200_OK
+)
+async def get_db_pool_metrics():
+    """
+    Checkout counts, wait times and current usage of each database pool.
+    """
+    return {name: metrics.snapshot() for name, metrics in pool_metrics.items()}
+
+
+@routes.get(
+    "/latency",
+    description="Latency percentiles of conversation turn stages",
+    status_code=status.HTTP_200_OK,
+)
+async def get_latency_metrics():
+    """
+    Count, total and p50/p95/p99 durations in seconds of every turn stage.
+    """
+    return telemetry.snapshot()
+
+
+@routes.get(
+    "/caches",
+    description="Cache, history and embedding metrics of the worker",
+    status_code=status.HTTP_200_OK,
+)
+async def get_cache_metrics():
+    """
+    Hit rates of the worker's caches, prompt tokens per turn, retrieval
+    results and the embedding batches of ingestion with their retries.
+    """
+    return {
+        "query_embeddings": get_embeddings().stats(),
+        "response_cache": response_cache.stats(),
+        "assistant_configs": assistant_config_cache.stats(),
+        "history": history_manager.stats(),
+        "retrieval": retriever.stats(),
+        "embedding_executor": get_embedding_executor().stats(),
+    }
+
+
+@routes.get(
+    "/calls", description="Active calls of every node", status_code=status.HTTP_200_OK
+)
+async def get_call_metrics():
+    """
+    Calls of the worker serving the request, and the load of every live node.
+    """
+    return {
+        "worker": call_registry.stats(),
+        "nodes": [asdict(node) for node in await call_registry.get_nodes()],
+    }
+
+
+@routes.get(
+    "/calls/{call_id}",
+    description="Node and worker running a call",
+    status_code=status.HTTP_200_OK,
+)
+async def locate_call(call_id: str):
+    call = await call_registry.locate(call_id)
+    if call is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Call not found"
+        )
+    return asdict(call)
@@ -1,6 +1,6 @@
 from fastapi.routing import APIRouter
 
-from app.api.v1 import user, auth, call, assistant
+from app.api.v1 import user, auth, call, assistant, monitoring
 
 routes = APIRouter(prefix="/v1")
 
@@ -8,3 +8,4 @@ routes.include_router(auth.routes)
 routes.include_router(user.routes)
 routes.include_router(call.routes)
 routes.include_router(assistant.routes)
+routes.include_router(monitoring.routes)
@@ -0,0 +1,31 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from app.core.config import settings
+
+
+# Bounded pool for library calls that have no async variant (Chroma, PDF
+# parsing). Sharing it keeps a burst of calls from spawning unbounded threads.
+blocking_executor = ThreadPoolExecutor(
+    max_workers=settings.BLOCKING_EXECUTOR_WORKERS, thread_name_prefix="blocking"
+)
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking function on the shared executor and await its result.
+
+    :param func: The synchronous callable to run.
+    :param args: Positional arguments passed to the callable.
+    :param kwargs: Keyword arguments passed to the callable.
+
+    :return: The value returned by the callable.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, partial(func, *args, **kwargs))
+
+
+def shutdown_blocking_executor():
+    blocking_executor.shutdown(wait=False, cancel_futures=True)
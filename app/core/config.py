@@ -29,6 +29,12 @@ class Settings(BaseSettings):
 
     ENVIRONMENT: Literal["local", "staging", "production"] = "local"
 
+    LOG_LEVEL: str = "INFO"
+    # json writes every log record as one JSON object per line
+    LOG_FORMAT: Literal["text", "json"] = "text"
+    # Export turn traces through the OpenTelemetry SDK, if it is installed
+    OTEL_ENABLED: bool = False
+
     SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 3600 * 30
@@ -46,11 +52,104 @@ class Settings(BaseSettings):
     TWILIO_PHONE_NUMBER: str
     NGROK_URL: str
 
+    # Base URL of the Deepgram STT and TTS APIs, pointed at stubs by benchmarks
+    DEEPGRAM_API_URL: str = "https://api.deepgram.com"
+    TTS_TIMEOUT_SECONDS: float = 10.0
+    TTS_CONNECT_TIMEOUT_SECONDS: float = 3.0
+    TTS_MAX_RETRIES: int = 2
+    TTS_RETRY_BACKOFF_SECONDS: float = 0.2
+    TTS_MAX_CONNECTIONS: int = 100
+    TTS_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    TTS_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    TTS_CHUNK_SIZE: int = 4096
+
+    BLOCKING_EXECUTOR_WORKERS: int = 16
+    MAX_CONCURRENT_LLM_REQUESTS: int = 64
+    MAX_CONCURRENT_TURNS_PER_CALL: int = 1
+
+    CHROMA_PERSIST_DIRECTORY: str = "./chroma"
+    # Open Chroma collection handles kept per worker
+    VECTOR_STORE_CACHE_SIZE: int = 256
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_TTL_SECONDS: float = 7 * 24 * 3600
+    EMBEDDING_CACHE_DIR: str | None = None
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES: int = 200000
+
+    RAG_TOP_K: int = 5
+    # Chunks each of the vector and lexical searches return before fusion
+    RAG_CANDIDATES: int = 20
+    RAG_MIN_SIMILARITY: float = 0.75
+    RAG_MIN_LEXICAL_SCORE: float = 1.0
+    RAG_CONTEXT_TOKEN_BUDGET: int = 800
+    RAG_LEXICAL_INDEX_CACHE_SIZE: int = 256
+    RAG_LEXICAL_INDEX_TTL_SECONDS: float = 3600
+
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    RESPONSE_CACHE_TTL_SECONDS: float = 24 * 3600
+    RESPONSE_CACHE_MAX_ENTRIES_PER_ASSISTANT: int = 500
+    RESPONSE_CACHE_MAX_ASSISTANTS: int = 1000
+    RESPONSE_CACHE_MIN_QUESTION_WORDS: int = 3
+
+    AUDIO_CACHE_DIR: str = "./audio_cache"
+    AUDIO_CACHE_SIZE: int = 2000
+    TWILIO_AUDIO_LEAD_SECONDS: float = 0.2
+
+    REDIS_URL: str = "redis://localhost:6379/0"
+    CONVERSATION_STORE_BACKEND: Literal["memory", "redis"] = "memory"
+    CONVERSATION_TTL_SECONDS: float = 2 * 3600
+    CONVERSATION_STORE_MAX_SESSIONS: int = 10000
+    HISTORY_TOKEN_BUDGET: int = 3000
+
+    CALL_STORE_BACKEND: Literal["memory", "redis"] = "memory"
+    # Defaults to the hostname; workers of a node share its call capacity
+    NODE_ID: str | None = None
+    # Public base URL of this node, e.g. https://node-1.example.com, that
+    # callers are redirected to when other nodes are full
+    NODE_URL: str | None = None
+    NODE_MAX_CALLS: int = 100
+    CALL_LEASE_SECONDS: float = 30
+    CALL_HEARTBEAT_SECONDS: float = 10
+    # Time running calls get to end on shutdown; keep it below the grace
+    # period of the process manager
+    DRAIN_TIMEOUT_SECONDS: float = 60
+
+    ASSISTANT_CACHE_SIZE: int = 1000
+    ASSISTANT_CACHE_TTL_SECONDS: float = 300
+    # Publish assistant invalidations over Redis, needed with several workers
+    ASSISTANT_CACHE_PUBSUB: bool = False
+
+    INGESTION_UPLOAD_DIR: str = "./uploads"
+    MAX_UPLOAD_SIZE_BYTES: int = 250 * 1024 * 1024
+    INGESTION_WORKERS: int = 2
+    INGESTION_EMBED_CONCURRENCY: int = 4
+    EMBEDDING_BATCH_MAX_TOKENS: int = 20000
+    EMBEDDING_BATCH_MAX_SIZE: int = 512
+    # Shared by all ingestion jobs of a worker
+    EMBEDDING_MAX_CONCURRENT_BATCHES: int = 8
+    EMBEDDING_TOKENS_PER_MINUTE: int = 1000000
+    EMBEDDING_MAX_RETRIES: int = 6
+    EMBEDDING_RETRY_BACKOFF_SECONDS: float = 1.0
+
+    # Per engine; the sync and async engines each get a pool of this size
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 10
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 15000
+    DB_SLOW_CHECKOUT_SECONDS: float = 0.1
+    DB_SLOW_HOLD_SECONDS: float = 2.0
+
     @computed_field  # type: ignore[prop-decorator]
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:  # noqa
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def SQLALCHEMY_ASYNC_DATABASE_URI(self) -> str:  # noqa
+        return f"postgresql+psycopg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+
     FIRST_SUPERUSER_EMAIL: EmailStr
     FIRST_SUPERUSER_PASSWORD: str
 
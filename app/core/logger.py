@@ -1,6 +1,8 @@
 import json
 import logging
 
+from app.core.config import settings
+
 
 class JSONExtraFormatter(logging.Formatter):
     """
@@ -26,10 +28,32 @@ class JSONExtraFormatter(logging.Formatter):
         return super().format(record)
 
 
+class JSONFormatter(JSONExtraFormatter):
+    """
+    Formatter that writes each log record as a single JSON object.
+    """
+
+    def format(self, record):
+        super().format(record)
+        data = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            **json.loads(record.extra_json),
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, separators=(",", ":"), default=str)
+
+
 logger = logging.getLogger("Application Logs")
+logger.setLevel(settings.LOG_LEVEL)
 
 handler = logging.StreamHandler()
-handler.setFormatter(
-    JSONExtraFormatter("%(asctime)s - %(levelname)s - %(message)s - %(extra_json)s")
-)
+if settings.LOG_FORMAT == "json":
+    handler.setFormatter(JSONFormatter())
+else:
+    handler.setFormatter(
+        JSONExtraFormatter("%(asctime)s - %(levelname)s - %(message)s - %(extra_json)s")
+    )
 logger.addHandler(handler)
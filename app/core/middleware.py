@@ -0,0 +1,53 @@
+from fastapi import HTTPException, status
+from starlette.responses import JSONResponse
+
+
+UPLOAD_TOO_LARGE_DETAIL = "Uploaded file is too large"
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware that rejects upload requests larger than ``max_bytes``.
+
+    Requests announcing a larger Content-Length are answered with 413 before
+    any of the body is read. Bodies without a length are counted while they
+    stream in and fail with 413 once they pass the limit, so an oversized
+    upload is never spooled in full.
+    """
+
+    def __init__(self, app, max_bytes: int, path_suffix: str = "/upload_document"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_suffix = path_suffix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].endswith(self.path_suffix):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        try:
+            content_length = int(headers.get(b"content-length", 0))
+        except ValueError:
+            content_length = 0
+        if content_length > self.max_bytes:
+            response = JSONResponse(
+                {"detail": UPLOAD_TOO_LARGE_DETAIL},
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=UPLOAD_TOO_LARGE_DETAIL,
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,23 @@
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+
+
+_redis_client: aioredis.Redis | None = None
+
+
+def get_redis() -> aioredis.Redis:
+    """
+    Return the process-wide Redis client, connecting lazily on first use.
+    """
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _redis_client
+
+
+async def close_redis():
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
@@ -0,0 +1,248 @@
+import bisect
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.core.config import settings
+from app.core.logger import logger
+
+try:
+    from opentelemetry import trace
+except ImportError:  # OpenTelemetry is optional
+    trace = None
+
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    1.5,
+    2.5,
+    5.0,
+    10.0,
+)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Latency histogram of one stage.
+
+    Cumulative bucket counts are exported for Prometheus; the percentiles are
+    computed from the latest ``window`` samples.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window: int = 1024):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+            self._samples.append(seconds)
+
+    def percentiles(self) -> dict[str, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {}
+        return {
+            f"p{round(quantile * 100)}": samples[
+                min(int(quantile * len(samples)), len(samples) - 1)
+            ]
+            for quantile in QUANTILES
+        }
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "sum": self.sum, **self.percentiles()}
+
+
+class Telemetry:
+    """
+    Latency histograms of the stages of conversational turns.
+    """
+
+    def __init__(self):
+        self.histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, Histogram())
+        histogram.observe(seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            stage: histogram.snapshot()
+            for stage, histogram in sorted(self.histograms.items())
+        }
+
+    def render_prometheus(self) -> str:
+        """
+        Render the histograms in the Prometheus text exposition format.
+        """
+        name = "voice_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Duration of the stages of conversational turns.",
+            f"# TYPE {name} histogram",
+        ]
+        for stage, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+telemetry = Telemetry()
+
+
+class Turn:
+    """
+    Trace of one conversational turn, from the final transcript to the last
+    audio sent to the caller.
+
+    Stages run in tasks that inherit the turn through ``current_turn``, so
+    ``span`` and ``record`` calls anywhere in the turn add to it.
+    """
+
+    def __init__(self, call_id: str, index: int, **attributes):
+        self.call_id = call_id
+        self.index = index
+        self.trace_id = uuid.uuid4().hex
+        self.attributes = attributes
+        self.started_at = time.perf_counter()
+        self._wall_started_at = time.time_ns()
+        self.spans: list[dict] = []
+        self._marks: set[str] = set()
+
+    def add_span(self, name: str, start: float, end: float, attributes: dict):
+        self.spans.append(
+            {
+                "name": name,
+                "start_ms": round((start - self.started_at) * 1000, 1),
+                "duration_ms": round((end - start) * 1000, 1),
+                **attributes,
+            }
+        )
+
+    def mark_once(self, name: str):
+        """
+        Record the time from the start of the turn to now, the first time only.
+        """
+        if name not in self._marks:
+            self._marks.add(name)
+            record(name, self.started_at)
+
+    def end(self, status: str = "ok"):
+        end = time.perf_counter()
+        telemetry.observe("turn", end - self.started_at)
+        logger.info(
+            "Conversation turn",
+            extra={
+                "call_id": self.call_id,
+                "turn": self.index,
+                "trace_id": self.trace_id,
+                "status": status,
+                "duration_ms": round((end - self.started_at) * 1000, 1),
+                "spans": self.spans,
+                **self.attributes,
+            },
+        )
+        if trace is not None and settings.OTEL_ENABLED:
+            self._export(end)
+
+    def _to_wall_ns(self, perf_time: float) -> int:
+        return self._wall_started_at + int((perf_time - self.started_at) * 1e9)
+
+    def _export(self, end: float):
+        """
+        Replay the turn as OpenTelemetry spans through the configured tracer
+        provider.
+        """
+        tracer = trace.get_tracer(__name__)
+        root = tracer.start_span(
+            "conversation.turn",
+            start_time=self._wall_started_at,
+            attributes={"call.id": self.call_id, "turn.index": self.index},
+        )
+        context = trace.set_span_in_context(root)
+        for span in self.spans:
+            start = self.started_at + span["start_ms"] / 1000
+            child = tracer.start_span(
+                span["name"],
+                context=context,
+                start_time=self._to_wall_ns(start),
+                attributes={
+                    key: value
+                    for key, value in span.items()
+                    if key not in ("name", "start_ms", "duration_ms")
+                },
+            )
+            child.end(end_time=self._to_wall_ns(start + span["duration_ms"] / 1000))
+        root.end(end_time=self._to_wall_ns(end))
+
+
+current_turn: ContextVar[Turn | None] = ContextVar("current_turn", default=None)
+
+
+def record(stage: str, start: float, end: float | None = None, **attributes):
+    """
+    Record a stage that ran from ``start`` to ``end``, as ``time.perf_counter``
+    values, in the stage histogram and the current turn.
+    """
+    if end is None:
+        end = time.perf_counter()
+    telemetry.observe(stage, end - start)
+    turn = current_turn.get()
+    if turn is not None:
+        turn.add_span(stage, start, end, attributes)
+
+
+@contextmanager
+def span(stage: str, **attributes):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, start, **attributes)
+
+
+@contextmanager
+def start_turn(call_id: str, index: int, **attributes):
+    """
+    Trace the code in the block, and the tasks it starts, as one turn.
+    """
+    turn = Turn(call_id, index, **attributes)
+    token = current_turn.set(turn)
+    status = "ok"
+    try:
+        yield turn
+    except BaseException as e:
+        status = type(e).__name__
+        raise
+    finally:
+        current_turn.reset(token)
+        turn.end(status)
@@ -1,42 +1,48 @@
 from fastapi import HTTPException, status
+from sqlalchemy import select
 
-from app.api.deps import SessionDep
+from app.api.deps import AsyncSessionDep
+from app.core.concurrency import run_blocking
 from app.models.assistant import Assistant
 from app.schemas.assistant import AssistantCreate, AssistantUpdate
 from app.models.user import User
+from app.services.assistant_cache import assistant_config_cache
+from app.services.rag import delete_vector_store
+from app.services.response_cache import response_cache
+from app.services.retrieval import invalidate_lexical_index
 
 
-def create_assistant_service(
-    session: SessionDep, assistant_create: AssistantCreate, current_user: User
+async def create_assistant_service(
+    session: AsyncSessionDep, assistant_create: AssistantCreate, current_user: User
 ):
     assistant_data = assistant_create.model_dump()
     assistant = Assistant()
     for key, value in assistant_data.items():
         setattr(assistant, key, value)
 
-    assistant.user = current_user
+    assistant.user_id = current_user.id
 
     session.add(assistant)
-    session.commit()
-    session.refresh(assistant)
+    await session.commit()
+    await session.refresh(assistant)
 
     return assistant
 
 
-def get_all_assistants_service(session: SessionDep, current_user: User):
-    assistants = (
-        session.query(Assistant).filter(Assistant.user_id == current_user.id).all()
+async def get_all_assistants_service(session: AsyncSessionDep, current_user: User):
+    assistants = await session.scalars(
+        select(Assistant).filter(Assistant.user_id == current_user.id)
     )
-    return assistants
+    return assistants.all()
 
 
-def get_assistant_by_id_service(
-    session: SessionDep, current_user: User, assistant_id: str
+async def get_assistant_by_id_service(
+    session: AsyncSessionDep, current_user: User, assistant_id: str
 ):
-    assistant = (
-        session.query(Assistant)
-        .filter(Assistant.id == assistant_id, Assistant.user_id == current_user.id)
-        .first()
+    assistant = await session.scalar(
+        select(Assistant).filter(
+            Assistant.id == assistant_id, Assistant.user_id == current_user.id
+        )
     )
     if not assistant:
         raise HTTPException(
@@ -46,26 +52,33 @@ def get_assistant_by_id_service(
     return assistant
 
 
-def delete_assistant_by_id_service(
-    session: SessionDep, current_user: User, assistant_id: str
+async def delete_assistant_by_id_service(
+    session: AsyncSessionDep, current_user: User, assistant_id: str
 ):
-    assistant = get_assistant_by_id_service(session, current_user, assistant_id)
-    session.delete(assistant)
-    session.commit()
+    assistant = await get_assistant_by_id_service(session, current_user, assistant_id)
+    await session.delete(assistant)
+    await session.commit()
+    await assistant_config_cache.invalidate(str(assistant.id))
+    await run_blocking(delete_vector_store, str(assistant.id))
+    invalidate_lexical_index(str(assistant.id))
 
 
-def update_assistant_service(
-    session: SessionDep,
+async def update_assistant_service(
+    session: AsyncSessionDep,
     current_user: User,
     assistant_id: str,
     assistant_update: AssistantUpdate,
 ):
-    assistant = get_assistant_by_id_service(session, current_user, assistant_id)
+    assistant = await get_assistant_by_id_service(session, current_user, assistant_id)
     assistant_data = assistant_update.model_dump(exclude_unset=True)
     for key, value in assistant_data.items():
         setattr(assistant, key, value)
 
-    session.commit()
-    session.refresh(assistant)
+    await session.commit()
+    await session.refresh(assistant)
+    await assistant_config_cache.invalidate(str(assistant.id))
+
+    if {"system_instructions", "response_cache_enabled"} & assistant_data.keys():
+        response_cache.invalidate(str(assistant.id))
 
     return assistant
@@ -0,0 +1,206 @@
+import uuid
+from datetime import datetime, timezone
+
+from fastapi import HTTPException, status
+from sqlalchemy import String, cast, func, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import AsyncSessionDep
+from app.db.session import AsyncSessionLocal
+from app.models.ingestion_job import IngestionJob
+from app.schemas.ingestion import IngestionStatus
+
+
+FINISHED_STATUSES = (
+    IngestionStatus.succeeded,
+    IngestionStatus.failed,
+    IngestionStatus.cancelled,
+)
+
+
+async def create_ingestion_job_service(
+    session: AsyncSessionDep,
+    job_id: uuid.UUID,
+    assistant_id: uuid.UUID,
+    file_name: str,
+    file_path: str,
+    content_hash: str,
+):
+    job = IngestionJob(
+        id=job_id,
+        assistant_id=assistant_id,
+        file_name=file_name,
+        file_path=file_path,
+        content_hash=content_hash,
+        status=IngestionStatus.queued,
+    )
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+
+    return job
+
+
+async def get_ingestion_jobs_service(session: AsyncSessionDep, assistant_id: uuid.UUID):
+    jobs = await session.scalars(
+        select(IngestionJob)
+        .filter(IngestionJob.assistant_id == assistant_id)
+        .order_by(IngestionJob.created_at.desc())
+    )
+    return jobs.all()
+
+
+async def get_ingestion_job_service(
+    session: AsyncSessionDep, assistant_id: uuid.UUID, job_id: str
+):
+    job = await session.scalar(
+        select(IngestionJob).filter(
+            IngestionJob.id == job_id, IngestionJob.assistant_id == assistant_id
+        )
+    )
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ingestion job not found",
+        )
+    return job
+
+
+async def cancel_ingestion_job_service(session: AsyncSessionDep, job: IngestionJob):
+    if job.status in FINISHED_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Ingestion job already {job.status}",
+        )
+
+    job.status = IngestionStatus.cancelled
+    job.finished_at = datetime.now(timezone.utc)
+    await session.commit()
+    await session.refresh(job)
+
+    return job
+
+
+async def retry_ingestion_job_service(session: AsyncSessionDep, job: IngestionJob):
+    if job.status not in (IngestionStatus.failed, IngestionStatus.cancelled):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Only failed or cancelled ingestion jobs can be retried",
+        )
+
+    job.status = IngestionStatus.queued
+    job.error = None
+    job.parsed_pages = 0
+    job.total_chunks = None
+    job.processed_chunks = 0
+    job.reused_chunks = 0
+    job.chunk_hashes = []
+    job.started_at = None
+    job.finished_at = None
+    await session.commit()
+    await session.refresh(job)
+
+    return job
+
+
+# The functions below are used by the ingestion workers, which run outside of
+# requests and open a short session per update.
+
+
+async def get_ingestion_job(job_id: uuid.UUID) -> IngestionJob | None:
+    async with AsyncSessionLocal() as session:
+        return await session.get(IngestionJob, job_id)
+
+
+async def get_queued_ingestion_job_ids() -> list[uuid.UUID]:
+    async with AsyncSessionLocal() as session:
+        job_ids = await session.scalars(
+            select(IngestionJob.id)
+            .filter(IngestionJob.status == IngestionStatus.queued)
+            .order_by(IngestionJob.created_at)
+        )
+        return list(job_ids.all())
+
+
+async def _update_job(job_id: uuid.UUID, expected_status: IngestionStatus, **values):
+    """
+    Update a job only while it is in ``expected_status``.
+
+    :return: Whether the job was updated. False means another request changed
+        its status first, e.g. cancelled it.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, IngestionJob.status == expected_status)
+            .values(**values)
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+async def claim_ingestion_job(job_id: uuid.UUID) -> bool:
+    """
+    Mark a queued job as running, so that only one worker processes it.
+    """
+    return await _update_job(
+        job_id,
+        IngestionStatus.queued,
+        status=IngestionStatus.running,
+        started_at=datetime.now(timezone.utc),
+        attempts=IngestionJob.attempts + 1,
+        chunk_hashes=[],
+    )
+
+
+async def requeue_ingestion_job(job_id: uuid.UUID) -> bool:
+    return await _update_job(
+        job_id, IngestionStatus.running, status=IngestionStatus.queued
+    )
+
+
+async def claim_chunk_hashes(
+    session: AsyncSession, job_id: uuid.UUID, chunk_hashes: list[str]
+) -> bool:
+    """
+    Add chunk ids to those a running job uses, so that deletions keep them.
+
+    Runs in the session of lock_knowledge_base, so the claim is committed
+    when the lock is released.
+
+    :return: Whether the job is still running.
+    """
+    result = await session.execute(
+        update(IngestionJob)
+        .where(
+            IngestionJob.id == job_id,
+            IngestionJob.status == IngestionStatus.running,
+        )
+        .values(
+            chunk_hashes=func.array_cat(
+                IngestionJob.chunk_hashes, cast(chunk_hashes, ARRAY(String))
+            )
+        )
+    )
+    return result.rowcount == 1
+
+
+async def update_ingestion_progress(job_id: uuid.UUID, **values) -> bool:
+    return await _update_job(job_id, IngestionStatus.running, **values)
+
+
+async def finish_ingestion_job(
+    job_id: uuid.UUID,
+    job_status: IngestionStatus,
+    error: str | None = None,
+    **values,
+) -> bool:
+    return await _update_job(
+        job_id,
+        IngestionStatus.running,
+        status=job_status,
+        error=error,
+        finished_at=datetime.now(timezone.utc),
+        **values,
+    )
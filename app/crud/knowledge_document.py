@@ -0,0 +1,197 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import AsyncSessionDep
+from app.db.session import AsyncSessionLocal
+from app.models.ingestion_job import IngestionJob
+from app.models.knowledge_document import KnowledgeDocument
+from app.schemas.ingestion import IngestionStatus
+
+
+# Time between attempts to take a knowledge base lock held by someone else
+LOCK_RETRY_SECONDS = 0.05
+
+
+async def get_referenced_chunk_hashes(
+    session: AsyncSession,
+    assistant_id: uuid.UUID,
+    exclude_document_id: uuid.UUID | None = None,
+) -> set[str]:
+    """
+    Return the chunk ids used by the assistant's documents or by its queued
+    and running ingestion jobs.
+    """
+    query = select(KnowledgeDocument.chunk_hashes).filter(
+        KnowledgeDocument.assistant_id == assistant_id
+    )
+    if exclude_document_id is not None:
+        query = query.filter(KnowledgeDocument.id != exclude_document_id)
+    job_query = select(IngestionJob.chunk_hashes).filter(
+        IngestionJob.assistant_id == assistant_id,
+        IngestionJob.status.in_((IngestionStatus.queued, IngestionStatus.running)),
+    )
+    hashes = set()
+    for chunk_hashes in await session.scalars(query.union_all(job_query)):
+        hashes.update(chunk_hashes)
+    return hashes
+
+
+@asynccontextmanager
+async def lock_knowledge_base(assistant_id: uuid.UUID) -> AsyncIterator[AsyncSession]:
+    """
+    Hold a Postgres advisory lock on the chunks of an assistant.
+
+    Chunk deletions and the reuse checks of ingestion jobs run under it, so a
+    job never reuses a chunk that is being deleted. The lock is tried and
+    retried after a short sleep rather than waited for, so waiters hold no
+    connection and are not cut off by the statement timeout.
+
+    :return: The session holding the lock. Its transaction is committed when
+        the block exits, or rolled back on an error, which releases the lock.
+    """
+    key = int.from_bytes(assistant_id.bytes[:8], "big", signed=True)
+    while True:
+        async with AsyncSessionLocal() as session:
+            if await session.scalar(select(func.pg_try_advisory_xact_lock(key))):
+                yield session
+                await session.commit()
+                return
+        await asyncio.sleep(LOCK_RETRY_SECONDS)
+
+
+async def get_documents_service(
+    session: AsyncSessionDep, assistant_id: uuid.UUID, offset: int, limit: int
+):
+    """
+    Return a page of the assistant's documents ordered by file name, and the
+    total number of documents.
+    """
+    total = await session.scalar(
+        select(func.count())
+        .select_from(KnowledgeDocument)
+        .filter(KnowledgeDocument.assistant_id == assistant_id)
+    )
+    documents = await session.scalars(
+        select(KnowledgeDocument)
+        .filter(KnowledgeDocument.assistant_id == assistant_id)
+        .order_by(KnowledgeDocument.file_name)
+        .offset(offset)
+        .limit(limit)
+    )
+    return documents.all(), total
+
+
+async def delete_document_service(
+    session: AsyncSessionDep, assistant_id: uuid.UUID, document_id: str
+) -> list[str]:
+    """
+    Remove a document from the manifest.
+
+    :return: The chunk hashes no other document of the assistant uses, which
+        should be deleted from the vector store.
+    """
+    document = await session.scalar(
+        select(KnowledgeDocument).filter(
+            KnowledgeDocument.id == document_id,
+            KnowledgeDocument.assistant_id == assistant_id,
+        )
+    )
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found",
+        )
+
+    referenced = await get_referenced_chunk_hashes(
+        session, assistant_id, exclude_document_id=document.id
+    )
+    await session.delete(document)
+    await session.commit()
+
+    return [
+        chunk_hash
+        for chunk_hash in document.chunk_hashes
+        if chunk_hash not in referenced
+    ]
+
+
+# The functions below are used by the ingestion workers.
+
+
+async def get_document_by_hash(
+    assistant_id: uuid.UUID, content_hash: str
+) -> KnowledgeDocument | None:
+    async with AsyncSessionLocal() as session:
+        return await session.scalar(
+            select(KnowledgeDocument).filter(
+                KnowledgeDocument.assistant_id == assistant_id,
+                KnowledgeDocument.content_hash == content_hash,
+            )
+        )
+
+
+async def complete_document_ingestion(
+    job: IngestionJob, chunk_hashes: list[str], size_bytes: int
+) -> list[str] | None:
+    """
+    Mark a running job as succeeded and record its document in the manifest,
+    in one transaction.
+
+    A document with the same file name is replaced by the new version.
+
+    :return: The chunk hashes the previous version used that no document uses
+        anymore, or None if the job was cancelled in the meantime.
+    """
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(IngestionJob)
+            .where(
+                IngestionJob.id == job.id,
+                IngestionJob.status == IngestionStatus.running,
+            )
+            .values(status=IngestionStatus.succeeded, finished_at=now)
+        )
+        if result.rowcount != 1:
+            await session.rollback()
+            return None
+
+        document = await session.scalar(
+            select(KnowledgeDocument)
+            .filter(
+                KnowledgeDocument.assistant_id == job.assistant_id,
+                KnowledgeDocument.file_name == job.file_name,
+            )
+            .with_for_update()
+        )
+        previous_hashes = set()
+        if document is None:
+            document = KnowledgeDocument(
+                assistant_id=job.assistant_id, file_name=job.file_name
+            )
+            session.add(document)
+        else:
+            previous_hashes = set(document.chunk_hashes)
+        document.content_hash = job.content_hash
+        document.chunk_hashes = chunk_hashes
+        document.chunk_count = len(chunk_hashes)
+        document.size_bytes = size_bytes
+        document.ingested_at = now
+        await session.flush()
+
+        referenced = await get_referenced_chunk_hashes(session, job.assistant_id)
+        await session.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job.id)
+            .values(document_id=document.id)
+        )
+        await session.commit()
+
+    return sorted(previous_hashes - referenced)
@@ -0,0 +1,183 @@
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import Engine, event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+# Route of the request being handled, used to tag slow pool checkouts
+current_route: ContextVar[str | None] = ContextVar("current_route", default=None)
+
+
+class PoolMetrics:
+    """
+    Checkout counters of one connection pool.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool: Pool | None = None
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.slow_waits = 0
+        self.hold_seconds_max = 0.0
+        self.slow_holds = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if seconds >= settings.DB_SLOW_CHECKOUT_SECONDS:
+                self.slow_waits += 1
+
+        if seconds >= settings.DB_SLOW_CHECKOUT_SECONDS:
+            logger.warning(
+                "Slow database connection checkout",
+                extra={
+                    "pool": self.name,
+                    "route": current_route.get(),
+                    "wait_seconds": round(seconds, 4),
+                    "timed_out": timed_out,
+                },
+            )
+
+    def record_hold(self, seconds: float, route: str | None):
+        with self._lock:
+            self.hold_seconds_max = max(self.hold_seconds_max, seconds)
+            if seconds >= settings.DB_SLOW_HOLD_SECONDS:
+                self.slow_holds += 1
+
+        if seconds >= settings.DB_SLOW_HOLD_SECONDS:
+            logger.warning(
+                "Database connection held for long",
+                extra={
+                    "pool": self.name,
+                    "route": route,
+                    "hold_seconds": round(seconds, 4),
+                },
+            )
+
+    def snapshot(self) -> dict:
+        data = {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_seconds": (
+                self.wait_seconds_total / self.checkouts if self.checkouts else 0.0
+            ),
+            "max_wait_seconds": self.wait_seconds_max,
+            "slow_waits": self.slow_waits,
+            "max_hold_seconds": self.hold_seconds_max,
+            "slow_holds": self.slow_holds,
+        }
+        if isinstance(self.pool, QueuePool):
+            data.update(
+                size=self.pool.size(),
+                checked_in=self.pool.checkedin(),
+                checked_out=self.pool.checkedout(),
+                overflow=max(self.pool.overflow(), 0),
+            )
+        return data
+
+
+pool_metrics: dict[str, PoolMetrics] = {}
+
+
+class _TimedPoolMixin:
+    """
+    Records how long each checkout waited for a connection.
+
+    Metrics are looked up by the pool's logging name, so they survive the pool
+    being recreated when the engine is disposed.
+    """
+
+    def _do_get(self):
+        metrics = pool_metrics[self.logging_name]
+        metrics.pool = self
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def get_pool_options(name: str, async_engine: bool = False) -> dict:
+    """
+    Return the engine keyword arguments for an instrumented pool named ``name``.
+    """
+    pool_metrics.setdefault(name, PoolMetrics(name))
+    return {
+        "poolclass": TimedAsyncAdaptedQueuePool if async_engine else TimedQueuePool,
+        "pool_logging_name": name,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": {
+            "options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+        },
+    }
+
+
+def track_connection_hold(engine: Engine, name: str):
+    """
+    Warn about connections kept out of the pool for longer than
+    DB_SLOW_HOLD_SECONDS, tagged with the route that checked them out.
+    """
+    metrics = pool_metrics[name]
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        connection_record.info["route"] = current_route.get()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            metrics.record_hold(
+                time.perf_counter() - checked_out_at,
+                connection_record.info.pop("route", None),
+            )
+
+
+class RouteTagMiddleware:
+    """
+    ASGI middleware that stores the method and path of the current request in
+    ``current_route`` for the pool warnings.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        token = current_route.set(f"{scope.get('method', 'WS')} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
@@ -1,15 +1,42 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 from sqlalchemy import create_engine, Engine
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import sessionmaker, Session
 
 from app.core.config import settings
+from app.db.pool import get_pool_options, track_connection_hold
 
-engine: Engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
+engine: Engine = create_engine(
+    settings.SQLALCHEMY_DATABASE_URI, **get_pool_options("sync")
+)
+track_connection_hold(engine, "sync")
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+async_engine: AsyncEngine = create_async_engine(
+    settings.SQLALCHEMY_ASYNC_DATABASE_URI,
+    **get_pool_options("async", async_engine=True),
+)
+track_connection_hold(async_engine.sync_engine, "async")
+
+# Objects stay usable after commit and close, so handlers can keep what they
+# loaded without holding on to a connection.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 def get_db() -> Generator[Session, None, None]:
     with SessionLocal() as session:
         yield session
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as session:
+        yield session
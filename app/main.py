@@ -1,12 +1,50 @@
-from fastapi import FastAPI, status
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.api import v1_router
+from app.core.concurrency import shutdown_blocking_executor
+from app.core.config import settings
+from app.core.middleware import UploadSizeLimitMiddleware
+from app.core.redis_client import close_redis
+from app.core.telemetry import telemetry
+from app.db.pool import RouteTagMiddleware
+from app.db.session import async_engine
+from app.services.assistant_cache import assistant_config_cache
+from app.services.audio_cache import audio_cache
+from app.services.call_registry import call_registry, drain_on_signals
+from app.services.ingestion import ingestion_queue
+from app.services.speech import close_speech_client
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    tasks = [asyncio.create_task(audio_cache.prerender_canned_phrases())]
+    if assistant_config_cache.publish:
+        tasks.append(asyncio.create_task(assistant_config_cache.listen()))
+    await ingestion_queue.start()
+    await call_registry.start()
+    drain_on_signals(call_registry, settings.DRAIN_TIMEOUT_SECONDS)
+    yield
+    await call_registry.drain(settings.DRAIN_TIMEOUT_SECONDS)
+    for task in tasks:
+        task.cancel()
+    await call_registry.stop()
+    await ingestion_queue.stop()
+    await close_speech_client()
+    await close_redis()
+    await async_engine.dispose()
+    shutdown_blocking_executor()
+
 
 app = FastAPI(
     title="Voice AI backend",
     version="0.1.0",
     description="A scalable voice AI Backend server",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -16,6 +54,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RouteTagMiddleware)
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=settings.MAX_UPLOAD_SIZE_BYTES)
 
 
 @app.get("/", status_code=status.HTTP_200_OK, tags=["Root"])
@@ -23,4 +63,25 @@ def read_root():
     return {"message": "Welcome to the Voice AI Backend"}
 
 
+@app.get("/health", status_code=status.HTTP_200_OK, tags=["Root"])
+def read_health(response: Response):
+    """
+    Readiness of this worker. Returns 503 once it drains, so load balancers
+    stop sending it calls, along with how many calls are left.
+    """
+    if call_registry.draining:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {
+        "status": "draining" if call_registry.draining else "ok",
+        **call_registry.stats(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(
+        telemetry.render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
+
+
 app.include_router(v1_router.routes, prefix="/api")
@@ -1,5 +1,13 @@
 # Import all models
 from app.models.user import User, UserAuthProviderToken
 from app.models.assistant import Assistant
+from app.models.ingestion_job import IngestionJob
+from app.models.knowledge_document import KnowledgeDocument
 
-__all__ = ["User", "UserAuthProviderToken", "Assistant"]
+__all__ = [
+    "User",
+    "UserAuthProviderToken",
+    "Assistant",
+    "IngestionJob",
+    "KnowledgeDocument",
+]
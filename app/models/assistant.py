@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean, Integer
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -14,6 +14,8 @@ class Assistant(Base):
     system_instructions = Column(String, unique=False, nullable=False)
     first_message = Column(String, unique=False, nullable=True)
     voice = Column(String, unique=False, nullable=True)
+    response_cache_enabled = Column(Boolean, default=False, nullable=False)
+    history_token_budget = Column(Integer, nullable=True)
 
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
     user_id = Column(
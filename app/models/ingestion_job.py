@@ -0,0 +1,46 @@
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+from app.db.base_class import Base
+
+
+class IngestionJob(Base):
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    assistant_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("assistant.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    file_name = Column(String, nullable=False)
+    content_hash = Column(String, nullable=False)
+    # Spooled upload, kept until the job succeeds so failed jobs can be retried
+    file_path = Column(String, nullable=False)
+    status = Column(String, nullable=False, index=True)
+    error = Column(String, nullable=True)
+
+    parsed_pages = Column(Integer, default=0, nullable=False)
+    # Known once the whole document has been parsed
+    total_chunks = Column(Integer, nullable=True)
+    processed_chunks = Column(Integer, default=0, nullable=False)
+    # Chunks that were already in the knowledge base and were not embedded again
+    reused_chunks = Column(Integer, default=0, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    # Chunk ids the current attempt has checked for reuse or written. Chunk
+    # deletions keep them while the job is queued or running.
+    chunk_hashes = Column(ARRAY(String), nullable=False, default=list)
+    document_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("knowledge_document.id", ondelete="SET NULL"),
+        nullable=True,
+    )
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<IngestionJob(file_name={self.file_name}, status={self.status})>"
@@ -0,0 +1,46 @@
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    String,
+    DateTime,
+    ForeignKey,
+    Integer,
+    UniqueConstraint,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+from app.db.base_class import Base
+
+
+class KnowledgeDocument(Base):
+    """
+    Manifest entry of a document in an assistant's knowledge base.
+
+    Chunks are stored in Chroma under the sha256 of their content, so the
+    manifest lists which chunk ids belong to each document.
+    """
+
+    __table_args__ = (UniqueConstraint("assistant_id", "file_name"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    assistant_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("assistant.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    file_name = Column(String, nullable=False)
+    content_hash = Column(String, nullable=False, index=True)
+    chunk_hashes = Column(ARRAY(String), nullable=False, default=list)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    size_bytes = Column(BigInteger, nullable=False, default=0)
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # When the current version of the document was ingested
+    ingested_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<KnowledgeDocument(file_name={self.file_name})>"
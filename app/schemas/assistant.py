@@ -1,7 +1,7 @@
 import uuid
 from enum import Enum
 from typing import Optional
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class VoiceType(str, Enum):
@@ -14,6 +14,8 @@ class AssistantBase(BaseModel):
     system_instructions: Optional[str] = ""
     first_message: Optional[str] = ""
     voice: Optional[VoiceType] = None
+    response_cache_enabled: bool = False
+    history_token_budget: Optional[int] = None
 
 
 class AssistantCreate(BaseModel):
@@ -21,6 +23,8 @@ class AssistantCreate(BaseModel):
     system_instructions: str
     first_message: str
     voice: VoiceType
+    response_cache_enabled: bool = False
+    history_token_budget: Optional[int] = Field(default=None, ge=500)
 
 
 class AssistantUpdate(BaseModel):
@@ -28,6 +32,8 @@ class AssistantUpdate(BaseModel):
     system_instructions: Optional[str] = None
     first_message: Optional[str] = None
     voice: Optional[VoiceType] = None
+    response_cache_enabled: Optional[bool] = None
+    history_token_budget: Optional[int] = Field(default=None, ge=500)
 
 
 class AssistantID(BaseModel):
@@ -0,0 +1,52 @@
+import uuid
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class IngestionStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+class IngestionJobPublic(BaseModel):
+    id: uuid.UUID
+    assistant_id: uuid.UUID
+    file_name: str
+    status: IngestionStatus
+    error: Optional[str] = None
+    parsed_pages: int
+    total_chunks: Optional[int] = None
+    processed_chunks: int
+    reused_chunks: int
+    attempts: int
+    document_id: Optional[uuid.UUID] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class KnowledgeDocumentPublic(BaseModel):
+    id: uuid.UUID
+    file_name: str
+    content_hash: str
+    chunk_count: int
+    size_bytes: int
+    created_at: datetime
+    ingested_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class KnowledgeDocumentPage(BaseModel):
+    items: List[KnowledgeDocumentPublic]
+    total: int
+    offset: int
+    limit: int
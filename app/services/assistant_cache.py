@@ -0,0 +1,158 @@
+import asyncio
+import uuid
+from dataclasses import dataclass
+
+from app.core.cache import LRUCache
+from app.core.concurrency import run_blocking
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.redis_client import get_redis
+from app.db.session import AsyncSessionLocal
+from app.models.assistant import Assistant
+from app.services.rag import has_documents
+
+
+INVALIDATION_CHANNEL = "assistant-config-invalidation"
+RESUBSCRIBE_DELAY_SECONDS = 1.0
+
+
+@dataclass(frozen=True)
+class AssistantConfig:
+    """
+    Snapshot of the assistant settings a call needs.
+    """
+
+    id: uuid.UUID
+    system_instructions: str
+    first_message: str | None
+    voice: str | None
+    response_cache_enabled: bool
+    history_token_budget: int | None
+    has_knowledge_base: bool
+
+    @classmethod
+    def from_model(
+        cls, assistant: Assistant, has_knowledge_base: bool
+    ) -> "AssistantConfig":
+        return cls(
+            id=assistant.id,
+            system_instructions=assistant.system_instructions,
+            first_message=assistant.first_message,
+            voice=assistant.voice,
+            response_cache_enabled=assistant.response_cache_enabled,
+            history_token_budget=assistant.history_token_budget,
+            has_knowledge_base=has_knowledge_base,
+        )
+
+
+async def load_assistant_config(assistant_id: str) -> AssistantConfig | None:
+    """
+    Load an assistant in a short-lived session.
+
+    The session is closed before returning, so a call does not keep a pooled
+    connection for as long as it lasts.
+    """
+    try:
+        assistant_uuid = uuid.UUID(assistant_id)
+    except ValueError:
+        return None
+
+    async with AsyncSessionLocal() as session:
+        assistant = await session.get(Assistant, assistant_uuid)
+    if assistant is None:
+        return None
+
+    has_knowledge_base = await run_blocking(has_documents, str(assistant.id))
+    return AssistantConfig.from_model(assistant, has_knowledge_base)
+
+
+class AssistantConfigCache:
+    """
+    Read-through cache of assistant configs for call setup.
+
+    Concurrent misses for the same assistant share one load. When ``publish``
+    is set, invalidations are also sent over Redis so every worker running
+    ``listen`` drops its copy.
+    """
+
+    def __init__(self, max_size: int, ttl: float, publish: bool = False):
+        self._configs = LRUCache(max_size=max_size, ttl=ttl)
+        self._loads: dict[str, asyncio.Future] = {}
+        # Bumped on every invalidation so loads that started before it are not cached
+        self._version = 0
+        self.publish = publish
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, assistant_id: str) -> AssistantConfig | None:
+        config = self._configs.get(assistant_id)
+        if config is not None:
+            self.hits += 1
+            return config
+
+        self.misses += 1
+        load = self._loads.get(assistant_id)
+        if load is None or load.done():
+            load = asyncio.ensure_future(self._load(assistant_id))
+            self._loads[assistant_id] = load
+            load.add_done_callback(lambda _: self._forget_load(assistant_id, load))
+        return await asyncio.shield(load)
+
+    def _forget_load(self, assistant_id: str, load: asyncio.Future):
+        if self._loads.get(assistant_id) is load:
+            del self._loads[assistant_id]
+
+    async def _load(self, assistant_id: str) -> AssistantConfig | None:
+        version = self._version
+        config = await load_assistant_config(assistant_id)
+        if config is not None and version == self._version:
+            self._configs.set(assistant_id, config)
+        return config
+
+    def invalidate_local(self, assistant_id: str):
+        self._version += 1
+        self._configs.pop(assistant_id)
+
+    async def invalidate(self, assistant_id: str):
+        """
+        Drop an assistant from this worker's cache and, when publishing, from
+        the caches of the other workers.
+        """
+        self.invalidate_local(assistant_id)
+        if self.publish:
+            try:
+                await get_redis().publish(INVALIDATION_CHANNEL, assistant_id)
+            except Exception as e:
+                logger.error(f"Could not publish invalidation of {assistant_id}: {e}")
+
+    async def listen(self):
+        """
+        Apply invalidations published by other workers until cancelled.
+
+        The cache is cleared on every (re)subscription, since messages sent
+        while disconnected are lost.
+        """
+        while True:
+            try:
+                async with get_redis().pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    self._version += 1
+                    self._configs.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.invalidate_local(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Assistant invalidation listener failed: {e}")
+                await asyncio.sleep(RESUBSCRIBE_DELAY_SECONDS)
+
+    def stats(self) -> dict:
+        return {"size": len(self._configs), "hits": self.hits, "misses": self.misses}
+
+
+assistant_config_cache = AssistantConfigCache(
+    max_size=settings.ASSISTANT_CACHE_SIZE,
+    ttl=settings.ASSISTANT_CACHE_TTL_SECONDS,
+    publish=settings.ASSISTANT_CACHE_PUBSUB,
+)
@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+from app.core.cache import LRUCache
+from app.core.concurrency import run_blocking
+from app.core.config import settings
+from app.core.logger import logger
+from app.schemas.assistant import VoiceType
+from app.services.speech import get_speech, get_speech_cache_key
+
+
+DEFAULT_FIRST_MESSAGE = "Hello"
+FALLBACK_MESSAGE = "Sorry, I'm having trouble right now. Could you say that again?"
+
+CANNED_PHRASES = (DEFAULT_FIRST_MESSAGE, FALLBACK_MESSAGE)
+CALL_TYPES = ("web", "twilio")
+
+
+class AudioCache:
+    """
+    Synthesized audio for fixed phrases, kept in memory and on disk.
+
+    Used for the first message of each assistant and canned phrases, whose
+    text and voice rarely change, so calls can play them without waiting on TTS.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.memory = LRUCache(max_size=max_size)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.audio")
+
+    def _read(self, key: str) -> bytes | None:
+        try:
+            with open(self._path(key), "rb") as audio_file:
+                return audio_file.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, speech: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as audio_file:
+            audio_file.write(speech)
+        os.replace(temp_path, self._path(key))
+
+    async def get(self, text: str, voice: str, call_type: str = "web") -> bytes | None:
+        key = get_speech_cache_key(text, voice, call_type)
+        speech = self.memory.get(key)
+        if speech is None:
+            speech = await run_blocking(self._read, key)
+            if speech is not None:
+                self.memory.set(key, speech)
+        return speech
+
+    async def get_or_synthesize(
+        self, text: str, voice: str, call_type: str = "web"
+    ) -> bytes:
+        """
+        Return the cached audio for text, synthesizing and storing it on a miss.
+        """
+        speech = await self.get(text, voice, call_type)
+        if speech is None:
+            speech = await get_speech(text, voice, call_type)
+            key = get_speech_cache_key(text, voice, call_type)
+            self.memory.set(key, speech)
+            await run_blocking(self._write, key, speech)
+        return speech
+
+    async def prerender(self, text: str, voice: str):
+        """
+        Render text in every call audio format ahead of time. Failures are logged.
+        """
+        results = await asyncio.gather(
+            *[
+                self.get_or_synthesize(text, voice, call_type)
+                for call_type in CALL_TYPES
+            ],
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Could not pre-render audio for '{text}': {result}")
+
+    async def prerender_canned_phrases(self):
+        await asyncio.gather(
+            *[
+                self.prerender(phrase, voice.value)
+                for phrase in CANNED_PHRASES
+                for voice in VoiceType
+            ]
+        )
+
+
+audio_cache = AudioCache(
+    directory=settings.AUDIO_CACHE_DIR, max_size=settings.AUDIO_CACHE_SIZE
+)
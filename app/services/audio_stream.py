@@ -0,0 +1,126 @@
+import asyncio
+import binascii
+import json
+import time
+from itertools import count
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.core.telemetry import current_turn
+
+
+# Twilio media streams carry 8 kHz mulaw, so one 20 ms frame is 160 bytes
+TWILIO_FRAME_BYTES = 160
+TWILIO_FRAME_SECONDS = 0.02
+MULAW_SILENCE = b"\xff"
+
+
+class TwilioAudioWriter:
+    """
+    Writes outbound audio to a Twilio media stream in paced 20 ms frames.
+
+    Frames are sent at playback speed, at most ``lead_seconds`` ahead of what
+    Twilio is playing, so little audio is buffered on Twilio's side and a clear
+    stops playback almost immediately. Marks sent after a phrase resolve once
+    Twilio reports that the phrase has been played.
+
+    ``send_seconds`` adds up the time spent in the websocket sends of frames
+    and marks, without the pacing sleeps.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        stream_sid: str,
+        lead_seconds: float = settings.TWILIO_AUDIO_LEAD_SECONDS,
+    ):
+        self.websocket = websocket
+        self.stream_sid = stream_sid
+        self.lead_seconds = lead_seconds
+        sid = json.dumps(stream_sid)
+        # The JSON around each payload never changes, only the payload is encoded
+        self._media_prefix = (
+            f'{{"event":"media","streamSid":{sid},"media":{{"payload":"'
+        )
+        self._media_suffix = '"}}'
+        self._clear_message = f'{{"event":"clear","streamSid":{sid}}}'
+        self._buffer = bytearray()
+        self._playhead = 0.0
+        self._marks: dict[str, asyncio.Future] = {}
+        self._mark_ids = count()
+        self.send_seconds = 0.0
+
+    async def write(self, audio: bytes):
+        """
+        Queue mulaw audio and send every complete frame, pacing to real time.
+        """
+        self._buffer += audio
+        while len(self._buffer) >= TWILIO_FRAME_BYTES:
+            frame = bytes(self._buffer[:TWILIO_FRAME_BYTES])
+            del self._buffer[:TWILIO_FRAME_BYTES]
+            await self._send_frame(frame)
+
+    async def flush(self):
+        """
+        Send the last partial frame, padded with silence.
+        """
+        if self._buffer:
+            padding = TWILIO_FRAME_BYTES - len(self._buffer)
+            self._buffer += MULAW_SILENCE * padding
+            await self.write(b"")
+
+    async def mark(self) -> asyncio.Future:
+        """
+        Send a mark after the audio written so far.
+
+        :return: A future resolved when Twilio has played up to the mark, or
+            cancelled when the audio is cleared before that.
+        """
+        name = f"mark-{next(self._mark_ids)}"
+        played = asyncio.get_running_loop().create_future()
+        self._marks[name] = played
+        await self._send(
+            json.dumps(
+                {"event": "mark", "streamSid": self.stream_sid, "mark": {"name": name}}
+            )
+        )
+        return played
+
+    def on_mark(self, name: str):
+        """
+        Handle a mark event echoed back by Twilio once the audio before it has played.
+        """
+        played = self._marks.pop(name, None)
+        if played is not None and not played.done():
+            played.set_result(name)
+
+    async def clear(self):
+        """
+        Drop all audio that Twilio has not played yet.
+        """
+        self._buffer.clear()
+        self._playhead = 0.0
+        # Twilio echoes pending marks after a clear, they no longer mean played
+        for played in self._marks.values():
+            played.cancel()
+        self._marks.clear()
+        await self.websocket.send_text(self._clear_message)
+
+    async def _send_frame(self, frame: bytes):
+        now = time.monotonic()
+        self._playhead = max(self._playhead, now)
+        ahead = self._playhead - now
+        if ahead > self.lead_seconds:
+            await asyncio.sleep(ahead - self.lead_seconds)
+
+        payload = binascii.b2a_base64(frame, newline=False).decode("ascii")
+        await self._send(self._media_prefix + payload + self._media_suffix)
+        self._playhead += TWILIO_FRAME_SECONDS
+        if turn := current_turn.get():
+            turn.mark_once("first_audio")
+
+    async def _send(self, message: str):
+        start = time.perf_counter()
+        await self.websocket.send_text(message)
+        self.send_seconds += time.perf_counter() - start
@@ -0,0 +1,548 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable
+
+from redis.exceptions import WatchError
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.redis_client import get_redis
+
+# Time left to calls closed at the drain deadline to stop their streams
+CLOSE_GRACE_SECONDS = 5.0
+
+
+@dataclass
+class CallInfo:
+    call_id: str
+    node_id: str
+    worker: int
+    assistant_id: str
+    call_type: str
+    started_at: float
+
+
+@dataclass
+class NodeInfo:
+    node_id: str
+    url: str | None
+    capacity: int
+    draining: bool = False
+    active: int = 0
+
+
+class CallStore(ABC):
+    """
+    Storage for the live calls of every node, shared by all workers and nodes.
+
+    Calls and nodes are held under leases that their worker renews; those of a
+    worker that died expire after ``lease`` seconds.
+    """
+
+    @abstractmethod
+    async def acquire_slot(
+        self, node_id: str, call_id: str, capacity: int, lease: float
+    ) -> bool:
+        """
+        Take one of the ``capacity`` call slots of a node.
+
+        :return: False if all slots are taken.
+        """
+
+    @abstractmethod
+    async def release_slot(self, node_id: str, call_id: str):
+        """
+        Free the slot of a call.
+        """
+
+    @abstractmethod
+    async def refresh_slots(self, node_id: str, call_ids: list[str], lease: float):
+        """
+        Renew the leases of the slots of calls that are still running.
+        """
+
+    @abstractmethod
+    async def count_slots(self, node_id: str) -> int:
+        """
+        Return the number of slots of a node that are taken.
+        """
+
+    @abstractmethod
+    async def put_call(self, call: CallInfo, lease: float):
+        """
+        Store the metadata of a call, or renew its lease.
+        """
+
+    @abstractmethod
+    async def get_call(self, call_id: str) -> CallInfo | None:
+        """
+        Return the metadata of a live call, or None if it does not exist.
+        """
+
+    @abstractmethod
+    async def delete_call(self, call_id: str):
+        """
+        Remove the metadata of a call.
+        """
+
+    @abstractmethod
+    async def put_node(self, node: NodeInfo, lease: float):
+        """
+        Store the state of a node, or renew its lease.
+        """
+
+    @abstractmethod
+    async def get_nodes(self) -> list[NodeInfo]:
+        """
+        Return the live nodes, with the number of calls each is running.
+        """
+
+
+class InMemoryCallStore(CallStore):
+    """
+    Per-process store, for a single worker and for tests.
+    """
+
+    def __init__(self):
+        self._slots: dict[str, dict[str, float]] = {}
+        self._calls: dict[str, tuple[CallInfo, float]] = {}
+        self._nodes: dict[str, tuple[NodeInfo, float]] = {}
+
+    def _live_slots(self, node_id: str) -> dict[str, float]:
+        now = time.time()
+        slots = self._slots.setdefault(node_id, {})
+        for call_id in [call_id for call_id, until in slots.items() if until <= now]:
+            del slots[call_id]
+        return slots
+
+    async def acquire_slot(
+        self, node_id: str, call_id: str, capacity: int, lease: float
+    ) -> bool:
+        slots = self._live_slots(node_id)
+        if call_id not in slots and len(slots) >= capacity:
+            return False
+        slots[call_id] = time.time() + lease
+        return True
+
+    async def release_slot(self, node_id: str, call_id: str):
+        self._slots.get(node_id, {}).pop(call_id, None)
+
+    async def refresh_slots(self, node_id: str, call_ids: list[str], lease: float):
+        slots = self._slots.setdefault(node_id, {})
+        for call_id in call_ids:
+            slots[call_id] = time.time() + lease
+
+    async def count_slots(self, node_id: str) -> int:
+        return len(self._live_slots(node_id))
+
+    async def put_call(self, call: CallInfo, lease: float):
+        self._calls[call.call_id] = (call, time.time() + lease)
+
+    async def get_call(self, call_id: str) -> CallInfo | None:
+        call, until = self._calls.get(call_id, (None, 0))
+        return call if until > time.time() else None
+
+    async def delete_call(self, call_id: str):
+        self._calls.pop(call_id, None)
+
+    async def put_node(self, node: NodeInfo, lease: float):
+        self._nodes[node.node_id] = (node, time.time() + lease)
+
+    async def get_nodes(self) -> list[NodeInfo]:
+        now = time.time()
+        nodes = []
+        for node, until in self._nodes.values():
+            if until > now:
+                nodes.append(
+                    NodeInfo(
+                        **{
+                            **asdict(node),
+                            "active": await self.count_slots(node.node_id),
+                        }
+                    )
+                )
+        return nodes
+
+
+class RedisCallStore(CallStore):
+    """
+    Store shared through Redis.
+
+    The slots of a node are a sorted set of call ids scored by lease expiry, so
+    expired slots are skipped when counting and purged when a slot is taken.
+    """
+
+    def __init__(self, redis, key_prefix: str = "calls:"):
+        self.redis = redis
+        self.key_prefix = key_prefix
+
+    def _slots_key(self, node_id: str) -> str:
+        return f"{self.key_prefix}slots:{node_id}"
+
+    def _call_key(self, call_id: str) -> str:
+        return f"{self.key_prefix}call:{call_id}"
+
+    def _node_key(self, node_id: str) -> str:
+        return f"{self.key_prefix}node:{node_id}"
+
+    @property
+    def _nodes_key(self) -> str:
+        return f"{self.key_prefix}nodes"
+
+    async def acquire_slot(
+        self, node_id: str, call_id: str, capacity: int, lease: float
+    ) -> bool:
+        key = self._slots_key(node_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    now = time.time()
+                    taken = await pipe.zcount(key, f"({now}", "+inf")
+                    if await pipe.zscore(key, call_id) is None and taken >= capacity:
+                        await pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.zremrangebyscore(key, "-inf", now)
+                    pipe.zadd(key, {call_id: now + lease})
+                    pipe.expire(key, int(lease) + 1)
+                    await pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    async def release_slot(self, node_id: str, call_id: str):
+        await self.redis.zrem(self._slots_key(node_id), call_id)
+
+    async def refresh_slots(self, node_id: str, call_ids: list[str], lease: float):
+        if not call_ids:
+            return
+        key = self._slots_key(node_id)
+        until = time.time() + lease
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {call_id: until for call_id in call_ids})
+            pipe.expire(key, int(lease) + 1)
+            await pipe.execute()
+
+    async def count_slots(self, node_id: str) -> int:
+        return await self.redis.zcount(
+            self._slots_key(node_id), f"({time.time()}", "+inf"
+        )
+
+    async def put_call(self, call: CallInfo, lease: float):
+        await self.redis.set(
+            self._call_key(call.call_id), json.dumps(asdict(call)), ex=int(lease) + 1
+        )
+
+    async def get_call(self, call_id: str) -> CallInfo | None:
+        data = await self.redis.get(self._call_key(call_id))
+        return CallInfo(**json.loads(data)) if data else None
+
+    async def delete_call(self, call_id: str):
+        await self.redis.delete(self._call_key(call_id))
+
+    async def put_node(self, node: NodeInfo, lease: float):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(
+                self._node_key(node.node_id),
+                json.dumps(asdict(node)),
+                ex=int(lease) + 1,
+            )
+            pipe.zadd(self._nodes_key, {node.node_id: time.time() + lease})
+            await pipe.execute()
+
+    async def get_nodes(self) -> list[NodeInfo]:
+        now = time.time()
+        await self.redis.zremrangebyscore(self._nodes_key, "-inf", now)
+        node_ids = await self.redis.zrange(self._nodes_key, 0, -1)
+        if not node_ids:
+            return []
+        nodes = []
+        for data in await self.redis.mget(
+            [self._node_key(node_id) for node_id in node_ids]
+        ):
+            if data:
+                node = NodeInfo(**json.loads(data))
+                node.active = await self.count_slots(node.node_id)
+                nodes.append(node)
+        return nodes
+
+
+class CallRegistry:
+    """
+    Admits calls on this node up to its capacity and publishes where every
+    call runs.
+
+    Each worker keeps a registry for its own calls. The node's capacity is
+    enforced through the shared store, so it holds across all workers of the
+    node. A background task renews the leases of the node and its calls.
+    Once draining, the node takes no new calls and is not offered as a
+    redirect target.
+    """
+
+    def __init__(
+        self,
+        store: CallStore,
+        node_id: str,
+        node_url: str | None,
+        capacity: int,
+        lease: float,
+        heartbeat_interval: float,
+    ):
+        self.store = store
+        self.node_id = node_id
+        self.node_url = node_url
+        self.capacity = capacity
+        self.lease = lease
+        self.heartbeat_interval = heartbeat_interval
+        self.worker = os.getpid()
+        self.calls: dict[str, CallInfo] = {}
+        self.draining = False
+        self.rejected = 0
+        self.drain_started_at: float | None = None
+        self.drain_deadline: float | None = None
+        self.drain_finished_at: float | None = None
+        self.calls_at_drain = 0
+        self._closers: dict[str, Callable[[], Awaitable]] = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._heartbeat_task: asyncio.Task | None = None
+
+    @property
+    def node(self) -> NodeInfo:
+        return NodeInfo(
+            node_id=self.node_id,
+            url=self.node_url,
+            capacity=self.capacity,
+            draining=self.draining,
+        )
+
+    async def start(self):
+        await self.heartbeat()
+        self._heartbeat_task = asyncio.create_task(self._beat())
+
+    async def stop(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        for call_id in list(self.calls):
+            await self.release(call_id)
+
+    async def heartbeat(self):
+        await self.store.put_node(self.node, self.lease)
+        await self.store.refresh_slots(self.node_id, list(self.calls), self.lease)
+        for call in self.calls.values():
+            await self.store.put_call(call, self.lease)
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.error(f"Call registry heartbeat failed: {e}")
+
+    async def admit(
+        self,
+        call_id: str,
+        assistant_id: str,
+        call_type: str,
+        close: Callable[[], Awaitable] | None = None,
+    ) -> bool:
+        """
+        Register a new call on this node.
+
+        :param close: Ends the call when it outlives a drain.
+        :return: False if the node is draining or has no free call slot.
+        """
+        if self.draining or not await self.store.acquire_slot(
+            self.node_id, call_id, self.capacity, self.lease
+        ):
+            self.rejected += 1
+            return False
+
+        call = CallInfo(
+            call_id=call_id,
+            node_id=self.node_id,
+            worker=self.worker,
+            assistant_id=str(assistant_id),
+            call_type=call_type,
+            started_at=time.time(),
+        )
+        self.calls[call_id] = call
+        if close is not None:
+            self._closers[call_id] = close
+        self._idle.clear()
+        await self.store.put_call(call, self.lease)
+        return True
+
+    async def release(self, call_id: str):
+        if self.calls.pop(call_id, None) is None:
+            return
+        self._closers.pop(call_id, None)
+        if not self.calls:
+            self._idle.set()
+        await self.store.release_slot(self.node_id, call_id)
+        await self.store.delete_call(call_id)
+
+    async def locate(self, call_id: str) -> CallInfo | None:
+        return await self.store.get_call(call_id)
+
+    async def get_nodes(self) -> list[NodeInfo]:
+        return await self.store.get_nodes()
+
+    async def choose_node(self) -> NodeInfo | None:
+        """
+        Pick the node a new call should go to: this one while it has room,
+        otherwise the least loaded node that is not draining.
+
+        :return: The node, or None if every node is full or draining.
+        """
+        nodes = [
+            node
+            for node in await self.store.get_nodes()
+            if not node.draining and node.active < node.capacity
+        ]
+        for node in nodes:
+            if node.node_id == self.node_id:
+                return node
+        return min(nodes, key=lambda node: node.active / node.capacity, default=None)
+
+    async def start_draining(self):
+        """
+        Stop taking new calls and tell the other nodes.
+        """
+        self.draining = True
+        await self.store.put_node(self.node, self.lease)
+
+    async def _wait_idle(self, timeout: float) -> bool:
+        """
+        :return: False if calls are still running after ``timeout`` seconds.
+        """
+        try:
+            await asyncio.wait_for(self._idle.wait(), max(timeout, 0))
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def drain(self, timeout: float):
+        """
+        Stop taking new calls and wait up to ``timeout`` seconds for the
+        running ones to end, then close those that are left. Draining again
+        waits for the first drain's deadline.
+        """
+        if self.drain_started_at is None:
+            self.drain_started_at = time.time()
+            self.drain_deadline = self.drain_started_at + timeout
+            self.calls_at_drain = len(self.calls)
+            logger.info(f"Draining {self.calls_at_drain} calls")
+            self.draining = True
+            try:
+                await self.start_draining()
+            except Exception as e:
+                logger.error(f"Could not publish that the node is draining: {e}")
+
+        if not await self._wait_idle(self.drain_deadline - time.time()):
+            logger.warning(f"Closing {len(self.calls)} calls left after the drain")
+            for close in list(self._closers.values()):
+                try:
+                    await close()
+                except Exception as e:
+                    logger.error(f"Failed to close call: {e}")
+            await self._wait_idle(CLOSE_GRACE_SECONDS)
+        if self.drain_finished_at is None:
+            self.drain_finished_at = time.time()
+
+    def stats(self) -> dict:
+        stats = {
+            "node_id": self.node_id,
+            "worker": self.worker,
+            "active_calls": len(self.calls),
+            "capacity": self.capacity,
+            "draining": self.draining,
+            "rejected": self.rejected,
+        }
+        if self.drain_started_at is not None:
+            stats["drain"] = {
+                "started_at": self.drain_started_at,
+                "deadline": self.drain_deadline,
+                "calls_at_start": self.calls_at_drain,
+                "finished_at": self.drain_finished_at,
+            }
+        return stats
+
+
+def _forward_signal(signum: int, frame, handler):
+    if callable(handler):
+        handler(signum, frame)
+    else:
+        signal.signal(signum, handler)
+        signal.raise_signal(signum)
+
+
+def drain_on_signals(registry: CallRegistry, timeout: float):
+    """
+    Drain calls when the server is asked to stop, then pass the signal on to
+    the handler installed before.
+
+    Uvicorn closes open websockets as soon as it shuts down, before the
+    lifespan shutdown runs, so the drain has to start from the signal. A
+    second signal skips the wait.
+
+    Signal handlers can only be installed from the main thread. Elsewhere,
+    e.g. when a TestClient runs the lifespan, nothing is installed and calls
+    are drained by the lifespan shutdown.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    previous_handlers = {}
+    received = []
+    tasks = set()
+
+    async def drain_then_exit(signum: int, frame):
+        try:
+            await registry.drain(timeout)
+        finally:
+            _forward_signal(signum, frame, previous_handlers[signum])
+
+    def start_drain(signum: int, frame):
+        task = loop.create_task(drain_then_exit(signum, frame))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    def handle(signum: int, frame):
+        if received:
+            _forward_signal(signum, frame, previous_handlers[signum])
+            return
+        received.append(signum)
+        loop.call_soon_threadsafe(start_drain, signum, frame)
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        previous_handlers[signum] = signal.getsignal(signum)
+        signal.signal(signum, handle)
+
+
+def create_call_store() -> CallStore:
+    if settings.CALL_STORE_BACKEND == "redis":
+        return RedisCallStore(get_redis())
+
+    return InMemoryCallStore()
+
+
+call_registry = CallRegistry(
+    create_call_store(),
+    node_id=settings.NODE_ID or socket.gethostname(),
+    node_url=settings.NODE_URL,
+    capacity=settings.NODE_MAX_CALLS,
+    lease=settings.CALL_LEASE_SECONDS,
+    heartbeat_interval=settings.CALL_HEARTBEAT_SECONDS,
+)
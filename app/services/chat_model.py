@@ -1,47 +1,222 @@
+import asyncio
 import os
+import re
+import time
+from typing import AsyncIterator
 
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from dotenv import load_dotenv
 
-from app.models.assistant import Assistant
-from app.services.rag import search_vector_store
+from app.core.config import settings
+from app.core.telemetry import record, span
+from app.services.assistant_cache import AssistantConfig
+from app.services.conversation_store import create_conversation_store
+from app.services.history import HistoryManager
+from app.services.rag import get_embeddings
+from app.services.response_cache import response_cache
+from app.services.retrieval import Retriever
 
 
 load_dotenv()
 
-chat_histories = {}
+conversation_store = create_conversation_store()
 
-chat_model = ChatOpenAI(model_name="gpt-4o-mini", api_key=os.getenv("OPENAI_API_KEY"))
+CHAT_MODEL_NAME = "gpt-4o-mini"
+
+chat_model = ChatOpenAI(model_name=CHAT_MODEL_NAME, api_key=os.getenv("OPENAI_API_KEY"))
+
+# Caps the LLM requests a worker has in flight across all of its calls
+llm_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_LLM_REQUESTS)
+
+history_manager = HistoryManager(
+    conversation_store,
+    summary_model=chat_model,
+    model_name=CHAT_MODEL_NAME,
+    semaphore=llm_semaphore,
+)
+
+retriever = Retriever(
+    model_name=CHAT_MODEL_NAME,
+    top_k=settings.RAG_TOP_K,
+    candidates=settings.RAG_CANDIDATES,
+    min_similarity=settings.RAG_MIN_SIMILARITY,
+    min_lexical_score=settings.RAG_MIN_LEXICAL_SCORE,
+    context_token_budget=settings.RAG_CONTEXT_TOKEN_BUDGET,
+)
 
 BASE_PHONE_SYSTEM_PROMPT = "<instructions> Talk in humanly manner and expressions.\
                     Give direct answers to user as if you are on a phone call and an actual person is talking.\
                     Keep your answers short and precise. Use provided <context> to answer user questions if context is provided.</instructions>"
 
+# Sentence endings always close a phrase, clause endings only once the phrase
+# is long enough to be worth a separate TTS request.
+SENTENCE_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*\s+")
+CLAUSE_BOUNDARY = re.compile(r"[,;:]\s+")
+MIN_CLAUSE_LENGTH = 40
+
+
+def get_system_message(assistant: AssistantConfig) -> SystemMessage:
+    return SystemMessage(
+        content=f"{BASE_PHONE_SYSTEM_PROMPT}\n   <important_instructions>{assistant.system_instructions}</important_instructions>"
+    )
+
+
+async def end_conversation(session_id: str):
+    await history_manager.end(session_id)
+
+
+def split_phrases(
+    text: str, min_clause_length: int = MIN_CLAUSE_LENGTH
+) -> tuple[list[str], str]:
+    """
+    Split the complete phrases off the front of a partial LLM completion.
+
+    :param text: Text received so far that has not been emitted yet.
+    :param min_clause_length: Minimum phrase length before a clause boundary is used.
+
+    :return: The complete phrases and the remaining incomplete text.
+    """
+    phrases = []
+    while True:
+        sentence_match = SENTENCE_BOUNDARY.search(text)
+        boundary = sentence_match.end() if sentence_match else None
+
+        for clause_match in CLAUSE_BOUNDARY.finditer(text):
+            if boundary is not None and clause_match.end() >= boundary:
+                break
+            if clause_match.start() >= min_clause_length:
+                boundary = clause_match.end()
+                break
+
+        if boundary is None:
+            return phrases, text
+
+        phrase = text[:boundary].strip()
+        if phrase:
+            phrases.append(phrase)
+        text = text[boundary:]
 
-def get_chat_history(session_id: str, user_system_prompt: str = ""):
-    if session_id not in chat_histories:
-        chat_histories[session_id] = ChatMessageHistory(
-            messages=[
-                SystemMessage(
-                    content=f"{BASE_PHONE_SYSTEM_PROMPT}\n   <important_instructions>{user_system_prompt}</important_instructions>"
+
+async def _add_user_turn(
+    assistant: AssistantConfig, session_id: str, user_input: str
+) -> tuple[list[BaseMessage], str]:
+    """
+    Build the prompt for a user message and add the message to the history.
+
+    Only the current message carries its retrieved context; the history keeps
+    the plain message so old context does not fill up later prompts.
+    """
+    context = ""
+    if assistant.has_knowledge_base:
+        try:
+            with span("retrieval"):
+                context = await retriever.retrieve_context(
+                    str(assistant.id), user_input
                 )
-            ]
-        )
-    return chat_histories[session_id]
+        except Exception:
+            pass
+
+    prompt = await history_manager.build_prompt(
+        session_id,
+        get_system_message(assistant),
+        HumanMessage(content=f"<context>{context}</context>\n{user_input}"),
+        budget=assistant.history_token_budget or settings.HISTORY_TOKEN_BUDGET,
+    )
+    await conversation_store.add_messages(
+        session_id, [HumanMessage(content=user_input)]
+    )
+    return prompt, context
+
+
+async def _lookup_cached_response(
+    assistant: AssistantConfig, user_input: str, context: str
+) -> tuple[str | None, list[float] | None]:
+    """
+    Look the question up in the assistant's response cache, if it has one enabled.
+
+    :return: The cached reply or None, and the question embedding to store the
+        fresh reply under. The embedding is None when the cache does not apply.
+    """
+    words = len(user_input.split())
+    if (
+        not assistant.response_cache_enabled
+        or words < settings.RESPONSE_CACHE_MIN_QUESTION_WORDS
+    ):
+        return None, None
+
+    with span("embedding", purpose="response_cache"):
+        embedding = await get_embeddings().aembed_query(user_input)
+    return response_cache.lookup(assistant, embedding, context), embedding
+
 
+async def stream_response(
+    assistant: AssistantConfig, session_id: str, user_input: str
+) -> AsyncIterator[str]:
+    """
+    Stream the assistant reply phrase by phrase as the LLM generates it.
 
-def get_response(assistant: Assistant, session_id: str, user_input: str):
-    history = get_chat_history(session_id, assistant.system_instructions)
+    Phrases are cut at sentence or clause boundaries so each one can be sent
+    to TTS while the rest of the reply is still being generated. Replies served
+    from the response cache are split the same way.
+
+    The reply is not added to the history; the caller records what was actually
+    delivered with record_ai_message.
+    """
+    history, context = await _add_user_turn(assistant, session_id, user_input)
+    cached_response, embedding = await _lookup_cached_response(
+        assistant, user_input, context
+    )
+    if cached_response is not None:
+        phrases, remainder = split_phrases(f"{cached_response} ")
+        for phrase in phrases:
+            yield phrase
+        if remainder.strip():
+            yield remainder.strip()
+        return
+
+    # The completion is read into a queue by a task that holds the LLM slot,
+    # so the slot is released when generation ends, not once the slower
+    # caller has been played the whole reply
+    chunks: asyncio.Queue[str | None] = asyncio.Queue()
+
+    async def generate():
+        try:
+            async with llm_semaphore:
+                start = time.perf_counter()
+                first_token = True
+                async for chunk in chat_model.astream(history):
+                    if chunk.content and first_token:
+                        record("llm_first_token", start)
+                        first_token = False
+                    chunks.put_nowait(chunk.content)
+                record("llm_complete", start)
+        finally:
+            chunks.put_nowait(None)
+
+    generation = asyncio.create_task(generate())
+    response_text = ""
+    pending_text = ""
     try:
-        context = search_vector_store(str(assistant.id), user_input)
-    except Exception:
-        context = ""
-
-    retriever_message = f"<context>{context}</context>\n{user_input}"
-    history.add_user_message(retriever_message)
-    messages = history.messages
-    response = chat_model.invoke(messages)
-    history.add_ai_message(response.content)
-    return response.content
+        while (content := await chunks.get()) is not None:
+            response_text += content
+            pending_text += content
+            phrases, pending_text = split_phrases(pending_text)
+            for phrase in phrases:
+                yield phrase
+        await generation
+    finally:
+        generation.cancel()
+
+    if pending_text.strip():
+        yield pending_text.strip()
+    if embedding is not None:
+        response_cache.store(assistant, embedding, context, response_text)
+
+
+async def record_ai_message(session_id: str, message: str):
+    """
+    Add the part of a reply that was delivered to the caller to the history.
+    """
+    if message:
+        await conversation_store.add_messages(session_id, [AIMessage(content=message)])
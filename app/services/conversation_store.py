@@ -0,0 +1,123 @@
+import json
+from abc import ABC, abstractmethod
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+
+class ConversationStore(ABC):
+    """
+    Storage for the message history of live calls, keyed by session id.
+
+    Sessions expire ``ttl`` seconds after their last write and are deleted
+    explicitly when the call ends.
+    """
+
+    @abstractmethod
+    async def get_messages(self, session_id: str) -> list[BaseMessage]:
+        """
+        Return the messages of a session, or an empty list if it does not exist.
+        """
+
+    @abstractmethod
+    async def add_messages(self, session_id: str, messages: list[BaseMessage]):
+        """
+        Append messages to a session, creating it if needed, and refresh its TTL.
+        """
+
+    @abstractmethod
+    async def replace_prefix(
+        self, session_id: str, count: int, messages: list[BaseMessage]
+    ):
+        """
+        Replace the first ``count`` messages of a session with ``messages``.
+
+        Messages appended after the prefix was read are kept, so a summary can
+        be written back while the call goes on.
+        """
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        """
+        Remove a session and all of its messages.
+        """
+
+
+class InMemoryConversationStore(ConversationStore):
+    """
+    Per-process store that evicts the least recently used sessions once full.
+    """
+
+    def __init__(self, max_sessions: int, ttl: float):
+        self._sessions = LRUCache(max_size=max_sessions, ttl=ttl)
+
+    async def get_messages(self, session_id: str) -> list[BaseMessage]:
+        return list(self._sessions.get(session_id, []))
+
+    async def add_messages(self, session_id: str, messages: list[BaseMessage]):
+        self._sessions.set(session_id, self._sessions.get(session_id, []) + messages)
+
+    async def replace_prefix(
+        self, session_id: str, count: int, messages: list[BaseMessage]
+    ):
+        existing = self._sessions.get(session_id, [])
+        self._sessions.set(session_id, messages + existing[count:])
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id)
+
+
+class RedisConversationStore(ConversationStore):
+    """
+    Store shared by every worker and node, keeping each session in a Redis list.
+    """
+
+    def __init__(self, redis, ttl: float, key_prefix: str = "conversation:"):
+        self.redis = redis
+        self.ttl = int(ttl)
+        self.key_prefix = key_prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.key_prefix}{session_id}"
+
+    async def get_messages(self, session_id: str) -> list[BaseMessage]:
+        items = await self.redis.lrange(self._key(session_id), 0, -1)
+        return messages_from_dict([json.loads(item) for item in items])
+
+    async def add_messages(self, session_id: str, messages: list[BaseMessage]):
+        key = self._key(session_id)
+        items = [json.dumps(item) for item in messages_to_dict(messages)]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, *items)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def replace_prefix(
+        self, session_id: str, count: int, messages: list[BaseMessage]
+    ):
+        key = self._key(session_id)
+        items = [json.dumps(item) for item in messages_to_dict(messages)]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.ltrim(key, count, -1)
+            if items:
+                pipe.lpush(key, *reversed(items))
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def delete(self, session_id: str):
+        await self.redis.delete(self._key(session_id))
+
+
+def create_conversation_store() -> ConversationStore:
+    if settings.CONVERSATION_STORE_BACKEND == "redis":
+        return RedisConversationStore(
+            get_redis(), ttl=settings.CONVERSATION_TTL_SECONDS
+        )
+
+    return InMemoryConversationStore(
+        max_sessions=settings.CONVERSATION_STORE_MAX_SESSIONS,
+        ttl=settings.CONVERSATION_TTL_SECONDS,
+    )
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.cache import LRUCache
+from app.core.concurrency import run_blocking
+
+
+WHITESPACE = re.compile(r"\s+")
+EDGE_PUNCTUATION = ".,!?;:\"' "
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize an utterance so trivially different transcripts share a cache entry.
+    """
+    return WHITESPACE.sub(" ", text.casefold()).strip(EDGE_PUNCTUATION)
+
+
+class DiskEmbeddingStore:
+    """
+    SQLite backed tier of the embedding cache that survives worker restarts.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embedding "
+            "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get(self, key: str) -> list[float] | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT vector FROM embedding WHERE key = ? AND created_at > ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()
+        if row is None:
+            return None
+        return array("d", row[0]).tolist()
+
+    def set(self, key: str, vector: list[float]):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO embedding (key, vector, created_at) "
+                "VALUES (?, ?, ?)",
+                (key, array("d", vector).tobytes(), time.time()),
+            )
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._prune()
+            self._connection.commit()
+
+    def _prune(self):
+        self._connection.execute(
+            "DELETE FROM embedding WHERE created_at <= ?", (time.time() - self.ttl,)
+        )
+        self._connection.execute(
+            "DELETE FROM embedding WHERE key NOT IN "
+            "(SELECT key FROM embedding ORDER BY created_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that caches query embeddings by normalized text and model.
+
+    Lookups go to an in-memory LRU first and then to an optional on-disk store.
+    Document embeddings are passed through uncached, since ingested chunks are
+    rarely embedded twice.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        max_size: int,
+        ttl: float,
+        disk_store: DiskEmbeddingStore | None = None,
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.disk_store = disk_store
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode()).hexdigest()
+        return f"{self.model}:{digest}"
+
+    def _lookup_memory(self, key: str) -> list[float] | None:
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory_hits += 1
+        return vector
+
+    def _lookup_disk(self, key: str) -> list[float] | None:
+        vector = self.disk_store.get(key) if self.disk_store is not None else None
+        if vector is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        self.memory.set(key, vector)
+        return vector
+
+    def _store(self, key: str, vector: list[float]):
+        self.memory.set(key, vector)
+        if self.disk_store is not None:
+            self.disk_store.set(key, vector)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        vector = self._lookup_memory(key) or self._lookup_disk(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._store(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        vector = self._lookup_memory(key)
+        # Only the SQLite tier blocks; without it there is nothing to hand off
+        if vector is None and self.disk_store is not None:
+            vector = await run_blocking(self._lookup_disk, key)
+        elif vector is None:
+            vector = self._lookup_disk(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            if self.disk_store is not None:
+                await run_blocking(self._store, key, vector)
+            else:
+                self._store(key, vector)
+        return vector
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups
+            if lookups
+            else 0.0,
+            "size": len(self.memory),
+        }
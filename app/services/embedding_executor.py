@@ -0,0 +1,141 @@
+import asyncio
+import random
+import time
+
+import openai
+import tiktoken
+from langchain_core.embeddings import Embeddings
+
+from app.core.logger import logger
+
+
+# Encoding of the OpenAI embedding models
+EMBEDDING_ENCODING = "cl100k_base"
+
+
+class TokenBucket:
+    """
+    Async rate limiter that hands out ``rate_per_minute`` tokens per minute.
+
+    The bucket holds at most a minute worth of tokens, so idle time allows a
+    burst of up to that size.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self._tokens = rate_per_minute
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    async def acquire(self, tokens: float):
+        # Requests larger than the bucket would wait forever, so they take it all
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def get_retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingExecutor:
+    """
+    Embeds document chunks in token-sized batches under a tokens-per-minute budget.
+
+    At most ``concurrency`` batches are in flight across all ingestion jobs.
+    Rate limit and server errors are retried with exponential backoff, honouring
+    the Retry-After header when OpenAI sends one.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_tokens: int,
+        max_batch_size: int,
+        concurrency: int,
+        tokens_per_minute: int,
+        max_retries: int,
+        retry_backoff: float,
+    ):
+        self.embeddings = embeddings
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.encoding = tiktoken.get_encoding(EMBEDDING_ENCODING)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(tokens_per_minute)
+
+        self.batches = 0
+        self.tokens = 0
+        self.retries = 0
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def is_full(self, batch_tokens: int, batch_size: int, tokens: int) -> bool:
+        """
+        Whether a batch is too full to add a text of ``tokens`` tokens to.
+        """
+        return batch_size > 0 and (
+            batch_size >= self.max_batch_size
+            or batch_tokens + tokens > self.max_batch_tokens
+        )
+
+    async def embed(self, texts: list[str], tokens: int | None = None):
+        """
+        Embed one batch of texts.
+
+        :param tokens: Token count of the batch, if the caller already has it.
+        :return: The embeddings, in the order of ``texts``.
+        """
+        if tokens is None:
+            tokens = sum(self.count_tokens(text) for text in texts)
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self._bucket.acquire(tokens)
+                try:
+                    vectors = await self.embeddings.aembed_documents(texts)
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        raise
+                    delay = get_retry_after(e) or self.retry_backoff * 2**attempt
+                    delay *= 1 + random.random() / 4
+                    self.retries += 1
+                    logger.warning(
+                        f"Embedding batch failed, retrying in {delay:.1f}s: {e}"
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+
+                self.batches += 1
+                self.tokens += tokens
+                return vectors
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "tokens": self.tokens, "retries": self.retries}
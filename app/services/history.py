@@ -0,0 +1,204 @@
+import asyncio
+import contextlib
+from functools import lru_cache
+
+import tiktoken
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    get_buffer_string,
+)
+
+from app.core.logger import logger
+from app.services.conversation_store import ConversationStore
+
+
+SUMMARY_NAME = "conversation_summary"
+SUMMARY_PREFIX = "Summary of the conversation so far: "
+# Tokens the chat format adds around every message on top of its content
+MESSAGE_TOKEN_OVERHEAD = 4
+
+SUMMARY_PROMPT = "You keep a running summary of a phone call between a caller and an assistant. \
+                    Update the summary with the new lines of the conversation. Keep names, numbers, \
+                    requests and anything the assistant promised. Reply with the summary only."
+
+
+@lru_cache
+def get_encoding(model_name: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def is_summary(message: BaseMessage) -> bool:
+    return isinstance(message, SystemMessage) and message.name == SUMMARY_NAME
+
+
+def _split_summary(
+    messages: list[BaseMessage],
+) -> tuple[BaseMessage | None, list[BaseMessage]]:
+    if messages and is_summary(messages[0]):
+        return messages[0], messages[1:]
+    return None, messages
+
+
+class HistoryManager:
+    """
+    Keeps the prompts of a call within a token budget.
+
+    Prompts are built from the system message, the running summary, as many of
+    the latest turns as fit and the current user message. Once the stored turns
+    grow past ``summarize_ratio`` of the budget, the oldest ones are folded into
+    the summary by a background task until the rest fit in ``keep_ratio`` of it.
+    """
+
+    def __init__(
+        self,
+        store: ConversationStore,
+        summary_model: BaseChatModel,
+        model_name: str,
+        semaphore: asyncio.Semaphore | None = None,
+        summarize_ratio: float = 0.75,
+        keep_ratio: float = 0.5,
+    ):
+        self.store = store
+        self.summary_model = summary_model
+        self.encoding = get_encoding(model_name)
+        self.semaphore = semaphore or asyncio.Semaphore()
+        self.summarize_ratio = summarize_ratio
+        self.keep_ratio = keep_ratio
+        self._summary_tasks: dict[str, asyncio.Task] = {}
+
+        self.turns = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.trimmed_turns = 0
+        self.summaries = 0
+
+    def count_tokens(self, messages: list[BaseMessage]) -> int:
+        return sum(
+            len(self.encoding.encode(str(message.content))) + MESSAGE_TOKEN_OVERHEAD
+            for message in messages
+        )
+
+    async def build_prompt(
+        self,
+        session_id: str,
+        system_message: SystemMessage,
+        user_message: HumanMessage,
+        budget: int,
+    ) -> list[BaseMessage]:
+        """
+        Build the prompt for the next turn of a call.
+
+        :param user_message: The current message, sent with its retrieved context.
+            It is not added to the history.
+        :param budget: The token budget of the whole prompt.
+        """
+        summary, turns = _split_summary(await self.store.get_messages(session_id))
+        head = [system_message] + ([summary] if summary else [])
+        available = budget - self.count_tokens(head + [user_message])
+
+        window = []
+        history_tokens = 0
+        full = False
+        for message in reversed(turns):
+            tokens = self.count_tokens([message])
+            history_tokens += tokens
+            full = full or tokens > available
+            if not full:
+                window.append(message)
+                available -= tokens
+        window.reverse()
+
+        if history_tokens > budget * self.summarize_ratio:
+            self._schedule_summary(session_id, budget)
+
+        prompt = head + window + [user_message]
+        prompt_tokens = self.count_tokens(prompt)
+        self.turns += 1
+        self.prompt_tokens += prompt_tokens
+        self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+        self.trimmed_turns += len(turns) - len(window)
+        logger.debug(
+            "Prompt for %s: %d tokens, %d of %d history messages",
+            session_id,
+            prompt_tokens,
+            len(window),
+            len(turns),
+        )
+        return prompt
+
+    def _schedule_summary(self, session_id: str, budget: int):
+        task = self._summary_tasks.get(session_id)
+        if task is not None and not task.done():
+            return
+
+        task = asyncio.create_task(self._summarize(session_id, budget))
+        self._summary_tasks[session_id] = task
+        task.add_done_callback(lambda _: self._forget_task(session_id, task))
+
+    def _forget_task(self, session_id: str, task: asyncio.Task):
+        if self._summary_tasks.get(session_id) is task:
+            del self._summary_tasks[session_id]
+
+    async def _summarize(self, session_id: str, budget: int):
+        summary, turns = _split_summary(await self.store.get_messages(session_id))
+
+        keep_tokens = budget * self.keep_ratio
+        split = len(turns)
+        while split > 0:
+            keep_tokens -= self.count_tokens([turns[split - 1]])
+            if keep_tokens < 0:
+                break
+            split -= 1
+        if split == 0:
+            return
+
+        previous = summary.content.removeprefix(SUMMARY_PREFIX) if summary else ""
+        try:
+            async with self.semaphore:
+                response = await self.summary_model.ainvoke(
+                    [
+                        SystemMessage(content=SUMMARY_PROMPT),
+                        HumanMessage(
+                            content=f"<summary>{previous}</summary>\n"
+                            f"<new_lines>{get_buffer_string(turns[:split])}</new_lines>"
+                        ),
+                    ]
+                )
+        except Exception:
+            logger.exception("Could not summarize the history of %s", session_id)
+            return
+
+        new_summary = SystemMessage(
+            content=f"{SUMMARY_PREFIX}{response.content}",
+            name=SUMMARY_NAME,
+        )
+        await self.store.replace_prefix(
+            session_id, split + (1 if summary else 0), [new_summary]
+        )
+        self.summaries += 1
+
+    async def end(self, session_id: str):
+        """
+        Cancel the pending summary of a call and delete its history.
+        """
+        task = self._summary_tasks.pop(session_id, None)
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await self.store.delete(session_id)
+
+    def stats(self) -> dict:
+        return {
+            "turns": self.turns,
+            "avg_prompt_tokens": self.prompt_tokens / self.turns if self.turns else 0,
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "trimmed_turns": self.trimmed_turns,
+            "summaries": self.summaries,
+        }
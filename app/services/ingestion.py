@@ -0,0 +1,339 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import BinaryIO
+
+from app.core.concurrency import run_blocking
+from app.core.config import settings
+from app.core.logger import logger
+from app.crud.ingestion_job import (
+    claim_chunk_hashes,
+    claim_ingestion_job,
+    finish_ingestion_job,
+    get_ingestion_job,
+    get_queued_ingestion_job_ids,
+    requeue_ingestion_job,
+    update_ingestion_progress,
+)
+from app.crud.knowledge_document import (
+    complete_document_ingestion,
+    get_document_by_hash,
+    get_referenced_chunk_hashes,
+    lock_knowledge_base,
+)
+from app.models.ingestion_job import IngestionJob
+from app.schemas.ingestion import IngestionStatus
+from app.services.assistant_cache import assistant_config_cache
+from app.services.rag import (
+    add_embedded_chunks,
+    delete_chunks,
+    delete_job_chunks,
+    get_embedding_executor,
+    get_existing_chunk_ids,
+    iter_document_chunks,
+)
+from app.services.response_cache import response_cache
+from app.services.retrieval import refresh_lexical_index
+
+
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+PDF_SIGNATURE = b"%PDF-"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def get_upload_path(job_id: uuid.UUID) -> str:
+    return os.path.join(settings.INGESTION_UPLOAD_DIR, f"{job_id}.pdf")
+
+
+def save_upload(file: BinaryIO, path: str) -> str:
+    """
+    Copy an uploaded PDF to ``path`` block by block.
+
+    :raises ValueError: If the file is not a PDF. Nothing is left at ``path``.
+    :return: The sha256 of the file content.
+    """
+    if not file.read(len(PDF_SIGNATURE)).startswith(PDF_SIGNATURE):
+        raise ValueError("Uploaded file is not a PDF")
+    file.seek(0)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    content_hash = hashlib.sha256()
+    with open(path, "wb") as destination:
+        while block := file.read(UPLOAD_BLOCK_SIZE):
+            content_hash.update(block)
+            destination.write(block)
+    return content_hash.hexdigest()
+
+
+def get_chunk_id(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+async def delete_unreferenced_job_chunks(assistant_id: uuid.UUID, job_id: uuid.UUID):
+    """
+    Delete the chunks a job wrote that no document or unfinished job uses.
+    """
+    async with lock_knowledge_base(assistant_id) as session:
+        referenced = await get_referenced_chunk_hashes(session, assistant_id)
+        await run_blocking(
+            delete_job_chunks, str(assistant_id), str(job_id), referenced
+        )
+
+
+class IngestionQueue:
+    """
+    Queue of document ingestion jobs processed by a pool of worker tasks.
+
+    Each job runs as three pipelined stages connected by bounded queues: the
+    PDF is parsed page by page into token-sized batches, ``embed_concurrency``
+    tasks per job embed them through the shared EmbeddingExecutor, and a single
+    writer adds them to Chroma and reports progress.
+    """
+
+    def __init__(self, workers: int, embed_concurrency: int):
+        self.workers = workers
+        self.embed_concurrency = embed_concurrency
+        self._queue: asyncio.Queue[uuid.UUID] | None = None
+        self._worker_tasks: list[asyncio.Task] = []
+        self._running: dict[uuid.UUID, asyncio.Task] = {}
+
+    async def start(self):
+        """
+        Start the workers and pick up the jobs that were queued before a restart.
+        """
+        self._queue = asyncio.Queue()
+        os.makedirs(settings.INGESTION_UPLOAD_DIR, exist_ok=True)
+        self._worker_tasks = [
+            asyncio.create_task(self._work()) for _ in range(self.workers)
+        ]
+        try:
+            for job_id in await get_queued_ingestion_job_ids():
+                self._queue.put_nowait(job_id)
+        except Exception as e:
+            logger.error(f"Could not requeue ingestion jobs: {e}")
+
+    async def stop(self):
+        """
+        Stop the workers. Interrupted jobs are queued again for the next start.
+        """
+        tasks = self._worker_tasks + list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def enqueue(self, job_id: uuid.UUID):
+        self._queue.put_nowait(job_id)
+
+    def cancel(self, job_id: uuid.UUID):
+        """
+        Stop a job running on this worker. Jobs running elsewhere notice the
+        cancelled status on their next progress update.
+        """
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                if not await claim_ingestion_job(job_id):
+                    continue
+                task = asyncio.create_task(self._run(job_id))
+                self._running[job_id] = task
+                await asyncio.wait([task])
+            except Exception as e:
+                logger.error(f"Ingestion worker failed on job {job_id}: {e}")
+            finally:
+                self._running.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _run(self, job_id: uuid.UUID):
+        job = await get_ingestion_job(job_id)
+        if job is None:
+            # Deleted along with its assistant after it was claimed
+            logger.warning(f"Ingestion job {job_id} no longer exists")
+            return
+        collection_name = str(job.assistant_id)
+        try:
+            identical = await get_document_by_hash(job.assistant_id, job.content_hash)
+            if identical is not None:
+                logger.info(f"Ingestion job {job_id} matches {identical.file_name}")
+                if await finish_ingestion_job(
+                    job_id,
+                    IngestionStatus.succeeded,
+                    document_id=identical.id,
+                    total_chunks=identical.chunk_count,
+                    processed_chunks=identical.chunk_count,
+                    reused_chunks=identical.chunk_count,
+                ):
+                    os.remove(job.file_path)
+                return
+
+            chunk_hashes = await self._ingest(job)
+            async with lock_knowledge_base(job.assistant_id):
+                removed_hashes = await complete_document_ingestion(
+                    job, chunk_hashes, size_bytes=os.path.getsize(job.file_path)
+                )
+                if removed_hashes:
+                    await run_blocking(delete_chunks, collection_name, removed_hashes)
+        except (asyncio.CancelledError, JobCancelled):
+            # Requeueing only succeeds when the worker is stopping; the chunks
+            # are kept so the job resumes after the restart. A cancel request
+            # has already moved the job out of the running status.
+            if not await requeue_ingestion_job(job_id):
+                await delete_unreferenced_job_chunks(job.assistant_id, job_id)
+            logger.info(f"Ingestion job {job_id} interrupted")
+            return
+        except Exception as e:
+            # Without a manifest entry the written chunks could not be deleted
+            # later, yet retrieval would return them; a retry embeds them again
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            await finish_ingestion_job(job_id, IngestionStatus.failed, error=str(e))
+            try:
+                await delete_unreferenced_job_chunks(job.assistant_id, job_id)
+            except Exception as e:
+                logger.error(f"Could not delete chunks of job {job_id}: {e}")
+            return
+        finally:
+            response_cache.invalidate(collection_name)
+            refresh_lexical_index(collection_name)
+            await assistant_config_cache.invalidate(collection_name)
+
+        if removed_hashes is None:
+            await delete_unreferenced_job_chunks(job.assistant_id, job_id)
+            return
+        os.remove(job.file_path)
+
+    async def _ingest(self, job: IngestionJob) -> list[str]:
+        """
+        Parse, embed and write the chunks of a document.
+
+        Chunks are stored under the sha256 of their content, so chunks already
+        in the assistant's collection, from another document, an earlier
+        version or an interrupted attempt, are not embedded again. The job
+        claims every chunk id it checks, so deleting another document cannot
+        remove a chunk the job reuses.
+
+        :return: The ids of the document's chunks, in document order.
+        """
+        job_id = job.id
+        collection_name = str(job.assistant_id)
+        batches: asyncio.Queue = asyncio.Queue(maxsize=self.embed_concurrency * 2)
+        embedded: asyncio.Queue = asyncio.Queue(maxsize=self.embed_concurrency * 2)
+        executor = get_embedding_executor()
+        chunk_ids: list[str] = []
+        seen: set[str] = set()
+
+        async def parse():
+            pages = iter_document_chunks(job.file_path, job.file_name)
+            parsed_pages = 0
+            batch_ids, batch, batch_tokens = [], [], 0
+            while (chunks := await run_blocking(next, pages, None)) is not None:
+                parsed_pages += 1
+                for chunk in chunks:
+                    chunk_id = get_chunk_id(chunk.page_content)
+                    if chunk_id in seen:
+                        continue
+                    seen.add(chunk_id)
+                    chunk_ids.append(chunk_id)
+
+                    tokens = executor.count_tokens(chunk.page_content)
+                    if executor.is_full(batch_tokens, len(batch), tokens):
+                        await batches.put((batch_ids, batch, batch_tokens))
+                        batch_ids, batch, batch_tokens = [], [], 0
+                    chunk.metadata["job_id"] = str(job_id)
+                    batch_ids.append(chunk_id)
+                    batch.append(chunk)
+                    batch_tokens += tokens
+                if not await update_ingestion_progress(
+                    job_id, parsed_pages=parsed_pages
+                ):
+                    raise JobCancelled()
+            if batch:
+                await batches.put((batch_ids, batch, batch_tokens))
+            for _ in range(self.embed_concurrency):
+                await batches.put(None)
+            await update_ingestion_progress(job_id, total_chunks=len(chunk_ids))
+
+        async def embed():
+            while (item := await batches.get()) is not None:
+                ids, batch, tokens = item
+                # Once claimed, chunks that exist are kept until the job ends;
+                # those deleted before the check are embedded again
+                async with lock_knowledge_base(job.assistant_id) as session:
+                    if not await claim_chunk_hashes(session, job_id, ids):
+                        raise JobCancelled()
+                    existing = set(
+                        await run_blocking(get_existing_chunk_ids, collection_name, ids)
+                    )
+                if existing:
+                    new = [
+                        (chunk_id, chunk)
+                        for chunk_id, chunk in zip(ids, batch)
+                        if chunk_id not in existing
+                    ]
+                    tokens = None
+                else:
+                    new = list(zip(ids, batch))
+
+                vectors = []
+                if new:
+                    vectors = await executor.embed(
+                        [chunk.page_content for _, chunk in new], tokens
+                    )
+                await embedded.put((len(ids), len(ids) - len(new), new, vectors))
+            await embedded.put(None)
+
+        async def write():
+            finished_embedders = 0
+            processed_chunks = 0
+            reused_chunks = 0
+            while finished_embedders < self.embed_concurrency:
+                item = await embedded.get()
+                if item is None:
+                    finished_embedders += 1
+                    continue
+
+                count, reused, new, vectors = item
+                if new:
+                    await run_blocking(
+                        add_embedded_chunks,
+                        collection_name,
+                        [chunk_id for chunk_id, _ in new],
+                        [chunk for _, chunk in new],
+                        vectors,
+                    )
+                processed_chunks += count
+                reused_chunks += reused
+                if not await update_ingestion_progress(
+                    job_id,
+                    processed_chunks=processed_chunks,
+                    reused_chunks=reused_chunks,
+                ):
+                    raise JobCancelled()
+
+        stages = [
+            asyncio.create_task(parse()),
+            *(asyncio.create_task(embed()) for _ in range(self.embed_concurrency)),
+            asyncio.create_task(write()),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+
+        return chunk_ids
+
+
+ingestion_queue = IngestionQueue(
+    workers=settings.INGESTION_WORKERS,
+    embed_concurrency=settings.INGESTION_EMBED_CONCURRENCY,
+)
@@ -1,67 +1,175 @@
-import tempfile
+import os
+from typing import Iterator
 
 from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
 from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 import chromadb
+from chromadb.api.models.Collection import Collection
 
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.embedding_cache import CachedEmbeddings, DiskEmbeddingStore
+from app.services.embedding_executor import EmbeddingExecutor
+from app.services.response_cache import response_cache
 
-chroma_client = chromadb.PersistentClient()
-PERSIST_DIRECTORY_PATH = "./chroma"
 
+chroma_client = chromadb.PersistentClient(path=settings.CHROMA_PERSIST_DIRECTORY)
 
-async def add_doc_to_vector_store(document, collection_name):
-    with tempfile.NamedTemporaryFile(delete=True, suffix=".pdf") as temp_file:
-        temp_file.write(document.file.read())
-        temp_file.flush()
+# Open collection handles keyed by collection (assistant id) name
+collections = LRUCache(max_size=settings.VECTOR_STORE_CACHE_SIZE)
 
-        loader = PyPDFLoader(temp_file.name)
-        loaded_docs = await loader.aload()
+_embeddings: CachedEmbeddings | None = None
+_embedding_executor: EmbeddingExecutor | None = None
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500, chunk_overlap=100
+text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+
+
+def get_embeddings() -> CachedEmbeddings:
+    """
+    Return the embeddings client shared by every collection handle.
+
+    Query embeddings are cached so repeated caller phrases skip the OpenAI request.
+    """
+    global _embeddings
+    if _embeddings is None:
+        openai_embeddings = OpenAIEmbeddings()
+        disk_store = None
+        if settings.EMBEDDING_CACHE_DIR:
+            disk_store = DiskEmbeddingStore(
+                os.path.join(settings.EMBEDDING_CACHE_DIR, "embeddings.sqlite3"),
+                ttl=settings.EMBEDDING_CACHE_TTL_SECONDS,
+                max_entries=settings.EMBEDDING_CACHE_DISK_MAX_ENTRIES,
+            )
+        _embeddings = CachedEmbeddings(
+            openai_embeddings,
+            model=openai_embeddings.model,
+            max_size=settings.EMBEDDING_CACHE_SIZE,
+            ttl=settings.EMBEDDING_CACHE_TTL_SECONDS,
+            disk_store=disk_store,
         )
-        chunks = text_splitter.split_documents(loaded_docs)
+    return _embeddings
+
 
-        vectorstore = Chroma(
-            collection_name=collection_name,
-            embedding_function=OpenAIEmbeddings(),
-            persist_directory=PERSIST_DIRECTORY_PATH,
+def get_embedding_executor() -> EmbeddingExecutor:
+    """
+    Return the executor that embeds document chunks for every ingestion job.
+
+    It uses its own client with the OpenAI SDK retries disabled, since the
+    executor handles rate limits itself.
+    """
+    global _embedding_executor
+    if _embedding_executor is None:
+        _embedding_executor = EmbeddingExecutor(
+            OpenAIEmbeddings(max_retries=0),
+            max_batch_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+            max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            concurrency=settings.EMBEDDING_MAX_CONCURRENT_BATCHES,
+            tokens_per_minute=settings.EMBEDDING_TOKENS_PER_MINUTE,
+            max_retries=settings.EMBEDDING_MAX_RETRIES,
+            retry_backoff=settings.EMBEDDING_RETRY_BACKOFF_SECONDS,
         )
+    return _embedding_executor
+
+
+def get_collection(collection_name: str, create: bool = False) -> Collection:
+    """
+    Return a cached handle of the collection, opening it on first use.
+
+    :param collection_name: Name of the collection, the assistant id.
+    :param create: Whether to create the collection if it does not exist yet.
+        When False a missing collection raises and nothing is cached.
+    """
+    collection = collections.get(collection_name)
+    if collection is None:
+        if create:
+            collection = chroma_client.get_or_create_collection(collection_name)
+        else:
+            collection = chroma_client.get_collection(collection_name)
+        collections.set(collection_name, collection)
+    return collection
+
+
+def invalidate_collection(collection_name: str):
+    collections.pop(collection_name)
+
+
+def delete_vector_store(collection_name: str):
+    invalidate_collection(collection_name)
+    response_cache.invalidate(collection_name)
+    try:
+        chroma_client.delete_collection(collection_name)
+    except Exception as e:
+        logger.warning(f"Could not delete collection {collection_name}: {e}")
 
-        vectorstore.add_documents(chunks)
 
+def iter_document_chunks(path: str, title: str) -> Iterator[list[Document]]:
+    """
+    Parse a PDF lazily and yield the chunks of one page at a time.
 
-def search_vector_store(collection_name: str, query: str):
-    vector_strore = Chroma(
-        collection_name=collection_name,
-        embedding_function=OpenAIEmbeddings(),
-        persist_directory=PERSIST_DIRECTORY_PATH,
-        create_collection_if_not_exists=False,
+    :param path: Path of the PDF file.
+    :param title: Original file name, stored as the ``title`` of every chunk.
+    """
+    for page in PyPDFLoader(path).lazy_load():
+        page.metadata = {
+            key: value for key, value in page.metadata.items() if value is not None
+        }
+        page.metadata["title"] = title
+        yield text_splitter.split_documents([page])
+
+
+def add_embedded_chunks(
+    collection_name: str,
+    ids: list[str],
+    chunks: list[Document],
+    embeddings: list[list[float]],
+):
+    """
+    Write chunks with precomputed embeddings to the assistant's collection.
+    """
+    collection = get_collection(collection_name, create=True)
+    collection.upsert(
+        ids=ids,
+        embeddings=embeddings,
+        documents=[chunk.page_content for chunk in chunks],
+        metadatas=[chunk.metadata for chunk in chunks],
     )
-    results = vector_strore.similarity_search_with_relevance_scores(query=query, k=5)
-    formatted_results = []
-    for doc in results:
-        formatted_results.append(
-            {
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-            }
-        )
-    return str(formatted_results)
 
 
-def files_in_collection(collection_name: str):
+def get_existing_chunk_ids(collection_name: str, ids: list[str]) -> list[str]:
+    collection = get_collection(collection_name, create=True)
+    return collection.get(ids=ids, include=[])["ids"]
+
+
+def delete_chunks(collection_name: str, ids: list[str]):
+    if not ids:
+        return
     try:
-        vector_strore = Chroma(
-            collection_name=collection_name,
-            embedding_function=OpenAIEmbeddings(),
-            persist_directory=PERSIST_DIRECTORY_PATH,
-            create_collection_if_not_exists=False,
-        )
-        data = vector_strore.get(include=["metadatas"])
-        unique_titles = list({item["title"] for item in data["metadatas"]})
-        return unique_titles
+        get_collection(collection_name).delete(ids=ids)
+    except Exception as e:
+        logger.warning(f"Could not delete chunks from {collection_name}: {e}")
+
+
+def delete_job_chunks(collection_name: str, job_id: str, keep: set[str]):
+    """
+    Delete the chunks an ingestion job wrote to the assistant's collection,
+    except for the ids in ``keep``.
+    """
+    try:
+        collection = get_collection(collection_name)
+        ids = collection.get(where={"job_id": job_id}, include=[])["ids"]
+    except Exception as e:
+        logger.warning(f"Could not find chunks of job {job_id}: {e}")
+        return
+    delete_chunks(
+        collection_name, [chunk_id for chunk_id in ids if chunk_id not in keep]
+    )
+
+
+def has_documents(collection_name: str) -> bool:
+    try:
+        return get_collection(collection_name).count() > 0
     except Exception:
-        return []
+        return False
@@ -0,0 +1,147 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.models.assistant import Assistant
+
+
+@dataclass
+class CachedResponse:
+    embedding: np.ndarray
+    response: str
+    created_at: float
+
+
+class AssistantResponses:
+    """
+    Cached replies of one assistant, grouped by the context they were generated with.
+    """
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.groups: OrderedDict[str, list[CachedResponse]] = OrderedDict()
+        self.size = 0
+
+
+class ResponseCache:
+    """
+    Per-assistant cache of LLM replies, matched by question similarity.
+
+    An entry is a hit when it was generated from the same retrieved context and
+    its question embedding is within the similarity threshold of the new one.
+    Entries made under a different system prompt are never served.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float,
+        ttl: float,
+        max_entries_per_assistant: int,
+        max_assistants: int,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries_per_assistant = max_entries_per_assistant
+        self._assistants = LRUCache(max_size=max_assistants)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def fingerprint(assistant: Assistant) -> str:
+        return hashlib.sha256(str(assistant.system_instructions).encode()).hexdigest()
+
+    @staticmethod
+    def context_key(context: str) -> str:
+        return hashlib.sha256(context.encode()).hexdigest()
+
+    def _get_responses(self, assistant: Assistant) -> AssistantResponses:
+        assistant_id = str(assistant.id)
+        fingerprint = self.fingerprint(assistant)
+        responses = self._assistants.get(assistant_id)
+        if responses is None or responses.fingerprint != fingerprint:
+            responses = AssistantResponses(fingerprint)
+            self._assistants.set(assistant_id, responses)
+        return responses
+
+    def lookup(
+        self, assistant: Assistant, embedding: list[float], context: str
+    ) -> str | None:
+        """
+        Return a cached reply for a similar question asked with the same context.
+
+        :param assistant: The assistant answering the question.
+        :param embedding: Embedding of the caller question.
+        :param context: The knowledge base context retrieved for the question.
+
+        :return: The cached reply, or None on a miss.
+        """
+        responses = self._get_responses(assistant)
+        group = responses.groups.get(self.context_key(context), [])
+        now = time.time()
+        live = [entry for entry in group if now - entry.created_at < self.ttl]
+        responses.size -= len(group) - len(live)
+        group[:] = live
+
+        if live:
+            query = _normalize(embedding)
+            similarities = np.stack([entry.embedding for entry in live]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity_threshold:
+                responses.groups.move_to_end(self.context_key(context))
+                self.hits += 1
+                return live[best].response
+
+        self.misses += 1
+        return None
+
+    def store(
+        self, assistant: Assistant, embedding: list[float], context: str, response: str
+    ):
+        responses = self._get_responses(assistant)
+        key = self.context_key(context)
+        responses.groups.setdefault(key, []).append(
+            CachedResponse(_normalize(embedding), response, time.time())
+        )
+        responses.groups.move_to_end(key)
+        responses.size += 1
+
+        while responses.size > self.max_entries_per_assistant:
+            oldest_key, oldest_group = next(iter(responses.groups.items()))
+            oldest_group.pop(0)
+            responses.size -= 1
+            if not oldest_group:
+                del responses.groups[oldest_key]
+
+    def invalidate(self, assistant_id: str):
+        if self._assistants.pop(str(assistant_id)) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "assistants": len(self._assistants),
+        }
+
+
+def _normalize(embedding: list[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+response_cache = ResponseCache(
+    similarity_threshold=settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+    max_entries_per_assistant=settings.RESPONSE_CACHE_MAX_ENTRIES_PER_ASSISTANT,
+    max_assistants=settings.RESPONSE_CACHE_MAX_ASSISTANTS,
+)
@@ -0,0 +1,353 @@
+import asyncio
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from app.core.cache import LRUCache
+from app.core.concurrency import blocking_executor, run_blocking
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.telemetry import span
+from app.services.history import get_encoding
+from app.services.rag import get_collection, get_embeddings
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Words that carry no meaning for lexical matching of spoken questions
+STOPWORDS = frozenset(
+    "a an and are as at be but by can could do does for from have how i if in is "
+    "it me my of on or our so that the their there this to was we what when where "
+    "which who why will with would you your".split()
+)
+# Separates the chunks in the packed context
+CHUNK_SEPARATOR = "\n\n"
+
+# Lexical indexes keyed by collection (assistant id) name
+lexical_indexes = LRUCache(
+    max_size=settings.RAG_LEXICAL_INDEX_CACHE_SIZE,
+    ttl=settings.RAG_LEXICAL_INDEX_TTL_SECONDS,
+)
+# Collections whose index rebuild is submitted but has not started yet
+_refreshes: set[str] = set()
+_refreshes_lock = threading.Lock()
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    In-memory BM25 index over the chunks of one collection.
+
+    Only the postings are kept; chunk texts are read back from Chroma for the
+    few chunks a search returns.
+    """
+
+    def __init__(self, ids: list[str], documents: list[str], k1=1.5, b=0.75):
+        self.ids = ids
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self.lengths: list[int] = []
+        for position, document in enumerate(documents):
+            tokens = tokenize(document or "")
+            self.lengths.append(len(tokens))
+            for token, count in Counter(tokens).items():
+                self.postings[token].append((position, count))
+        self.average_length = sum(self.lengths) / len(self.lengths) if ids else 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def idf(self, token: str) -> float:
+        matches = len(self.postings.get(token, ()))
+        return math.log(1 + (len(self.ids) - matches + 0.5) / (matches + 0.5))
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        """
+        :return: Up to ``k`` chunk ids and their BM25 scores, best first.
+        """
+        scores: dict[int, float] = defaultdict(float)
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = self.idf(token)
+            for position, count in postings:
+                length_norm = (
+                    1 - self.b + self.b * (self.lengths[position] / self.average_length)
+                )
+                scores[position] += (
+                    idf * count * (self.k1 + 1) / (count + self.k1 * length_norm)
+                )
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.ids[position], score) for position, score in best]
+
+
+def build_lexical_index(collection_name: str) -> BM25Index:
+    """
+    Build the BM25 index of a collection from all of its chunks and cache it.
+    """
+    with _refreshes_lock:
+        _refreshes.discard(collection_name)
+    chunks = get_collection(collection_name).get(include=["documents"])
+    index = BM25Index(chunks["ids"], chunks["documents"])
+    lexical_indexes.set(collection_name, index)
+    return index
+
+
+def _refresh(collection_name: str):
+    try:
+        build_lexical_index(collection_name)
+    except Exception as e:
+        # The collection was deleted, along with its assistant or last document
+        logger.warning(f"Could not build lexical index of {collection_name}: {e}")
+        lexical_indexes.pop(collection_name)
+
+
+def refresh_lexical_index(collection_name: str):
+    """
+    Rebuild the BM25 index of a collection in the background, after its chunks
+    changed. Until the build finishes, searches use the previous index.
+    """
+    with _refreshes_lock:
+        if collection_name in _refreshes:
+            return
+        _refreshes.add(collection_name)
+    blocking_executor.submit(_refresh, collection_name)
+
+
+def get_lexical_index(collection_name: str) -> BM25Index | None:
+    """
+    Return the cached BM25 index of a collection without building it, since a
+    build reads every chunk of the collection.
+
+    A missing index, or one whose chunk count no longer matches the collection
+    after an ingestion finished by another worker, is refreshed in the
+    background.
+
+    :return: The index, possibly stale, or None until the first build finishes.
+    """
+    index = lexical_indexes.get(collection_name)
+    if index is None or len(index) != get_collection(collection_name).count():
+        refresh_lexical_index(collection_name)
+    return index
+
+
+def invalidate_lexical_index(collection_name: str):
+    lexical_indexes.pop(collection_name)
+
+
+@dataclass
+class RetrievedChunk:
+    id: str
+    content: str
+    metadata: dict
+    score: float = 0.0
+
+
+def get_similarity(distance: float, space: str) -> float:
+    """
+    Convert a Chroma distance to a cosine similarity. OpenAI embeddings are
+    normalized, so the squared L2 distance is ``2 - 2 * cosine``, and both
+    the ``ip`` and ``cosine`` distances are ``1 - cosine``.
+    """
+    if space == "l2":
+        return 1 - distance / 2
+    return 1 - distance
+
+
+def dense_search(
+    collection_name: str, embedding: list[float], k: int
+) -> list[RetrievedChunk]:
+    collection = get_collection(collection_name)
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    results = collection.query(
+        query_embeddings=[embedding],
+        n_results=k,
+        include=["documents", "metadatas", "distances"],
+    )
+    return [
+        RetrievedChunk(
+            id=chunk_id,
+            content=document,
+            metadata=metadata or {},
+            score=get_similarity(distance, space),
+        )
+        for chunk_id, document, metadata, distance in zip(
+            results["ids"][0],
+            results["documents"][0],
+            results["metadatas"][0],
+            results["distances"][0],
+        )
+    ]
+
+
+def lexical_search(collection_name: str, query: str, k: int) -> list[tuple[str, float]]:
+    index = get_lexical_index(collection_name)
+    if index is None:
+        return []
+    return index.search(query, k)
+
+
+def get_chunks(collection_name: str, ids: list[str]) -> list[RetrievedChunk]:
+    if not ids:
+        return []
+    chunks = get_collection(collection_name).get(
+        ids=ids, include=["documents", "metadatas"]
+    )
+    return [
+        RetrievedChunk(id=chunk_id, content=document, metadata=metadata or {})
+        for chunk_id, document, metadata in zip(
+            chunks["ids"], chunks["documents"], chunks["metadatas"]
+        )
+    ]
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[str]], k: int = 60
+) -> list[tuple[str, float]]:
+    """
+    Fuse ranked lists of ids, scoring each id by the sum of ``1 / (k + rank)``.
+
+    :return: The ids and their fused scores, best first.
+    """
+    scores: dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] += 1 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def format_chunk(chunk: RetrievedChunk) -> str:
+    source = chunk.metadata.get("title")
+    page = chunk.metadata.get("page")
+    if source and isinstance(page, int):
+        source = f"{source}, page {page + 1}"
+    content = " ".join(chunk.content.split())
+    return f"[{source}] {content}" if source else content
+
+
+def pack_context(chunks: list[RetrievedChunk], budget: int, encoding) -> str:
+    """
+    Join the formatted chunks, best first, skipping those that no longer fit
+    in ``budget`` tokens.
+    """
+    packed = []
+    used = 0
+    separator_tokens = len(encoding.encode(CHUNK_SEPARATOR))
+    for chunk in chunks:
+        text = format_chunk(chunk)
+        tokens = len(encoding.encode(text, disallowed_special=()))
+        if packed:
+            tokens += separator_tokens
+        if used + tokens > budget:
+            continue
+        packed.append(text)
+        used += tokens
+    return CHUNK_SEPARATOR.join(packed)
+
+
+class Retriever:
+    """
+    Hybrid retrieval over an assistant's knowledge base.
+
+    The Chroma vector search and a BM25 index each return ``candidates``
+    chunks. Dense hits below ``min_similarity`` and lexical hits below
+    ``min_lexical_score`` are dropped, the remaining rankings are fused with
+    reciprocal rank fusion and the best ``top_k`` chunks are packed into at
+    most ``context_token_budget`` tokens.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        top_k: int,
+        candidates: int,
+        min_similarity: float,
+        min_lexical_score: float,
+        context_token_budget: int,
+        rrf_k: int = 60,
+    ):
+        self.encoding = get_encoding(model_name)
+        self.top_k = top_k
+        self.candidates = candidates
+        self.min_similarity = min_similarity
+        self.min_lexical_score = min_lexical_score
+        self.context_token_budget = context_token_budget
+        self.rrf_k = rrf_k
+
+        self.searches = 0
+        self.empty_results = 0
+        self.chunks = 0
+
+    async def _dense_search(self, collection_name: str, query: str):
+        with span("embedding", purpose="retrieval"):
+            embedding = await get_embeddings().aembed_query(query)
+        return await run_blocking(
+            dense_search, collection_name, embedding, self.candidates
+        )
+
+    async def search(self, collection_name: str, query: str) -> list[RetrievedChunk]:
+        """
+        :return: The relevant chunks, best first.
+        """
+        dense_results, lexical_results = await asyncio.gather(
+            self._dense_search(collection_name, query),
+            run_blocking(lexical_search, collection_name, query, self.candidates),
+        )
+        dense_chunks = {
+            chunk.id: chunk
+            for chunk in dense_results
+            if chunk.score >= self.min_similarity
+        }
+        lexical_ids = [
+            chunk_id
+            for chunk_id, score in lexical_results
+            if score >= self.min_lexical_score
+        ]
+
+        fused = reciprocal_rank_fusion([list(dense_chunks), lexical_ids], k=self.rrf_k)[
+            : self.top_k
+        ]
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in dense_chunks]
+        chunks = dense_chunks | {
+            chunk.id: chunk
+            for chunk in await run_blocking(get_chunks, collection_name, missing)
+        }
+
+        results = []
+        for chunk_id, score in fused:
+            if chunk_id in chunks:
+                chunks[chunk_id].score = score
+                results.append(chunks[chunk_id])
+        return results
+
+    async def retrieve_context(self, collection_name: str, query: str) -> str:
+        """
+        Retrieve the knowledge base context for a user message.
+
+        :return: The relevant chunks as compact text, or an empty string when
+            nothing is relevant enough.
+        """
+        chunks = await self.search(collection_name, query)
+        self.searches += 1
+        self.chunks += len(chunks)
+        if not chunks:
+            self.empty_results += 1
+            return ""
+        return pack_context(chunks, self.context_token_budget, self.encoding)
+
+    def stats(self) -> dict:
+        return {
+            "searches": self.searches,
+            "empty_results": self.empty_results,
+            "average_chunks": self.chunks / self.searches if self.searches else 0,
+            "lexical_indexes": len(lexical_indexes),
+        }
@@ -1,31 +1,120 @@
+import asyncio
+import hashlib
+import json
 import os
-import requests
+from typing import AsyncIterator
+
+import httpx
+
+from app.core.config import settings
+from app.core.logger import logger
 
 
 DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
+DEEPGRAM_SPEECH_API = f"{settings.DEEPGRAM_API_URL}/v1/speak"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
 
+_speech_client: httpx.AsyncClient | None = None
 
-async def get_speech(text: str, voice: str, sid: str = ""):
-    if sid:
-        call_config = "&encoding=mulaw&sample_rate=8000&container=none"
-    else:
-        call_config = ""
 
-    if voice.upper() == "MALE":
-        voice = "aura-orion-en"
-    elif voice.upper() == "FEMALE":
-        voice = "aura-asteria-en"
+def get_speech_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide TTS HTTP client, creating it on first use.
+
+    The client keeps a pool of keep-alive connections to Deepgram so each
+    synthesis request skips the TCP and TLS handshake.
+    """
+    global _speech_client
+    if _speech_client is None or _speech_client.is_closed:
+        _speech_client = httpx.AsyncClient(
+            headers={
+                "Authorization": f"Token {DEEPGRAM_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            timeout=httpx.Timeout(
+                settings.TTS_TIMEOUT_SECONDS,
+                connect=settings.TTS_CONNECT_TIMEOUT_SECONDS,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.TTS_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TTS_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.TTS_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+    return _speech_client
+
+
+async def close_speech_client():
+    global _speech_client
+    if _speech_client is not None:
+        await _speech_client.aclose()
+        _speech_client = None
+
+
+def _get_speech_params(voice: str, call_type: str = "web") -> dict:
+    voice = (voice or "").upper()
+    if voice == "MALE":
+        model = "aura-orion-en"
+    elif voice == "FEMALE":
+        model = "aura-asteria-en"
     else:
-        voice = "aura-orion-en"
-
-    DEEPGRAM_SPEECH_API = (
-        f"https://api.deepgram.com/v1/speak?model={voice}{call_config}"
-    )
-    headers = {
-        "Authorization": f"Token {DEEPGRAM_API_KEY}",
-        "Content-Type": "application/json",
-    }
-    payload = {"text": text}
-    tts_response = requests.post(DEEPGRAM_SPEECH_API, headers=headers, json=payload)
-
-    return tts_response.content
+        model = "aura-orion-en"
+
+    params = {"model": model}
+    if call_type == "twilio":
+        params.update({"encoding": "mulaw", "sample_rate": 8000, "container": "none"})
+    return params
+
+
+async def stream_speech(
+    text: str, voice: str, call_type: str = "web"
+) -> AsyncIterator[bytes]:
+    """
+    Synthesize text with Deepgram and yield the audio as it is received.
+
+    Failed requests are retried with exponential backoff as long as no audio
+    has been yielded yet.
+
+    :param text: Text to synthesize.
+    :param voice: Assistant voice, either male or female.
+    :param call_type: Either web or twilio. Twilio audio is 8 kHz mulaw without a container.
+    """
+    client = get_speech_client()
+    params = _get_speech_params(voice, call_type)
+    streamed = False
+
+    for attempt in range(settings.TTS_MAX_RETRIES + 1):
+        try:
+            async with client.stream(
+                "POST", DEEPGRAM_SPEECH_API, params=params, json={"text": text}
+            ) as tts_response:
+                if tts_response.status_code >= 400:
+                    await tts_response.aread()
+                tts_response.raise_for_status()
+                async for chunk in tts_response.aiter_bytes(settings.TTS_CHUNK_SIZE):
+                    streamed = True
+                    yield chunk
+                return
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            retryable = isinstance(e, httpx.TransportError) or (
+                e.response.status_code in RETRYABLE_STATUS_CODES
+            )
+            if streamed or not retryable or attempt == settings.TTS_MAX_RETRIES:
+                raise
+            logger.warning(
+                "Retrying Deepgram speech request",
+                extra={"attempt": attempt + 1, "error": str(e)},
+            )
+            await asyncio.sleep(settings.TTS_RETRY_BACKOFF_SECONDS * 2**attempt)
+
+
+async def get_speech(text: str, voice: str, call_type: str = "web"):
+    return b"".join([chunk async for chunk in stream_speech(text, voice, call_type)])
+
+
+def get_speech_cache_key(text: str, voice: str, call_type: str = "web") -> str:
+    """
+    Return a key identifying the audio that text synthesizes to with these settings.
+    """
+    params = json.dumps(_get_speech_params(voice, call_type), sort_keys=True)
+    return hashlib.sha256(f"{params}\n{text}".encode()).hexdigest()
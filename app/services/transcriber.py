@@ -1,48 +1,81 @@
+import asyncio
 import json
 import os
-from random import randint
+import time
+from uuid import uuid4
+from typing import AsyncIterator
 
 from fastapi import WebSocket
-from deepgram import DeepgramClient, LiveTranscriptionEvents, LiveOptions
+from deepgram import (
+    DeepgramClient,
+    DeepgramClientOptions,
+    LiveTranscriptionEvents,
+    LiveOptions,
+)
 
-from app.services.chat_model import get_response
-from app.utils import send_message_to_socket, send_message_to_twilio
+from app.services.audio_stream import TwilioAudioWriter
+from app.services.audio_cache import (
+    DEFAULT_FIRST_MESSAGE,
+    FALLBACK_MESSAGE,
+    audio_cache,
+)
+from app.services.chat_model import (
+    end_conversation,
+    record_ai_message,
+    stream_response,
+)
+from app.services.speech import stream_speech
+from app.utils import send_clear_to_socket, send_speech_to_socket
+from app.core.config import settings
 from app.core.logger import logger
-from app.models.assistant import Assistant
+from app.core.telemetry import current_turn, record, span, start_turn
+from app.services.assistant_cache import AssistantConfig
+
+# Number of phrases that may be synthesized ahead of the one being sent
+MAX_PENDING_PHRASES = 3
+# Time allowed for Twilio to report playback of the last phrase of a reply
+PLAYBACK_GRACE_SECONDS = 1.0
 
 
 class DeepgramTranscriber:
     def __init__(
         self,
         client_socket: WebSocket,
-        assistant: Assistant,
+        assistant: AssistantConfig,
         call_type: str = "web",
         sid: str = "",
+        call_id: str | None = None,
     ):
         self.client_socket = client_socket
-        self.deepgram = DeepgramClient(os.getenv("DEEPGRAM_API_KEY"))
+        self.deepgram = DeepgramClient(
+            os.getenv("DEEPGRAM_API_KEY"),
+            DeepgramClientOptions(url=settings.DEEPGRAM_API_URL),
+        )
         self.dg_connection = self.deepgram.listen.asyncwebsocket.v("1")
-        self.llm_chat_history_id = randint(0, 9999)
+        self.llm_chat_history_id = call_id or uuid4().hex
         self.assistant = assistant
         self.call_type = call_type
         self.sid = sid
+        self.audio_writer = (
+            TwilioAudioWriter(client_socket, sid) if call_type == "twilio" else None
+        )
+        self._turn_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_TURNS_PER_CALL)
+        self._turn_tasks = set()
+        self._turn_count = 0
+        # When the first audio was sent to Deepgram, to time transcription
+        self._audio_started_at: float | None = None
+        self._stopped = False
         self._setup_event_handlers()
 
     async def send_first_message(self):
-        if not self.assistant.first_message:
-            first_message = "Hello"
-        else:
-            first_message = self.assistant.first_message
-
-        if self.call_type == "twilio":
-            await send_message_to_twilio(
-                self.client_socket, first_message, self.assistant.voice, sid=self.sid
-            )
+        first_message = self.assistant.first_message or DEFAULT_FIRST_MESSAGE
+        await self._send_canned_phrase(first_message)
 
-        if self.call_type == "web":
-            await send_message_to_socket(
-                self.client_socket, first_message, self.assistant.voice
-            )
+    async def _send_canned_phrase(self, phrase: str):
+        speech = await audio_cache.get_or_synthesize(
+            phrase, self.assistant.voice, self.call_type
+        )
+        await self._send_audio(phrase, speech)
 
     def _setup_event_handlers(self):
         event_handlers = {
@@ -64,21 +97,191 @@ class DeepgramTranscriber:
         sentence = result.channel.alternatives[0].transcript
         if not sentence:
             return
+        self._record_transcription(result)
         user_message = {"event": "message", "transcript": f"{sentence}"}
         await self.client_socket.send_text(json.dumps(user_message))
-        response_text = get_response(self.assistant, self.llm_chat_history_id, sentence)
 
-        if self.call_type == "twilio":
-            await send_message_to_twilio(
-                self.client_socket, response_text, self.assistant.voice, self.sid
-            )
-        if self.call_type == "web":
-            await send_message_to_socket(
-                self.client_socket, response_text, self.assistant.voice
+        # Reply in a separate task so the Deepgram receive loop keeps running
+        self._turn_count += 1
+        turn = asyncio.create_task(self._respond(sentence, self._turn_count))
+        self._turn_tasks.add(turn)
+        turn.add_done_callback(self._turn_tasks.discard)
+
+    def _record_transcription(self, result):
+        """
+        Record the time from the end of the transcribed audio to the transcript.
+
+        The audio is streamed in real time, so its end is reached that long
+        after the stream started.
+        """
+        if self._audio_started_at is None:
+            return
+        audio_end = self._audio_started_at + result.start + result.duration
+        now = time.perf_counter()
+        if audio_end <= now:
+            record("stt_final", audio_end, now)
+
+    async def _respond(self, sentence: str, index: int):
+        deliveries = []
+        async with self._turn_semaphore:
+            try:
+                with start_turn(
+                    self.llm_chat_history_id, index, call_type=self.call_type
+                ):
+                    phrases = stream_response(
+                        self.assistant, self.llm_chat_history_id, sentence
+                    )
+                    await self._speak(phrases, deliveries)
+            except Exception as e:
+                logger.error(f"Failed to respond to caller: {e}")
+                try:
+                    await self._send_canned_phrase(FALLBACK_MESSAGE)
+                except Exception as e:
+                    logger.error(f"Failed to send fallback message: {e}")
+            finally:
+                # Only what the caller heard goes into the history, so an
+                # interrupted reply is remembered as far as it was played
+                spoken = [
+                    phrase
+                    for phrase, played in deliveries
+                    if played.done() and not played.cancelled()
+                ]
+                await record_ai_message(self.llm_chat_history_id, " ".join(spoken))
+
+    async def _speak(
+        self,
+        phrases: AsyncIterator[str],
+        deliveries: list[tuple[str, asyncio.Future]],
+    ):
+        """
+        Synthesize reply phrases as the LLM produces them and send the audio in order.
+
+        TTS for the next phrases runs while the current one is being sent, so the
+        caller hears the first sentence before the full reply has been generated.
+        Each sent phrase is added to deliveries with a future resolved once it
+        has been played.
+        """
+        pending = asyncio.Queue(maxsize=MAX_PENDING_PHRASES)
+
+        async def synthesize():
+            try:
+                async for phrase in phrases:
+                    audio = asyncio.Queue()
+                    synthesis = asyncio.create_task(self._buffer_speech(phrase, audio))
+                    try:
+                        await pending.put((phrase, audio, synthesis))
+                    except asyncio.CancelledError:
+                        synthesis.cancel()
+                        raise
+            finally:
+                await pending.put(None)
+
+        producer = asyncio.create_task(synthesize())
+        synthesis = None
+        try:
+            while (item := await pending.get()) is not None:
+                phrase, audio, synthesis = item
+                played = await self._send_speech(phrase, _drain(audio))
+                # Twilio calls mark it when the first frame is sent
+                if turn := current_turn.get():
+                    turn.mark_once("first_audio")
+                deliveries.append((phrase, played))
+                await synthesis
+            await producer
+        finally:
+            producer.cancel()
+            if synthesis is not None:
+                synthesis.cancel()
+            while not pending.empty():
+                item = pending.get_nowait()
+                if item is not None:
+                    item[2].cancel()
+
+        if deliveries and self.audio_writer is not None:
+            # Paced audio finishes playing shortly after the last frame is sent
+            await asyncio.wait(
+                [deliveries[-1][1]],
+                timeout=self.audio_writer.lead_seconds + PLAYBACK_GRACE_SECONDS,
             )
 
+    async def interrupt(self):
+        """
+        Stop the reply in progress because the caller started talking.
+
+        Cancels LLM generation and TTS for the call and tells the client to drop
+        the audio it has buffered but not played yet.
+        """
+        turns = [turn for turn in self._turn_tasks if not turn.done()]
+        if not turns:
+            return
+
+        for turn in turns:
+            turn.cancel()
+        await asyncio.gather(*turns, return_exceptions=True)
+
+        if self.audio_writer is not None:
+            await self.audio_writer.clear()
+        else:
+            await send_clear_to_socket(self.client_socket)
+
+    async def _buffer_speech(self, phrase: str, audio: asyncio.Queue):
+        start = time.perf_counter()
+        first_byte = True
+        try:
+            async for chunk in stream_speech(
+                phrase, self.assistant.voice, self.call_type
+            ):
+                if first_byte:
+                    record("tts_first_byte", start)
+                    first_byte = False
+                await audio.put(chunk)
+            record("tts_complete", start, characters=len(phrase))
+        finally:
+            await audio.put(None)
+
+    async def _send_speech(
+        self, phrase: str, speech: AsyncIterator[bytes]
+    ) -> asyncio.Future:
+        if self.call_type == "twilio":
+            # Raw mulaw can be forwarded to Twilio as soon as each chunk arrives;
+            # the writer times only its websocket sends, not the pacing
+            sent_seconds = self.audio_writer.send_seconds
+            async for chunk in speech:
+                await self.audio_writer.write(chunk)
+            await self.audio_writer.flush()
+            played = await self.audio_writer.mark()
+            end = time.perf_counter()
+            send_seconds = self.audio_writer.send_seconds - sent_seconds
+            record("socket_send", end - send_seconds, end)
+            return played
+
+        audio = b"".join([chunk async for chunk in speech])
+        with span("socket_send", bytes=len(audio)):
+            return await self._send_audio(phrase, audio)
+
+    async def _send_audio(self, phrase: str, speech: bytes) -> asyncio.Future:
+        """
+        Send a complete piece of audio.
+
+        :return: A future resolved once the audio has been played. Web clients
+            do not report playback, so for them it resolves once sent.
+        """
+        if self.call_type == "twilio":
+            await self.audio_writer.write(speech)
+            await self.audio_writer.flush()
+            return await self.audio_writer.mark()
+
+        await send_speech_to_socket(self.client_socket, phrase, speech)
+        played = asyncio.get_running_loop().create_future()
+        played.set_result(None)
+        return played
+
+    def on_mark(self, name: str):
+        if self.audio_writer is not None:
+            self.audio_writer.on_mark(name)
+
     async def _on_speech_started(self, _, event, **__):
-        pass
+        await self.interrupt()
 
     async def _on_utterance_end(self, _, event, **__):
         pass
@@ -94,7 +297,7 @@ class DeepgramTranscriber:
 
     def _get_live_options(self) -> LiveOptions:
         if self.call_type == "web":
-            return LiveOptions(model="nova-3", punctuate=True)
+            return LiveOptions(model="nova-3", punctuate=True, vad_events=True)
         if self.call_type == "twilio":
             return LiveOptions(
                 model="nova-phonecall",
@@ -103,6 +306,7 @@ class DeepgramTranscriber:
                 sample_rate=8000,
                 encoding="mulaw",
                 smart_format=True,
+                vad_events=True,
             )
 
     async def start(self):
@@ -112,7 +316,29 @@ class DeepgramTranscriber:
         return self.dg_connection
 
     async def stop(self):
-        await self.dg_connection.finish()
+        """
+        Cancel running turns, finish the Deepgram stream and flush the
+        conversation history. Calling it again does nothing.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        turns = list(self._turn_tasks)
+        for turn in turns:
+            turn.cancel()
+        await asyncio.gather(*turns, return_exceptions=True)
+        try:
+            await self.dg_connection.finish()
+        except Exception as e:
+            logger.error(f"Failed to finish Deepgram stream: {e}")
+        await end_conversation(self.llm_chat_history_id)
 
     async def send(self, payload):
+        if self._audio_started_at is None:
+            self._audio_started_at = time.perf_counter()
         await self.dg_connection.send(payload)
+
+
+async def _drain(queue: asyncio.Queue) -> AsyncIterator[bytes]:
+    while (chunk := await queue.get()) is not None:
+        yield chunk
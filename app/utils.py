@@ -6,7 +6,6 @@ from fastapi import WebSocket
 from app.core import security
 from app.models.user import User
 from app.schemas.common import Token
-from app.services.speech import get_speech
 
 
 def generate_token_response_data(user: User) -> Token:
@@ -20,10 +19,9 @@ def generate_token_response_data(user: User) -> Token:
     )
 
 
-async def send_message_to_socket(
-    websocket: WebSocket, message: str, voice: str, sid: str = ""
+async def send_speech_to_socket(
+    websocket: WebSocket, message: str, speech: bytes, sid: str = ""
 ):
-    speech = await get_speech(message, voice)
     media_message = {
         "event": "media",
         "transcript": f"{message}",
@@ -36,16 +34,5 @@ async def send_message_to_socket(
     await websocket.send_text(json.dumps(media_message))
 
 
-async def send_message_to_twilio(
-    websocket: WebSocket, message: str, voice: str, sid: str = ""
-):
-    speech = await get_speech(message, voice, sid)
-    media_message = {
-        "event": "media",
-        "streamSid": sid,
-        "media": {
-            "payload": base64.b64encode(speech).decode("ascii"),
-            "track": "inbound",
-        },
-    }
-    await websocket.send_text(json.dumps(media_message))
+async def send_clear_to_socket(websocket: WebSocket):
+    await websocket.send_text(json.dumps({"event": "clear"}))
@@ -0,0 +1,34 @@
+import hashlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+# Dimensions of text-embedding-ada-002 and text-embedding-3-small
+EMBEDDING_DIMENSIONS = 1536
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> np.ndarray:
+    """
+    Deterministic unit vector for a text, so benchmarks run offline and
+    repeatably. Equal texts get equal vectors; different texts are close to
+    orthogonal.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    LangChain embeddings returning ``fake_embedding`` vectors.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [fake_embedding(text, self.dimensions).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return fake_embedding(text, self.dimensions).tolist()
@@ -0,0 +1,425 @@
+"""
+End-to-end call load generator.
+
+Opens concurrent web or Twilio call websockets against a running backend,
+replays caller audio in real time and measures how long each turn takes from
+the end of the caller's speech to the first audio of the reply.
+
+Example, with the backend and stubs started by the harness:
+
+    python -m benchmarks.load --spawn --assistant-id <id> --calls 20 \\
+        --output benchmarks/results/load.json
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import httpx
+import numpy as np
+import websockets
+
+from benchmarks.report import (
+    compare,
+    load_report,
+    new_report,
+    print_comparison,
+    save_report,
+    summarize,
+)
+from benchmarks.resources import ResourceSampler
+
+
+FRAME_SECONDS = 0.02
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class AudioFormat:
+    sample_rate: int
+    sample_width: int
+    silence: bytes
+
+    @property
+    def frame_bytes(self) -> int:
+        return int(self.sample_rate * FRAME_SECONDS) * self.sample_width
+
+
+# Web calls replay 16 kHz PCM16, Twilio streams carry 8 kHz mulaw
+AUDIO_FORMATS = {
+    "web": AudioFormat(sample_rate=16000, sample_width=2, silence=b"\x00\x00"),
+    "twilio": AudioFormat(sample_rate=8000, sample_width=1, silence=b"\xff"),
+}
+
+
+def encode_mulaw(samples: np.ndarray) -> bytes:
+    sign = (samples < 0).astype(np.uint8) << 7
+    magnitude = np.minimum(np.abs(samples.astype(np.int32)), 32635) + 0x84
+    exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 7, 0, 7)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return (
+        ~(sign | (exponent << 4).astype(np.uint8) | mantissa.astype(np.uint8))
+    ).tobytes()
+
+
+def synthetic_utterance(call_type: str, seconds: float) -> bytes:
+    """
+    A tone standing in for caller speech; the STT stub only detects its level.
+    """
+    audio_format = AUDIO_FORMATS[call_type]
+    times = (
+        np.arange(int(audio_format.sample_rate * seconds)) / audio_format.sample_rate
+    )
+    samples = (8000 * np.sin(2 * np.pi * 220 * times)).astype(np.int16)
+    if call_type == "twilio":
+        return encode_mulaw(samples)
+    return samples.astype("<i2").tobytes()
+
+
+def frames(audio: bytes, frame_bytes: int):
+    for start in range(0, len(audio), frame_bytes):
+        yield audio[start : start + frame_bytes]
+
+
+@dataclass
+class CallResult:
+    error: str | None = None
+    first_message_latency: float | None = None
+    turn_latencies: list[float] = field(default_factory=list)
+    transcript_latencies: list[float] = field(default_factory=list)
+    timeouts: int = 0
+
+
+class Call:
+    """
+    One simulated caller.
+
+    Audio is sent in 20 ms frames at real-time pace for the whole call,
+    silence between utterances, like a phone line. After each reply starts the
+    caller waits until no reply audio arrived for ``pause`` seconds before
+    speaking again.
+    """
+
+    def __init__(self, websocket, call_type: str, utterance: bytes, args):
+        self.websocket = websocket
+        self.call_type = call_type
+        self.audio_format = AUDIO_FORMATS[call_type]
+        self.utterance = utterance
+        self.args = args
+        self.stream_sid = f"MZ{uuid.uuid4().hex}"
+        self.result = CallResult()
+        self._frames_sent = 0
+        self._started_at = time.perf_counter()
+        self._waiting_since: float | None = None
+        self._answered = asyncio.Event()
+        self._last_audio_at = 0.0
+
+    async def _send_frame(self, frame: bytes):
+        next_frame_at = self._started_at + self._frames_sent * FRAME_SECONDS
+        await asyncio.sleep(max(0.0, next_frame_at - time.perf_counter()))
+        if self.call_type == "twilio":
+            await self.websocket.send(
+                json.dumps(
+                    {
+                        "event": "media",
+                        "streamSid": self.stream_sid,
+                        "media": {
+                            "track": "inbound",
+                            "payload": base64.b64encode(frame).decode(),
+                        },
+                    }
+                )
+            )
+        else:
+            await self.websocket.send(frame)
+        self._frames_sent += 1
+
+    async def _send_silence_until(self, done) -> bool:
+        """
+        Send silence until ``done()`` is true or the turn timeout passes.
+        """
+        silence = self.audio_format.silence * (
+            self.audio_format.frame_bytes // len(self.audio_format.silence)
+        )
+        deadline = time.perf_counter() + self.args.turn_timeout
+        while not done():
+            if time.perf_counter() > deadline:
+                return False
+            await self._send_frame(silence)
+        return True
+
+    def _reply_finished(self) -> bool:
+        return (
+            self._answered.is_set()
+            and time.perf_counter() - self._last_audio_at >= self.args.pause
+        )
+
+    async def _receive(self):
+        async for message in self.websocket:
+            if isinstance(message, bytes):
+                continue
+            data = json.loads(message)
+            event = data.get("event")
+            now = time.perf_counter()
+            if event == "media":
+                self._last_audio_at = now
+                if self._waiting_since is not None:
+                    latency = now - self._waiting_since
+                    if self.result.first_message_latency is None:
+                        self.result.first_message_latency = latency
+                    else:
+                        self.result.turn_latencies.append(latency)
+                    self._waiting_since = None
+                    self._answered.set()
+            elif event == "message" and self._waiting_since is not None:
+                self.result.transcript_latencies.append(now - self._waiting_since)
+            elif event == "mark":
+                # Twilio reports a mark once the audio before it has played;
+                # the backend paces its audio, so echo it right away
+                await self.websocket.send(
+                    json.dumps(
+                        {
+                            "event": "mark",
+                            "streamSid": self.stream_sid,
+                            "mark": data["mark"],
+                        }
+                    )
+                )
+
+    async def run(self):
+        receiver = asyncio.create_task(self._receive())
+        try:
+            if self.call_type == "twilio":
+                await self.websocket.send(
+                    json.dumps(
+                        {
+                            "event": "start",
+                            "streamSid": self.stream_sid,
+                            "start": {
+                                "streamSid": self.stream_sid,
+                                "customParameters": {
+                                    "assistant_id": self.args.assistant_id
+                                },
+                            },
+                        }
+                    )
+                )
+
+            self._waiting_since = time.perf_counter()
+            if not await self._send_silence_until(self._reply_finished):
+                self.result.timeouts += 1
+            for _ in range(self.args.turns):
+                self._answered.clear()
+                for frame in frames(self.utterance, self.audio_format.frame_bytes):
+                    await self._send_frame(frame)
+                self._waiting_since = time.perf_counter()
+                if not await self._send_silence_until(self._reply_finished):
+                    self.result.timeouts += 1
+                    self._waiting_since = None
+
+            if self.call_type == "twilio":
+                await self.websocket.send(
+                    json.dumps({"event": "stop", "streamSid": self.stream_sid})
+                )
+        finally:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+
+
+def get_call_url(args) -> str:
+    base = args.url.replace("http://", "ws://").replace("https://", "wss://")
+    if args.call_type == "twilio":
+        return f"{base}/api/call/stream"
+    return f"{base}/api/call/web_call?assistant_id={args.assistant_id}"
+
+
+async def run_call(index: int, args, utterance: bytes) -> CallResult:
+    await asyncio.sleep(args.ramp_seconds * index / max(args.calls, 1))
+    try:
+        async with websockets.connect(get_call_url(args), max_size=None) as websocket:
+            call = Call(websocket, args.call_type, utterance, args)
+            await call.run()
+            return call.result
+    except Exception as e:
+        return CallResult(error=f"{type(e).__name__}: {e}")
+
+
+async def run_load(args, server_pid: int | None) -> dict:
+    if args.audio:
+        with open(args.audio, "rb") as file:
+            utterance = file.read()
+    else:
+        utterance = synthetic_utterance(args.call_type, args.utterance_seconds)
+
+    sampler = ResourceSampler(server_pid) if server_pid else None
+    sampling = asyncio.create_task(sampler.run()) if sampler else None
+    started_at = time.perf_counter()
+    try:
+        results = await asyncio.gather(
+            *(run_call(index, args, utterance) for index in range(args.calls))
+        )
+    finally:
+        if sampling is not None:
+            sampling.cancel()
+    elapsed = time.perf_counter() - started_at
+
+    errors = [result.error for result in results if result.error]
+    turn_latencies = [
+        latency for result in results for latency in result.turn_latencies
+    ]
+    return {
+        "calls": {"started": args.calls, "failed": len(errors)},
+        "errors": sorted(set(errors))[:10],
+        "turn_timeouts": sum(result.timeouts for result in results),
+        "turns_per_second": len(turn_latencies) / elapsed,
+        "elapsed_seconds": elapsed,
+        "turn_latency_seconds": summarize(turn_latencies),
+        "first_message_latency_seconds": summarize(
+            [
+                result.first_message_latency
+                for result in results
+                if result.first_message_latency is not None
+            ]
+        ),
+        "transcript_latency_seconds": summarize(
+            [latency for result in results for latency in result.transcript_latencies]
+        ),
+        "server": sampler.summary() if sampler else {},
+    }
+
+
+def wait_until_up(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def spawn_servers(args) -> list[subprocess.Popen]:
+    """
+    Start the API stubs and the backend pointed at them. Database and Redis
+    settings come from the environment, as for a normal run.
+    """
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stubs = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stubs", "--port", str(args.stub_port)],
+        cwd=ROOT_DIRECTORY,
+    )
+    env = {
+        **os.environ,
+        "DEEPGRAM_API_URL": stub_url,
+        "DEEPGRAM_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "OPENAI_API_KEY": "stub",
+    }
+    backend = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(args.port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT_DIRECTORY,
+        env=env,
+    )
+    wait_until_up(f"{stub_url}/docs")
+    wait_until_up(f"http://127.0.0.1:{args.port}/")
+    return [backend, stubs]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--assistant-id", required=True)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--call-type", choices=sorted(AUDIO_FORMATS), default="web")
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument(
+        "--ramp-seconds", type=float, default=5, help="Spread call starts over"
+    )
+    parser.add_argument(
+        "--audio",
+        help="Raw caller audio replayed every turn: 16 kHz PCM16 for web calls, "
+        "8 kHz mulaw for Twilio calls. A tone is used by default.",
+    )
+    parser.add_argument("--utterance-seconds", type=float, default=1.5)
+    parser.add_argument(
+        "--pause", type=float, default=1.0, help="Silence after a reply ends"
+    )
+    parser.add_argument("--turn-timeout", type=float, default=20)
+    parser.add_argument(
+        "--spawn",
+        action="store_true",
+        help="Start the API stubs and a backend on --port instead of using --url",
+    )
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--server-pid", type=int, help="Sample CPU and memory of this process"
+    )
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare with this earlier report")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    processes = []
+    server_pid = args.server_pid
+    if args.spawn:
+        processes = spawn_servers(args)
+        args.url = f"http://127.0.0.1:{args.port}"
+        server_pid = processes[0].pid
+    try:
+        report = new_report(
+            "load",
+            {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("output", "baseline", "server_pid")
+            },
+        )
+        report["results"] = asyncio.run(run_load(args, server_pid))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    print(json.dumps(report["results"], indent=2))
+    if args.output:
+        save_report(report, args.output)
+    if args.baseline:
+        rows = compare(
+            report,
+            load_report(args.baseline),
+            higher_is_better=("turns_per_second",),
+            tolerance=args.tolerance,
+        )
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
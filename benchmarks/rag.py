@@ -0,0 +1,306 @@
+"""
+Microbenchmarks of the knowledge base hot paths.
+
+- ingestion: splitting, embedding and writing chunks, in pages/s and chunks/s
+- search: hybrid retrieval latency, with its dense and lexical parts, against
+  collections of increasing size
+- has_documents: the collection check done when an assistant is loaded
+
+Embeddings are deterministic fakes and Chroma writes to a temporary
+directory, so the suite runs offline and its results are comparable between
+runs on the same machine.
+
+    python -m benchmarks.rag --sizes 1000,10000,100000 \\
+        --output benchmarks/results/rag.json --baseline benchmarks/baselines/rag.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fakes import FakeEmbeddings
+from benchmarks.report import (
+    compare,
+    load_report,
+    new_report,
+    print_comparison,
+    save_report,
+    summarize,
+)
+
+
+# Settings without defaults; the benchmark never uses these services
+PLACEHOLDER_SETTINGS = {
+    "BACKEND_CORS_ORIGINS": "http://localhost",
+    "SECRET_KEY": "benchmark",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_USER": "benchmark",
+    "TWILIO_ACCOUNT_SID": "benchmark",
+    "TWILIO_AUTH_TOKEN": "benchmark",
+    "TWILIO_PHONE_NUMBER": "benchmark",
+    "NGROK_URL": "http://localhost",
+    "FIRST_SUPERUSER_EMAIL": "benchmark@example.com",
+    "FIRST_SUPERUSER_PASSWORD": "benchmark",
+}
+VOCABULARY_SIZE = 20000
+WORDS_PER_PAGE = 450
+WRITE_BATCH_SIZE = 5000
+
+
+class TextGenerator:
+    """
+    Deterministic filler text with a Zipf word distribution, so the lexical
+    index sees realistic posting list lengths.
+    """
+
+    def __init__(self, seed: int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.vocabulary = [f"w{index:x}" for index in range(VOCABULARY_SIZE)]
+
+    def words(self, count: int) -> list[str]:
+        ranks = np.minimum(self.rng.zipf(1.3, count), VOCABULARY_SIZE) - 1
+        return [self.vocabulary[rank] for rank in ranks]
+
+    def text(self, count: int) -> str:
+        return " ".join(self.words(count))
+
+
+def timed(function, *args) -> float:
+    """
+    :return: How long calling ``function`` took, in seconds.
+    """
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+async def timed_async(coroutine) -> float:
+    start = time.perf_counter()
+    await coroutine
+    return time.perf_counter() - start
+
+
+async def bench_ingestion(args, generator: TextGenerator) -> dict:
+    """
+    Run pages through the steps of an ingestion job after PDF parsing: split,
+    batch by tokens, embed through the EmbeddingExecutor and write to Chroma.
+    """
+    from langchain_core.documents import Document
+
+    from app.core.concurrency import run_blocking
+    from app.services.embedding_executor import EmbeddingExecutor
+    from app.services.ingestion import get_chunk_id
+    from app.services.rag import (
+        add_embedded_chunks,
+        iter_document_chunks,
+        text_splitter,
+    )
+
+    if args.pdf:
+        pages = list(iter_document_chunks(args.pdf, os.path.basename(args.pdf)))
+    else:
+        pages = [
+            text_splitter.split_documents(
+                [
+                    Document(
+                        page_content=generator.text(WORDS_PER_PAGE),
+                        metadata={"page": page, "title": "synthetic.pdf"},
+                    )
+                ]
+            )
+            for page in range(args.pages)
+        ]
+    executor = EmbeddingExecutor(
+        FakeEmbeddings(args.dimensions),
+        max_batch_tokens=20000,
+        max_batch_size=512,
+        concurrency=4,
+        tokens_per_minute=10**12,
+        max_retries=0,
+        retry_backoff=0,
+    )
+
+    async def write(batch):
+        vectors = await executor.embed([chunk.page_content for chunk in batch])
+        await run_blocking(
+            add_embedded_chunks,
+            "ingestion",
+            [get_chunk_id(chunk.page_content) for chunk in batch],
+            batch,
+            vectors,
+        )
+
+    start = time.perf_counter()
+    writes = []
+    batch, batch_tokens = [], 0
+    for chunks in pages:
+        for chunk in chunks:
+            tokens = executor.count_tokens(chunk.page_content)
+            if executor.is_full(batch_tokens, len(batch), tokens):
+                writes.append(asyncio.create_task(write(batch)))
+                batch, batch_tokens = [], 0
+            batch.append(chunk)
+            batch_tokens += tokens
+    if batch:
+        writes.append(asyncio.create_task(write(batch)))
+    await asyncio.gather(*writes)
+    elapsed = time.perf_counter() - start
+
+    chunk_count = sum(len(chunks) for chunks in pages)
+    return {
+        "pages": len(pages),
+        "chunks": chunk_count,
+        "pages_per_second": len(pages) / elapsed,
+        "chunks_per_second": chunk_count / elapsed,
+    }
+
+
+def populate(collection_name: str, size: int, dimensions: int, generator) -> float:
+    """
+    Fill a collection with ``size`` random chunks.
+
+    :return: The write throughput in chunks per second.
+    """
+    from app.services.rag import get_collection
+
+    collection = get_collection(collection_name, create=True)
+    rng = np.random.default_rng(size)
+    elapsed = 0.0
+    for offset in range(0, size, WRITE_BATCH_SIZE):
+        count = min(WRITE_BATCH_SIZE, size - offset)
+        vectors = rng.standard_normal((count, dimensions)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        documents = [generator.text(80) for _ in range(count)]
+        ids = [f"{collection_name}-{offset + index}" for index in range(count)]
+        metadatas = [
+            {"title": "synthetic.pdf", "page": index % 50} for index in range(count)
+        ]
+        elapsed += timed(
+            lambda: collection.add(
+                ids=ids,
+                embeddings=vectors.tolist(),
+                metadatas=metadatas,
+                documents=documents,
+            )
+        )
+    return size / elapsed
+
+
+async def bench_search(args, size: int, generator: TextGenerator) -> dict:
+    from app.core.concurrency import run_blocking
+    from app.services.rag import has_documents
+    from app.services.retrieval import (
+        Retriever,
+        dense_search,
+        build_lexical_index,
+        lexical_search,
+    )
+
+    collection_name = f"search-{size}"
+    write_rate = populate(collection_name, size, args.dimensions, generator)
+    retriever = Retriever(
+        model_name="gpt-4o-mini",
+        top_k=5,
+        candidates=20,
+        # Fake embeddings are unrelated to the text, keep every candidate
+        min_similarity=-1,
+        min_lexical_score=0,
+        context_token_budget=800,
+    )
+    queries = [generator.text(8) for _ in range(args.queries)]
+    embeddings = FakeEmbeddings(args.dimensions)
+
+    index_build = await timed_async(run_blocking(build_lexical_index, collection_name))
+    hybrid, dense, lexical, checks = [], [], [], []
+    for query in queries:
+        hybrid.append(await timed_async(retriever.search(collection_name, query)))
+        embedding = embeddings.embed_query(query)
+        dense.append(timed(dense_search, collection_name, embedding, 20))
+        lexical.append(timed(lexical_search, collection_name, query, 20))
+        checks.append(timed(has_documents, collection_name))
+
+    return {
+        "write_chunks_per_second": write_rate,
+        "lexical_index_build_seconds": index_build,
+        "hybrid_search_seconds": summarize(hybrid),
+        "dense_search_seconds": summarize(dense),
+        "lexical_search_seconds": summarize(lexical),
+        "has_documents_seconds": summarize(checks),
+    }
+
+
+async def run(args) -> dict:
+    import app.services.rag as rag
+
+    # Query embeddings of the retriever go through the shared client
+    rag._embeddings = FakeEmbeddings(args.dimensions)
+    generator = TextGenerator()
+    results = {"ingestion": await bench_ingestion(args, generator), "search": {}}
+    for size in args.sizes:
+        print(f"Benchmarking search over {size} chunks", file=sys.stderr)
+        results["search"][str(size)] = await bench_search(args, size, generator)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[1000, 10000, 100000],
+        help="Comma separated collection sizes, e.g. 1000,10000,1000000",
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--pdf", help="Ingest this PDF instead of synthetic pages")
+    parser.add_argument(
+        "--dimensions",
+        type=int,
+        default=1536,
+        help="Embedding size; lower it to fit million chunk collections in memory",
+    )
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare with this earlier report")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for key, value in PLACEHOLDER_SETTINGS.items():
+            os.environ.setdefault(key, value)
+        os.environ["CHROMA_PERSIST_DIRECTORY"] = directory
+
+        report = new_report(
+            "rag",
+            {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("output", "baseline")
+            },
+        )
+        report["results"] = asyncio.run(run(args))
+
+    print(json.dumps(report["results"], indent=2))
+    if args.output:
+        save_report(report, args.output)
+    if args.baseline:
+        rows = compare(
+            report,
+            load_report(args.baseline),
+            higher_is_better=("per_second",),
+            tolerance=args.tolerance,
+        )
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import json
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+
+
+def percentile(values: list[float], quantile: float) -> float:
+    """
+    Nearest-rank percentile of ``values``.
+    """
+    ordered = sorted(values)
+    return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(values: list[float]) -> dict:
+    """
+    Count, mean, p50/p95/p99 and max of a list of measurements.
+    """
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values),
+    }
+
+
+def new_report(benchmark: str, config: dict) -> dict:
+    return {
+        "benchmark": benchmark,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "config": config,
+        "results": {},
+    }
+
+
+def save_report(report: dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def load_report(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    """
+    Flatten nested results to dotted metric names, keeping numbers only.
+    """
+    metrics = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+
+def compare(
+    current: dict,
+    baseline: dict,
+    higher_is_better: tuple[str, ...],
+    tolerance: float = 0.1,
+) -> list[dict]:
+    """
+    Compare the results of two reports of the same benchmark.
+
+    Metrics whose name ends with one of ``higher_is_better`` regress when they
+    drop, every other metric when it grows, by more than ``tolerance`` of the
+    baseline value. Counts are not compared.
+
+    :return: One row per metric present in both reports.
+    """
+    current_metrics = flatten(current["results"])
+    baseline_metrics = flatten(baseline["results"])
+    rows = []
+    for name, value in sorted(current_metrics.items()):
+        if name not in baseline_metrics or name.endswith("count"):
+            continue
+        base = baseline_metrics[name]
+        if base:
+            change = (value - base) / base
+        else:
+            change = float("inf") if value > 0 else 0.0
+        if name.endswith(higher_is_better):
+            change = -change
+        rows.append(
+            {
+                "metric": name,
+                "baseline": base,
+                "current": value,
+                "change": change,
+                "regression": change > tolerance,
+            }
+        )
+    return rows
+
+
+def print_comparison(rows: list[dict]):
+    width = max((len(row["metric"]) for row in rows), default=0)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['metric']:<{width}}  {row['baseline']:>12.4f}  "
+            f"{row['current']:>12.4f}  {row['change']:>+8.1%}  {flag}"
+        )
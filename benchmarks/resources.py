@@ -0,0 +1,100 @@
+import asyncio
+import os
+import time
+
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def get_children(pid: int) -> list[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as file:
+                children.extend(int(child) for child in file.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def get_process_tree(pid: int) -> list[int]:
+    pids = [pid]
+    for child in get_children(pid):
+        pids.extend(get_process_tree(child))
+    return pids
+
+
+def read_usage(pid: int) -> tuple[float, int] | None:
+    """
+    :return: CPU seconds used and resident memory in bytes of a process, or
+        None if it is gone.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as file:
+            # The command name may contain spaces, the fields after it do not
+            stat = file.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as file:
+            resident_pages = int(file.read().split()[1])
+    except OSError:
+        return None
+    cpu_seconds = (int(stat[11]) + int(stat[12])) / CLOCK_TICKS
+    return cpu_seconds, resident_pages * PAGE_SIZE
+
+
+class ResourceSampler:
+    """
+    Samples the CPU and memory use of a server process and its workers.
+
+    Reads /proc, so it only works on Linux and for processes on this machine.
+    """
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self._previous: dict[int, tuple[float, float]] = {}
+        self.cpu_percent: dict[int, list[float]] = {}
+        self.rss_bytes: dict[int, list[int]] = {}
+
+    def sample(self):
+        now = time.monotonic()
+        for pid in get_process_tree(self.pid):
+            usage = read_usage(pid)
+            if usage is None:
+                continue
+            cpu_seconds, rss = usage
+            self.rss_bytes.setdefault(pid, []).append(rss)
+            if pid in self._previous:
+                previous_time, previous_cpu = self._previous[pid]
+                self.cpu_percent.setdefault(pid, []).append(
+                    100 * (cpu_seconds - previous_cpu) / (now - previous_time)
+                )
+            self._previous[pid] = (now, cpu_seconds)
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def summary(self) -> dict:
+        """
+        Mean and peak CPU and peak memory of every process that was seen, and
+        the same over all of them, which stays comparable between runs.
+        """
+        processes = {}
+        for pid, rss in self.rss_bytes.items():
+            cpu = self.cpu_percent.get(pid) or [0.0]
+            processes[str(pid)] = {
+                "cpu_percent_mean": sum(cpu) / len(cpu),
+                "cpu_percent_max": max(cpu),
+                "rss_mb_max": max(rss) / 2**20,
+            }
+        if not processes:
+            return {}
+        return {
+            "processes": processes,
+            "cpu_percent_mean_max": max(
+                process["cpu_percent_mean"] for process in processes.values()
+            ),
+            "rss_mb_max": max(process["rss_mb_max"] for process in processes.values()),
+        }
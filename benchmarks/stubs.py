@@ -0,0 +1,286 @@
+"""
+Local stand-ins for the Deepgram and OpenAI APIs with configurable latency.
+
+Run with ``python -m benchmarks.stubs`` and point the backend at it with
+``DEEPGRAM_API_URL=http://127.0.0.1:9100`` and
+``OPENAI_BASE_URL=http://127.0.0.1:9100/v1``.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, fields
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from benchmarks.fakes import fake_embedding
+
+
+TRANSCRIPTS = (
+    "What are your opening hours on weekdays",
+    "Can I book an appointment for tomorrow morning",
+    "How much does the basic plan cost per month",
+    "Do you have parking near the office",
+)
+# Sentence the chat stub repeats to build its replies
+REPLY_SENTENCE = "This is a synthetic reply from the benchmark language model."
+# Mean absolute PCM16 amplitude above which a frame counts as speech
+SPEECH_THRESHOLD = 500
+
+
+@dataclass
+class StubConfig:
+    stt_delay_ms: float = 150
+    stt_endpointing_ms: float = 300
+    llm_first_token_ms: float = 300
+    llm_token_ms: float = 15
+    llm_reply_sentences: int = 2
+    embedding_ms: float = 50
+    tts_first_byte_ms: float = 150
+    # How much faster than real time the TTS stub produces audio
+    tts_speedup: float = 10
+
+    @classmethod
+    def from_env(cls) -> "StubConfig":
+        values = {}
+        for field in fields(cls):
+            value = os.getenv(f"STUB_{field.name.upper()}")
+            if value is not None:
+                values[field.name] = field.type(value)
+        return cls(**values)
+
+
+config = StubConfig.from_env()
+app = FastAPI(title="Benchmark API stubs")
+
+
+def _mulaw_magnitudes() -> np.ndarray:
+    codes = ~np.arange(256, dtype=np.uint8)
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    return (((mantissa.astype(np.int32) << 3) + 0x84) << exponent) - 0x84
+
+
+MULAW_MAGNITUDES = _mulaw_magnitudes()
+
+
+def get_amplitude(audio: bytes, encoding: str) -> float:
+    if not audio:
+        return 0.0
+    if encoding == "mulaw":
+        return float(MULAW_MAGNITUDES[np.frombuffer(audio, dtype=np.uint8)].mean())
+    samples = np.frombuffer(audio[: len(audio) // 2 * 2], dtype="<i2")
+    return float(np.abs(samples.astype(np.int32)).mean()) if len(samples) else 0.0
+
+
+def transcript_result(transcript: str, start: float, duration: float) -> dict:
+    return {
+        "type": "Results",
+        "channel_index": [0, 1],
+        "duration": duration,
+        "start": start,
+        "is_final": True,
+        "speech_final": True,
+        "from_finalize": False,
+        "channel": {
+            "alternatives": [
+                {"transcript": transcript, "confidence": 0.99, "words": []}
+            ]
+        },
+        "metadata": {
+            "request_id": str(uuid.uuid4()),
+            "model_uuid": str(uuid.uuid4()),
+            "model_info": {"name": "stub", "version": "stub", "arch": "stub"},
+        },
+    }
+
+
+@app.websocket("/v1/listen")
+async def listen(websocket: WebSocket):
+    """
+    Streaming STT. Speech is detected by amplitude; once it is followed by
+    ``stt_endpointing_ms`` of silence a final transcript is sent after
+    ``stt_delay_ms``.
+    """
+    await websocket.accept()
+    encoding = websocket.query_params.get("encoding", "linear16")
+    sample_rate = int(websocket.query_params.get("sample_rate", 16000))
+    bytes_per_second = sample_rate * (1 if encoding == "mulaw" else 2)
+
+    audio_seconds = 0.0
+    speech_start = None
+    speech_end = None
+    utterances = 0
+    pending = set()
+
+    async def send_transcript(transcript: str, start: float, duration: float):
+        await asyncio.sleep(config.stt_delay_ms / 1000)
+        await websocket.send_text(
+            json.dumps(transcript_result(transcript, start, duration))
+        )
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                if json.loads(message["text"]).get("type") == "CloseStream":
+                    break
+                continue
+
+            audio = message.get("bytes") or b""
+            frame_seconds = len(audio) / bytes_per_second
+            if get_amplitude(audio, encoding) > SPEECH_THRESHOLD:
+                if speech_start is None:
+                    speech_start = audio_seconds
+                speech_end = audio_seconds + frame_seconds
+            audio_seconds += frame_seconds
+
+            if (
+                speech_start is not None
+                and audio_seconds - speech_end >= config.stt_endpointing_ms / 1000
+            ):
+                transcript = TRANSCRIPTS[utterances % len(TRANSCRIPTS)]
+                utterances += 1
+                task = asyncio.create_task(
+                    send_transcript(transcript, speech_start, speech_end - speech_start)
+                )
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                speech_start = speech_end = None
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+@app.post("/v1/speak")
+async def speak(request: Request):
+    """
+    TTS. Streams arbitrary audio bytes as long as the text would take to say.
+    """
+    text = (await request.json())["text"]
+    bytes_per_second = 8000 if request.query_params.get("encoding") == "mulaw" else 4000
+    # About 2.5 words are spoken per second
+    total = int(len(text.split()) / 2.5 * bytes_per_second)
+    chunk_size = 4096
+
+    async def audio():
+        await asyncio.sleep(config.tts_first_byte_ms / 1000)
+        sent = 0
+        while sent < total:
+            size = min(chunk_size, total - sent)
+            yield b"\x7f" * size
+            sent += size
+            await asyncio.sleep(size / bytes_per_second / config.tts_speedup)
+
+    return StreamingResponse(audio(), media_type="application/octet-stream")
+
+
+def _chat_chunk(completion_id: str, model: str, delta: dict, finish_reason=None):
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "stub")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    reply = " ".join([REPLY_SENTENCE] * config.llm_reply_sentences)
+
+    if not body.get("stream"):
+        words = len(reply.split())
+        await asyncio.sleep(
+            (config.llm_first_token_ms + config.llm_token_ms * words) / 1000
+        )
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": 0,
+                "completion_tokens": words,
+                "total_tokens": words,
+            },
+        }
+
+    async def events():
+        await asyncio.sleep(config.llm_first_token_ms / 1000)
+        yield _chat_chunk(completion_id, model, {"role": "assistant", "content": ""})
+        for position, word in enumerate(reply.split()):
+            content = word if position == 0 else f" {word}"
+            yield _chat_chunk(completion_id, model, {"content": content})
+            await asyncio.sleep(config.llm_token_ms / 1000)
+        yield _chat_chunk(completion_id, model, {}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"]
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    await asyncio.sleep(config.embedding_ms / 1000)
+
+    data = []
+    for index, item in enumerate(inputs):
+        # Token arrays are hashed as they are; only determinism matters here
+        vector = fake_embedding(item if isinstance(item, str) else str(item))
+        if body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(vector.tobytes()).decode()
+        else:
+            embedding = vector.tolist()
+        data.append({"object": "embedding", "index": index, "embedding": embedding})
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "stub"),
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    for field in fields(StubConfig):
+        parser.add_argument(
+            f"--{field.name.replace('_', '-')}",
+            type=field.type,
+            default=getattr(config, field.name),
+        )
+    args = parser.parse_args()
+    for field in fields(StubConfig):
+        setattr(config, field.name, getattr(args, field.name))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,4 +8,24 @@ alembic upgrade head
 
 # Start FastAPI server
 echo "Starting server..."
-uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
+if [ "${ENVIRONMENT:-local}" = "local" ]; then
+    uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
+else
+    # Serve with WEB_CONCURRENCY worker processes. They share this node's call
+    # capacity and assistant invalidations through Redis, so the in-memory
+    # defaults only work with one worker. Settings come from the environment
+    # and .env, as the app reads them.
+    workers="${WEB_CONCURRENCY:-4}"
+    if [ "$workers" -gt 1 ] && ! python -c '
+from app.core.config import settings
+raise SystemExit(
+    settings.CALL_STORE_BACKEND != "redis" or not settings.ASSISTANT_CACHE_PUBSUB
+)'; then
+        echo "WEB_CONCURRENCY=$workers needs CALL_STORE_BACKEND=redis and" \
+            "ASSISTANT_CACHE_PUBSUB=true, or set WEB_CONCURRENCY=1" >&2
+        exit 1
+    fi
+    uvicorn app.main:app --host 0.0.0.0 --port 8000 \
+        --workers "$workers" \
+        --proxy-headers --forwarded-allow-ips "*"
+fi
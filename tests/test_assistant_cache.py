@@ -0,0 +1,60 @@
+import asyncio
+from uuid import uuid4
+
+from app.services import assistant_cache
+from app.services.assistant_cache import AssistantConfig, AssistantConfigCache
+
+
+def make_config(system_instructions: str) -> AssistantConfig:
+    return AssistantConfig(
+        id=uuid4(),
+        system_instructions=system_instructions,
+        first_message="Hi",
+        voice="female",
+        response_cache_enabled=False,
+        history_token_budget=None,
+        has_knowledge_base=False,
+    )
+
+
+def test_concurrent_misses_share_one_load(monkeypatch):
+    loads = []
+
+    async def load(assistant_id):
+        loads.append(assistant_id)
+        await asyncio.sleep(0.01)
+        return make_config("Be helpful")
+
+    monkeypatch.setattr(assistant_cache, "load_assistant_config", load)
+    cache = AssistantConfigCache(max_size=10, ttl=60)
+
+    async def run():
+        configs = await asyncio.gather(*(cache.get("a") for _ in range(5)))
+        return configs, await cache.get("a")
+
+    configs, cached = asyncio.run(run())
+
+    assert loads == ["a"]
+    assert all(config is cached for config in configs)
+    assert cache.stats()["hits"] == 1
+
+
+def test_invalidation_during_load_is_not_cached(monkeypatch):
+    versions = iter(["Old instructions", "New instructions"])
+
+    async def load(assistant_id):
+        config = make_config(next(versions))
+        await asyncio.sleep(0.01)
+        return config
+
+    monkeypatch.setattr(assistant_cache, "load_assistant_config", load)
+    cache = AssistantConfigCache(max_size=10, ttl=60)
+
+    async def run():
+        pending = asyncio.ensure_future(cache.get("a"))
+        await asyncio.sleep(0)
+        await cache.invalidate("a")
+        await pending
+        return await cache.get("a")
+
+    assert asyncio.run(run()).system_instructions == "New instructions"
@@ -0,0 +1,67 @@
+import asyncio
+import base64
+import json
+
+from app.core.telemetry import start_turn
+from app.services.audio_stream import (
+    TWILIO_FRAME_BYTES,
+    TWILIO_FRAME_SECONDS,
+    TwilioAudioWriter,
+)
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send_text(self, data):
+        self.messages.append(json.loads(data))
+
+
+def test_audio_is_sent_in_padded_20ms_frames():
+    async def run():
+        socket = RecordingSocket()
+        writer = TwilioAudioWriter(socket, "MZ123", lead_seconds=10)
+        await writer.write(b"\x00" * (TWILIO_FRAME_BYTES * 2 + 10))
+        await writer.flush()
+        return socket.messages
+
+    messages = asyncio.run(run())
+    payloads = [base64.b64decode(message["media"]["payload"]) for message in messages]
+
+    assert [message["streamSid"] for message in messages] == ["MZ123"] * 3
+    assert [len(payload) for payload in payloads] == [TWILIO_FRAME_BYTES] * 3
+    assert payloads[2] == b"\x00" * 10 + b"\xff" * (TWILIO_FRAME_BYTES - 10)
+
+
+def test_send_time_excludes_pacing_and_first_frame_marks_first_audio():
+    async def run():
+        socket = RecordingSocket()
+        writer = TwilioAudioWriter(socket, "MZ123", lead_seconds=0)
+        with start_turn("call", 1) as turn:
+            await writer.write(b"\x00" * TWILIO_FRAME_BYTES * 4)
+        return writer, turn
+
+    writer, turn = asyncio.run(run())
+
+    # Three of the four frames waited for the previous one to play
+    assert writer.send_seconds < TWILIO_FRAME_SECONDS
+    assert [span["name"] for span in turn.spans] == ["first_audio"]
+    assert turn.spans[0]["duration_ms"] < TWILIO_FRAME_SECONDS * 1000
+
+
+def test_clear_cancels_marks_that_were_not_played():
+    async def run():
+        socket = RecordingSocket()
+        writer = TwilioAudioWriter(socket, "MZ123", lead_seconds=10)
+        first = await writer.mark()
+        second = await writer.mark()
+        writer.on_mark(socket.messages[0]["mark"]["name"])
+        await writer.clear()
+        return first, second, socket.messages[-1]
+
+    first, second, last_message = asyncio.run(run())
+
+    assert first.done() and not first.cancelled()
+    assert second.cancelled()
+    assert last_message == {"event": "clear", "streamSid": "MZ123"}
@@ -0,0 +1,171 @@
+import asyncio
+import signal
+import threading
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from app.services.call_registry import (
+    CallRegistry,
+    InMemoryCallStore,
+    RedisCallStore,
+    drain_on_signals,
+)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "redis":
+        return RedisCallStore(FakeAsyncRedis(decode_responses=True))
+    return InMemoryCallStore()
+
+
+def make_registry(store, node_id="node-1", capacity=2, url=None):
+    return CallRegistry(
+        store,
+        node_id=node_id,
+        node_url=url,
+        capacity=capacity,
+        lease=30,
+        heartbeat_interval=10,
+    )
+
+
+def test_capacity_is_shared_by_workers_of_a_node(store):
+    async def run():
+        first, second = make_registry(store), make_registry(store)
+        admitted = [
+            await first.admit("call-1", "assistant", "web"),
+            await second.admit("call-2", "assistant", "web"),
+            await second.admit("call-3", "assistant", "web"),
+        ]
+        await first.release("call-1")
+        admitted.append(await second.admit("call-3", "assistant", "web"))
+        return admitted, second.rejected
+
+    admitted, rejected = asyncio.run(run())
+
+    assert admitted == [True, True, False, True]
+    assert rejected == 1
+
+
+def test_locate_call(store):
+    async def run():
+        registry = make_registry(store)
+        await registry.admit("call-1", "assistant", "twilio")
+        located = await registry.locate("call-1")
+        await registry.release("call-1")
+        return located, await registry.locate("call-1")
+
+    located, released = asyncio.run(run())
+
+    assert located.node_id == "node-1"
+    assert located.call_type == "twilio"
+    assert released is None
+
+
+def test_expired_slots_are_freed(store):
+    async def run():
+        registry = make_registry(store, capacity=1)
+        await store.acquire_slot("node-1", "crashed", 1, lease=-1)
+        return await registry.admit("call-1", "assistant", "web")
+
+    assert asyncio.run(run()) is True
+
+
+def test_choose_node_prefers_local_then_least_loaded(store):
+    async def run():
+        local = make_registry(store, capacity=1)
+        busy = make_registry(store, node_id="node-2", capacity=4, url="https://n2")
+        idle = make_registry(store, node_id="node-3", capacity=4, url="https://n3")
+        for registry in (local, busy, idle):
+            await registry.heartbeat()
+        chosen = [(await local.choose_node()).node_id]
+
+        await local.admit("call-1", "assistant", "web")
+        await busy.admit("call-2", "assistant", "web")
+        chosen.append((await local.choose_node()).node_id)
+
+        await idle.start_draining()
+        chosen.append((await local.choose_node()).node_id)
+        return chosen
+
+    assert asyncio.run(run()) == ["node-1", "node-3", "node-2"]
+
+
+def test_draining_node_rejects_calls(store):
+    async def run():
+        registry = make_registry(store)
+        await registry.start_draining()
+        return await registry.admit("call-1", "assistant", "web")
+
+    assert asyncio.run(run()) is False
+
+
+def test_stop_releases_calls(store):
+    async def run():
+        registry = make_registry(store)
+        await registry.start()
+        await registry.admit("call-1", "assistant", "web")
+        await registry.stop()
+        return await store.count_slots("node-1"), await store.get_call("call-1")
+
+    assert asyncio.run(run()) == (0, None)
+
+
+def test_drain_waits_for_running_calls():
+    async def run():
+        registry = make_registry(InMemoryCallStore())
+        await registry.admit("call-1", "assistant", "web")
+        asyncio.get_running_loop().call_later(
+            0.05, asyncio.ensure_future, registry.release("call-1")
+        )
+        await registry.drain(timeout=5)
+        return registry.stats()
+
+    stats = asyncio.run(run())
+
+    assert stats["draining"] is True
+    assert stats["active_calls"] == 0
+    assert stats["drain"]["calls_at_start"] == 1
+    assert stats["drain"]["finished_at"] < stats["drain"]["deadline"]
+
+
+def test_drain_closes_calls_left_at_the_deadline():
+    async def run():
+        registry = make_registry(InMemoryCallStore())
+        closed = []
+
+        async def close():
+            closed.append("call-1")
+            await registry.release("call-1")
+
+        await registry.admit("call-1", "assistant", "web", close=close)
+        await registry.drain(timeout=0.01)
+        return closed, await registry.admit("call-2", "assistant", "web")
+
+    assert asyncio.run(run()) == (["call-1"], False)
+
+
+def test_signal_handlers_are_only_installed_on_the_main_thread():
+    signals = (signal.SIGINT, signal.SIGTERM)
+    previous = {signum: signal.getsignal(signum) for signum in signals}
+
+    async def install():
+        drain_on_signals(make_registry(InMemoryCallStore()), timeout=1)
+        return signal.getsignal(signal.SIGTERM)
+
+    # Like the lifespan run by a TestClient
+    handlers = []
+    thread = threading.Thread(target=lambda: handlers.append(asyncio.run(install())))
+    thread.start()
+    thread.join()
+
+    try:
+        main_thread_handler = asyncio.run(install())
+    finally:
+        for signum in signals:
+            signal.signal(signum, previous[signum])
+
+    assert handlers == [previous[signal.SIGTERM]]
+    assert main_thread_handler is not previous[signal.SIGTERM]
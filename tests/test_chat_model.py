@@ -0,0 +1,64 @@
+import asyncio
+
+from langchain_core.messages import AIMessageChunk
+
+import app.services.chat_model as chat_model_module
+from app.services.chat_model import split_phrases, stream_response
+
+
+class FakeChatModel:
+    async def astream(self, messages):
+        for content in ["Hello there! ", "How can I help? ", "Bye."]:
+            yield AIMessageChunk(content=content)
+
+
+def test_split_phrases_at_sentence_boundaries():
+    phrases, remainder = split_phrases("Hello there! How can I help you today? I")
+
+    assert phrases == ["Hello there!", "How can I help you today?"]
+    assert remainder == "I"
+
+
+def test_split_phrases_keeps_short_clauses_together():
+    phrases, remainder = split_phrases("Sure, we are open ")
+
+    assert phrases == []
+    assert remainder == "Sure, we are open "
+
+
+def test_split_phrases_at_clause_boundary_of_long_phrase():
+    text = "Our support team is available every weekday from nine to five, and "
+    phrases, remainder = split_phrases(text)
+
+    assert phrases == ["Our support team is available every weekday from nine to five,"]
+    assert remainder == "and "
+
+
+def test_llm_slot_is_released_before_the_reply_is_consumed(monkeypatch):
+    semaphore = asyncio.Semaphore(1)
+
+    async def add_user_turn(assistant, session_id, user_input):
+        return [], ""
+
+    async def lookup_cached_response(assistant, user_input, context):
+        return None, None
+
+    monkeypatch.setattr(chat_model_module, "llm_semaphore", semaphore)
+    monkeypatch.setattr(chat_model_module, "chat_model", FakeChatModel())
+    monkeypatch.setattr(chat_model_module, "_add_user_turn", add_user_turn)
+    monkeypatch.setattr(
+        chat_model_module, "_lookup_cached_response", lookup_cached_response
+    )
+
+    async def run():
+        phrases = stream_response(None, "session", "Hi")
+        first = await phrases.__anext__()
+        # The consumer is still on the first phrase, like a caller listening
+        await asyncio.sleep(0)
+        locked = semaphore.locked()
+        return [first] + [phrase async for phrase in phrases], locked
+
+    phrases, locked = asyncio.run(run())
+
+    assert phrases == ["Hello there!", "How can I help?", "Bye."]
+    assert not locked
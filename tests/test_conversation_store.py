@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from app.services.conversation_store import (
+    InMemoryConversationStore,
+    RedisConversationStore,
+)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "redis":
+        return RedisConversationStore(FakeAsyncRedis(decode_responses=True), ttl=60)
+    return InMemoryConversationStore(max_sessions=10, ttl=60)
+
+
+def test_messages_round_trip(store):
+    async def run():
+        await store.add_messages("call-1", [SystemMessage(content="Be helpful")])
+        await store.add_messages(
+            "call-1", [HumanMessage(content="Hi"), AIMessage(content="Hello!")]
+        )
+        return await store.get_messages("call-1"), await store.get_messages("call-2")
+
+    messages, other_messages = asyncio.run(run())
+
+    assert [message.content for message in messages] == ["Be helpful", "Hi", "Hello!"]
+    assert isinstance(messages[2], AIMessage)
+    assert other_messages == []
+
+
+def test_deleted_session_is_empty(store):
+    async def run():
+        await store.add_messages("call-1", [HumanMessage(content="Hi")])
+        await store.delete("call-1")
+        return await store.get_messages("call-1")
+
+    assert asyncio.run(run()) == []
+
+
+def test_in_memory_store_evicts_least_recently_used_session():
+    store = InMemoryConversationStore(max_sessions=1, ttl=60)
+
+    async def run():
+        await store.add_messages("call-1", [HumanMessage(content="Hi")])
+        await store.add_messages("call-2", [HumanMessage(content="Hey")])
+        return await store.get_messages("call-1")
+
+    assert asyncio.run(run()) == []
+
+
+def test_replace_prefix_keeps_later_messages(store):
+    async def run():
+        await store.add_messages(
+            "call-1",
+            [
+                HumanMessage(content="Hi"),
+                AIMessage(content="Hello!"),
+                HumanMessage(content="Are you open?"),
+            ],
+        )
+        await store.replace_prefix("call-1", 2, [SystemMessage(content="Greeted")])
+        return await store.get_messages("call-1")
+
+    messages = asyncio.run(run())
+
+    assert [message.content for message in messages] == ["Greeted", "Are you open?"]
@@ -0,0 +1,37 @@
+from sqlalchemy import create_engine, text
+
+from app.db.pool import (
+    PoolMetrics,
+    TimedQueuePool,
+    current_route,
+    pool_metrics,
+    track_connection_hold,
+)
+
+
+def test_pool_metrics_count_checkouts(tmp_path, monkeypatch):
+    pool_metrics["test"] = metrics = PoolMetrics("test")
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        poolclass=TimedQueuePool,
+        pool_logging_name="test",
+        pool_size=2,
+        max_overflow=0,
+    )
+    track_connection_hold(engine, "test")
+    monkeypatch.setattr("app.db.pool.settings.DB_SLOW_HOLD_SECONDS", 0)
+    token = current_route.set("GET /test")
+
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("select 1"))
+            snapshot = metrics.snapshot()
+    finally:
+        current_route.reset(token)
+        engine.dispose()
+        del pool_metrics["test"]
+
+    assert snapshot["checkouts"] == 1
+    assert snapshot["checked_out"] == 1
+    assert snapshot["size"] == 2
+    assert metrics.slow_holds == 1
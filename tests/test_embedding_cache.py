@@ -0,0 +1,82 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+import app.services.embedding_cache as embedding_cache
+from app.services.embedding_cache import (
+    CachedEmbeddings,
+    DiskEmbeddingStore,
+    normalize_text,
+)
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 1.0]
+
+
+def test_normalize_text():
+    assert normalize_text("  What are your   HOURS? ") == "what are your hours"
+
+
+def test_repeated_utterances_hit_memory_cache():
+    embeddings = CountingEmbeddings()
+    cached = CachedEmbeddings(embeddings, model="test", max_size=10, ttl=60)
+
+    first = cached.embed_query("What are your hours?")
+    second = cached.embed_query("what are your hours")
+
+    assert first == second
+    assert embeddings.calls == 1
+    assert cached.stats()["memory_hits"] == 1
+    assert cached.stats()["misses"] == 1
+
+
+def test_memory_only_cache_does_not_use_the_executor(monkeypatch):
+    async def run_blocking(func, *args, **kwargs):
+        raise AssertionError("No blocking call without a disk store")
+
+    monkeypatch.setattr(embedding_cache, "run_blocking", run_blocking)
+    embeddings = CountingEmbeddings()
+    cached = CachedEmbeddings(embeddings, model="test", max_size=10, ttl=60)
+
+    async def run():
+        return [await cached.aembed_query("Hello") for _ in range(2)]
+
+    first, second = asyncio.run(run())
+
+    assert first == second
+    assert embeddings.calls == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    embeddings = CountingEmbeddings()
+
+    cached = CachedEmbeddings(
+        embeddings,
+        model="test",
+        max_size=10,
+        ttl=60,
+        disk_store=DiskEmbeddingStore(path, ttl=60, max_entries=10),
+    )
+    vector = cached.embed_query("yes")
+
+    restarted = CachedEmbeddings(
+        embeddings,
+        model="test",
+        max_size=10,
+        ttl=60,
+        disk_store=DiskEmbeddingStore(path, ttl=60, max_entries=10),
+    )
+
+    assert restarted.embed_query("Yes.") == vector
+    assert embeddings.calls == 1
+    assert restarted.stats()["disk_hits"] == 1
@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+import openai
+from langchain_core.embeddings import Embeddings
+
+from app.services.embedding_executor import EmbeddingExecutor
+
+
+class FlakyEmbeddings(Embeddings):
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        if self.calls <= self.failures:
+            response = httpx.Response(
+                429,
+                headers={"retry-after": "0"},
+                request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"),
+            )
+            raise openai.RateLimitError(
+                "Rate limit reached", response=response, body=None
+            )
+        return self.embed_documents(texts)
+
+
+def make_executor(embeddings, max_retries=3):
+    return EmbeddingExecutor(
+        embeddings,
+        max_batch_tokens=10,
+        max_batch_size=3,
+        concurrency=2,
+        tokens_per_minute=60000,
+        max_retries=max_retries,
+        retry_backoff=0,
+    )
+
+
+def test_rate_limited_batch_is_retried():
+    embeddings = FlakyEmbeddings(failures=2)
+    executor = make_executor(embeddings)
+
+    vectors = asyncio.run(executor.embed(["ab", "abc"]))
+
+    assert vectors == [[2.0], [3.0]]
+    assert embeddings.calls == 3
+    assert executor.stats()["retries"] == 2
+
+
+def test_rate_limit_error_is_raised_after_max_retries():
+    executor = make_executor(FlakyEmbeddings(failures=5), max_retries=1)
+
+    try:
+        asyncio.run(executor.embed(["ab"]))
+    except openai.RateLimitError:
+        pass
+    else:
+        raise AssertionError("RateLimitError was not raised")
+
+
+def test_batches_are_bounded_by_tokens_and_size():
+    executor = make_executor(FlakyEmbeddings(failures=0))
+
+    assert not executor.is_full(batch_tokens=0, batch_size=0, tokens=50)
+    assert executor.is_full(batch_tokens=8, batch_size=1, tokens=3)
+    assert executor.is_full(batch_tokens=3, batch_size=3, tokens=1)
+    assert not executor.is_full(batch_tokens=3, batch_size=2, tokens=7)
@@ -0,0 +1,78 @@
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from app.services.conversation_store import InMemoryConversationStore
+from app.services.history import HistoryManager, is_summary
+
+
+def create_manager(store):
+    return HistoryManager(
+        store,
+        summary_model=FakeListChatModel(responses=["The caller asked about hours."]),
+        model_name="gpt-4o-mini",
+    )
+
+
+def add_turns(store, count):
+    async def run():
+        for i in range(count):
+            await store.add_messages(
+                "call-1",
+                [
+                    HumanMessage(content=f"Question number {i} about the shop"),
+                    AIMessage(content=f"Answer number {i} about the shop"),
+                ],
+            )
+
+    asyncio.run(run())
+
+
+def test_prompt_keeps_latest_turns_within_budget():
+    store = InMemoryConversationStore(max_sessions=10, ttl=60)
+    manager = create_manager(store)
+    add_turns(store, 20)
+    budget = 150
+
+    async def run():
+        prompt = await manager.build_prompt(
+            "call-1",
+            SystemMessage(content="Be helpful"),
+            HumanMessage(content="What time do you close?"),
+            budget=budget,
+        )
+        await manager.end("call-1")
+        return prompt
+
+    prompt = asyncio.run(run())
+
+    assert manager.count_tokens(prompt) <= budget
+    assert prompt[0].content == "Be helpful"
+    assert prompt[-1].content == "What time do you close?"
+    assert prompt[-2].content == "Answer number 19 about the shop"
+    assert len(prompt) < 42
+
+
+def test_old_turns_are_folded_into_summary():
+    store = InMemoryConversationStore(max_sessions=10, ttl=60)
+    manager = create_manager(store)
+    add_turns(store, 20)
+
+    async def run():
+        await manager.build_prompt(
+            "call-1",
+            SystemMessage(content="Be helpful"),
+            HumanMessage(content="What time do you close?"),
+            budget=150,
+        )
+        await asyncio.gather(*manager._summary_tasks.values())
+        return await store.get_messages("call-1")
+
+    messages = asyncio.run(run())
+
+    assert is_summary(messages[0])
+    assert "The caller asked about hours." in messages[0].content
+    assert messages[-1].content == "Answer number 19 about the shop"
+    assert manager.count_tokens(messages[1:]) <= 75
+    assert manager.stats()["summaries"] == 1
@@ -0,0 +1,488 @@
+import asyncio
+import hashlib
+import time
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+import app.services.ingestion as ingestion
+from app.crud.ingestion_job import (
+    cancel_ingestion_job_service,
+    retry_ingestion_job_service,
+)
+from app.models.ingestion_job import IngestionJob
+from app.models.knowledge_document import KnowledgeDocument
+from app.schemas.ingestion import IngestionStatus
+from app.services.embedding_executor import EmbeddingExecutor
+from app.services.ingestion import IngestionQueue, get_chunk_id
+
+
+ASSISTANT_ID = uuid.uuid4()
+FINISHED = (
+    IngestionStatus.succeeded,
+    IngestionStatus.failed,
+    IngestionStatus.cancelled,
+)
+
+
+class GatedEmbeddings(Embeddings):
+    """
+    Records the embedded texts. Texts starting with "block" wait for their
+    gate to be set and batches containing "fail" raise.
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.gates = defaultdict(asyncio.Event)
+
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+    async def aembed_documents(self, texts):
+        for text in texts:
+            if text.startswith("block"):
+                await self.gates[text].wait()
+        if "fail" in texts:
+            raise RuntimeError("Embedding failed")
+        self.texts.extend(texts)
+        return self.embed_documents(texts)
+
+
+class FakeKnowledgeBase:
+    """
+    In-memory job table, document manifest and Chroma collection behind the
+    ingestion queue.
+    """
+
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.jobs: dict[uuid.UUID, IngestionJob] = {}
+        self.documents: dict[str, KnowledgeDocument] = {}
+        self.chunks: dict[str, dict] = {}
+        self.pages: dict[str, list[list[str]]] = {}
+        self.refreshed_indexes: list[str] = []
+        self.embeddings = GatedEmbeddings()
+        self.executor = EmbeddingExecutor(
+            self.embeddings,
+            max_batch_tokens=1000,
+            max_batch_size=1,
+            concurrency=4,
+            tokens_per_minute=10**9,
+            max_retries=0,
+            retry_backoff=0,
+        )
+
+    def add_job(self, pages: list[list[str]], file_name: str = "faq.pdf"):
+        job_id = uuid.uuid4()
+        path = self.tmp_path / f"{job_id}.pdf"
+        path.write_bytes(b"%PDF-" + repr(pages).encode())
+        job = IngestionJob(
+            id=job_id,
+            assistant_id=ASSISTANT_ID,
+            file_name=file_name,
+            file_path=str(path),
+            content_hash=hashlib.sha256(repr(pages).encode()).hexdigest(),
+            status=IngestionStatus.queued,
+            parsed_pages=0,
+            processed_chunks=0,
+            reused_chunks=0,
+            attempts=0,
+            chunk_hashes=[],
+        )
+        self.jobs[job_id] = job
+        self.pages[str(path)] = pages
+        return job
+
+    # Ingestion job CRUD
+
+    async def get_ingestion_job(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def get_queued_ingestion_job_ids(self):
+        return [
+            job.id for job in self.jobs.values() if job.status == IngestionStatus.queued
+        ]
+
+    def _update_job(self, job_id, expected_status, **values):
+        job = self.jobs.get(job_id)
+        if job is None or job.status != expected_status:
+            return False
+        for key, value in values.items():
+            setattr(job, key, value)
+        return True
+
+    async def claim_ingestion_job(self, job_id):
+        if not self._update_job(
+            job_id,
+            IngestionStatus.queued,
+            status=IngestionStatus.running,
+            chunk_hashes=[],
+        ):
+            return False
+        self.jobs[job_id].attempts += 1
+        return True
+
+    async def claim_chunk_hashes(self, session, job_id, chunk_hashes):
+        job = self.jobs.get(job_id)
+        return self._update_job(
+            job_id,
+            IngestionStatus.running,
+            chunk_hashes=job.chunk_hashes + chunk_hashes,
+        )
+
+    async def requeue_ingestion_job(self, job_id):
+        return self._update_job(
+            job_id, IngestionStatus.running, status=IngestionStatus.queued
+        )
+
+    async def update_ingestion_progress(self, job_id, **values):
+        return self._update_job(job_id, IngestionStatus.running, **values)
+
+    async def finish_ingestion_job(self, job_id, job_status, error=None, **values):
+        return self._update_job(
+            job_id, IngestionStatus.running, status=job_status, error=error, **values
+        )
+
+    # Document manifest CRUD
+
+    async def get_document_by_hash(self, assistant_id, content_hash):
+        for document in self.documents.values():
+            if document.content_hash == content_hash:
+                return document
+        return None
+
+    async def get_referenced_chunk_hashes(self, session, assistant_id):
+        claimed = [
+            job.chunk_hashes
+            for job in self.jobs.values()
+            if job.status in (IngestionStatus.queued, IngestionStatus.running)
+        ]
+        return {
+            chunk_hash
+            for chunk_hashes in claimed
+            + [document.chunk_hashes for document in self.documents.values()]
+            for chunk_hash in chunk_hashes
+        }
+
+    @asynccontextmanager
+    async def lock_knowledge_base(self, assistant_id):
+        yield
+
+    async def complete_document_ingestion(self, job, chunk_hashes, size_bytes):
+        if not self._update_job(
+            job.id, IngestionStatus.running, status=IngestionStatus.succeeded
+        ):
+            return None
+        previous = self.documents.get(job.file_name)
+        previous_hashes = set(previous.chunk_hashes) if previous else set()
+        document = KnowledgeDocument(
+            id=uuid.uuid4(),
+            assistant_id=job.assistant_id,
+            file_name=job.file_name,
+            content_hash=job.content_hash,
+            chunk_hashes=chunk_hashes,
+            chunk_count=len(chunk_hashes),
+            size_bytes=size_bytes,
+        )
+        self.documents[job.file_name] = document
+        job.document_id = document.id
+        referenced = await self.get_referenced_chunk_hashes(None, job.assistant_id)
+        return sorted(previous_hashes - referenced)
+
+    # Vector store
+
+    def iter_document_chunks(self, path, title):
+        for page, texts in enumerate(self.pages[path]):
+            yield [
+                Document(page_content=text, metadata={"title": title, "page": page})
+                for text in texts
+            ]
+
+    def get_embedding_executor(self):
+        return self.executor
+
+    def add_embedded_chunks(self, collection_name, ids, chunks, embeddings):
+        for chunk_id, chunk in zip(ids, chunks):
+            self.chunks[chunk_id] = chunk.metadata
+
+    def get_existing_chunk_ids(self, collection_name, ids):
+        return [chunk_id for chunk_id in ids if chunk_id in self.chunks]
+
+    def delete_chunks(self, collection_name, ids):
+        for chunk_id in ids:
+            self.chunks.pop(chunk_id, None)
+
+    def delete_job_chunks(self, collection_name, job_id, keep):
+        self.delete_chunks(
+            collection_name,
+            [
+                chunk_id
+                for chunk_id, metadata in self.chunks.items()
+                if metadata["job_id"] == job_id and chunk_id not in keep
+            ],
+        )
+
+    def refresh_lexical_index(self, collection_name):
+        self.refreshed_indexes.append(collection_name)
+
+
+@pytest.fixture
+def knowledge_base(tmp_path, monkeypatch):
+    knowledge_base = FakeKnowledgeBase(tmp_path)
+    monkeypatch.setattr(ingestion.settings, "INGESTION_UPLOAD_DIR", str(tmp_path))
+    for name in (
+        "get_ingestion_job",
+        "get_queued_ingestion_job_ids",
+        "claim_ingestion_job",
+        "claim_chunk_hashes",
+        "lock_knowledge_base",
+        "requeue_ingestion_job",
+        "update_ingestion_progress",
+        "finish_ingestion_job",
+        "get_document_by_hash",
+        "get_referenced_chunk_hashes",
+        "complete_document_ingestion",
+        "iter_document_chunks",
+        "get_embedding_executor",
+        "add_embedded_chunks",
+        "get_existing_chunk_ids",
+        "delete_chunks",
+        "delete_job_chunks",
+        "refresh_lexical_index",
+    ):
+        monkeypatch.setattr(ingestion, name, getattr(knowledge_base, name))
+    return knowledge_base
+
+
+async def wait_until(predicate, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_job_parses_embeds_and_writes_chunks(knowledge_base):
+    job = knowledge_base.add_job([["hours", "pricing"], ["pricing", "parking"]])
+
+    async def run():
+        queue = IngestionQueue(workers=1, embed_concurrency=2)
+        await queue.start()
+        await wait_until(lambda: job.status in FINISHED)
+        await queue.stop()
+
+    asyncio.run(run())
+
+    chunk_ids = [get_chunk_id(text) for text in ("hours", "pricing", "parking")]
+    assert job.status == IngestionStatus.succeeded
+    assert (job.parsed_pages, job.total_chunks, job.processed_chunks) == (2, 3, 3)
+    assert knowledge_base.documents["faq.pdf"].chunk_hashes == chunk_ids
+    assert set(knowledge_base.chunks) == set(chunk_ids)
+    assert knowledge_base.chunks[chunk_ids[0]]["job_id"] == str(job.id)
+    assert sorted(knowledge_base.embeddings.texts) == ["hours", "parking", "pricing"]
+    assert not (knowledge_base.tmp_path / f"{job.id}.pdf").exists()
+    assert knowledge_base.refreshed_indexes == [str(job.assistant_id)]
+
+
+def test_stop_requeues_running_job(knowledge_base):
+    job = knowledge_base.add_job([["hours"], ["block"]])
+
+    async def run():
+        queue = IngestionQueue(workers=1, embed_concurrency=2)
+        await queue.start()
+        await wait_until(lambda: get_chunk_id("hours") in knowledge_base.chunks)
+        await queue.stop()
+        stopped_status = job.status
+
+        knowledge_base.embeddings.gates["block"].set()
+        await queue.start()
+        await wait_until(lambda: job.status in FINISHED)
+        await queue.stop()
+        return stopped_status
+
+    assert asyncio.run(run()) == IngestionStatus.queued
+    assert job.status == IngestionStatus.succeeded
+    assert job.attempts == 2
+    # The chunk written before the restart was not embedded again
+    assert job.reused_chunks == 1
+    assert knowledge_base.embeddings.texts.count("hours") == 1
+
+
+def test_cancel_stops_running_job_and_removes_its_chunks(knowledge_base):
+    job = knowledge_base.add_job([["hours"], ["block"]])
+
+    async def run():
+        queue = IngestionQueue(workers=1, embed_concurrency=2)
+        await queue.start()
+        await wait_until(lambda: get_chunk_id("hours") in knowledge_base.chunks)
+        job.status = IngestionStatus.cancelled
+        queue.cancel(job.id)
+        await wait_until(lambda: not queue._running)
+        await queue.stop()
+
+    asyncio.run(run())
+
+    assert job.status == IngestionStatus.cancelled
+    assert knowledge_base.chunks == {}
+    assert knowledge_base.documents == {}
+
+
+def test_failed_job_removes_its_chunks(knowledge_base):
+    job = knowledge_base.add_job([["hours"], ["fail"]])
+
+    async def run():
+        queue = IngestionQueue(workers=1, embed_concurrency=2)
+        await queue.start()
+        await wait_until(lambda: job.status in FINISHED and not queue._running)
+        await queue.stop()
+
+    asyncio.run(run())
+
+    assert job.status == IngestionStatus.failed
+    assert job.error == "Embedding failed"
+    assert knowledge_base.chunks == {}
+    # The upload is kept for a retry
+    assert (knowledge_base.tmp_path / f"{job.id}.pdf").exists()
+
+
+def run_jobs(knowledge_base, *jobs):
+    async def run():
+        queue = IngestionQueue(workers=1, embed_concurrency=2)
+        await queue.start()
+        await wait_until(lambda: all(job.status in FINISHED for job in jobs))
+        await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_chunks_shared_with_another_document_are_reused(knowledge_base):
+    first = knowledge_base.add_job([["hours", "pricing"]], file_name="faq.pdf")
+    run_jobs(knowledge_base, first)
+    second = knowledge_base.add_job([["pricing", "parking"]], file_name="plans.pdf")
+    run_jobs(knowledge_base, second)
+
+    assert second.status == IngestionStatus.succeeded
+    assert (second.processed_chunks, second.reused_chunks) == (2, 1)
+    assert knowledge_base.embeddings.texts.count("pricing") == 1
+    assert knowledge_base.documents["plans.pdf"].chunk_hashes == [
+        get_chunk_id("pricing"),
+        get_chunk_id("parking"),
+    ]
+
+
+def test_identical_document_is_not_ingested_again(knowledge_base):
+    first = knowledge_base.add_job([["hours", "pricing"]], file_name="faq.pdf")
+    run_jobs(knowledge_base, first)
+    copy = knowledge_base.add_job([["hours", "pricing"]], file_name="copy.pdf")
+    run_jobs(knowledge_base, copy)
+
+    assert copy.status == IngestionStatus.succeeded
+    assert copy.document_id == knowledge_base.documents["faq.pdf"].id
+    assert copy.reused_chunks == 2
+    assert list(knowledge_base.documents) == ["faq.pdf"]
+    assert len(knowledge_base.embeddings.texts) == 2
+
+
+def test_new_version_removes_chunks_only_the_old_one_used(knowledge_base):
+    shared = knowledge_base.add_job([["pricing"]], file_name="plans.pdf")
+    old = knowledge_base.add_job([["hours", "pricing"]], file_name="faq.pdf")
+    run_jobs(knowledge_base, shared, old)
+    new = knowledge_base.add_job([["opening hours", "pricing"]], file_name="faq.pdf")
+    run_jobs(knowledge_base, new)
+
+    assert new.status == IngestionStatus.succeeded
+    assert set(knowledge_base.chunks) == {
+        get_chunk_id("pricing"),
+        get_chunk_id("opening hours"),
+    }
+
+
+def test_chunks_reused_by_a_running_job_are_not_deleted(knowledge_base):
+    failing = knowledge_base.add_job(
+        [["pricing"], ["block failing"], ["fail"]], file_name="plans.pdf"
+    )
+    running = knowledge_base.add_job(
+        [["pricing"], ["block running"]], file_name="faq.pdf"
+    )
+    running.status = IngestionStatus.cancelled
+    gates = knowledge_base.embeddings.gates
+
+    async def run():
+        queue = IngestionQueue(workers=2, embed_concurrency=1)
+        await queue.start()
+        await wait_until(lambda: get_chunk_id("pricing") in knowledge_base.chunks)
+        running.status = IngestionStatus.queued
+        queue.enqueue(running.id)
+        # The running job reuses the chunk the failing job wrote
+        await wait_until(lambda: running.reused_chunks == 1)
+
+        gates["block failing"].set()
+        await wait_until(lambda: failing.status in FINISHED)
+        await wait_until(lambda: failing.id not in queue._running)
+        kept = get_chunk_id("pricing") in knowledge_base.chunks
+
+        gates["block running"].set()
+        await wait_until(lambda: running.status in FINISHED)
+        await queue.stop()
+        return kept
+
+    assert asyncio.run(run()) is True
+    assert failing.status == IngestionStatus.failed
+    assert running.status == IngestionStatus.succeeded
+    assert get_chunk_id("pricing") in knowledge_base.chunks
+
+
+def test_missing_job_is_skipped(knowledge_base):
+    queue = IngestionQueue(workers=1, embed_concurrency=2)
+
+    asyncio.run(queue._run(uuid.uuid4()))
+
+
+class FakeSession:
+    async def commit(self):
+        pass
+
+    async def refresh(self, instance):
+        pass
+
+
+def test_retry_resets_failed_job():
+    job = IngestionJob(
+        status=IngestionStatus.failed,
+        error="Rate limit reached",
+        parsed_pages=3,
+        total_chunks=10,
+        processed_chunks=4,
+        reused_chunks=1,
+    )
+
+    asyncio.run(retry_ingestion_job_service(FakeSession(), job))
+
+    assert job.status == IngestionStatus.queued
+    assert job.error is None
+    assert (job.parsed_pages, job.total_chunks, job.processed_chunks) == (0, None, 0)
+
+
+@pytest.mark.parametrize(
+    "service, job_status",
+    [
+        (retry_ingestion_job_service, IngestionStatus.running),
+        (retry_ingestion_job_service, IngestionStatus.succeeded),
+        (cancel_ingestion_job_service, IngestionStatus.succeeded),
+    ],
+)
+def test_invalid_status_transitions_conflict(service, job_status):
+    job = IngestionJob(status=job_status)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service(FakeSession(), job))
+
+    assert error.value.status_code == 409
+    assert job.status == job_status
@@ -0,0 +1,187 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+import app.crud.ingestion_job as ingestion_job_crud
+import app.crud.knowledge_document as knowledge_document_crud
+from app.crud.ingestion_job import claim_chunk_hashes, get_ingestion_job
+from app.crud.knowledge_document import (
+    complete_document_ingestion,
+    delete_document_service,
+    lock_knowledge_base,
+)
+from app.models import User
+from app.models.assistant import Assistant
+from app.models.ingestion_job import IngestionJob
+from app.models.knowledge_document import KnowledgeDocument
+from app.schemas.ingestion import IngestionStatus
+
+
+@pytest.fixture
+def sessions(db_engine, monkeypatch):
+    # NullPool, since every test runs its own event loop
+    engine = create_async_engine(
+        db_engine.url.set(drivername="postgresql+psycopg"), poolclass=NullPool
+    )
+    sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    monkeypatch.setattr(knowledge_document_crud, "AsyncSessionLocal", sessions)
+    monkeypatch.setattr(ingestion_job_crud, "AsyncSessionLocal", sessions)
+    return sessions
+
+
+@pytest.fixture
+def assistant_id(sessions):
+    async def create():
+        async with sessions() as session:
+            user = User(email=f"{uuid.uuid4().hex}@dev.com")
+            session.add(user)
+            await session.flush()
+            assistant = Assistant(system_instructions="Be helpful", user_id=user.id)
+            session.add(assistant)
+            await session.commit()
+            return user.id, assistant.id
+
+    async def remove(user_id):
+        async with sessions() as session:
+            await session.execute(delete(User).where(User.id == user_id))
+            await session.commit()
+
+    user_id, assistant_id = asyncio.run(create())
+    yield assistant_id
+    asyncio.run(remove(user_id))
+
+
+def make_document(assistant_id, file_name, chunk_hashes):
+    return KnowledgeDocument(
+        assistant_id=assistant_id,
+        file_name=file_name,
+        content_hash=file_name,
+        chunk_hashes=chunk_hashes,
+        chunk_count=len(chunk_hashes),
+    )
+
+
+def make_job(assistant_id, job_status, chunk_hashes, file_name="new.pdf"):
+    return IngestionJob(
+        assistant_id=assistant_id,
+        file_name=file_name,
+        file_path=file_name,
+        content_hash=file_name,
+        status=job_status,
+        chunk_hashes=chunk_hashes,
+    )
+
+
+def test_delete_keeps_chunks_of_other_documents_and_unfinished_jobs(
+    sessions, assistant_id
+):
+    async def run():
+        document = make_document(assistant_id, "faq.pdf", ["a", "b", "c", "d"])
+        async with sessions() as session:
+            session.add_all(
+                [
+                    document,
+                    make_document(assistant_id, "plans.pdf", ["c"]),
+                    make_job(assistant_id, IngestionStatus.running, ["b"]),
+                    make_job(assistant_id, IngestionStatus.failed, ["a"]),
+                ]
+            )
+            await session.commit()
+
+        async with sessions() as session:
+            return await delete_document_service(session, assistant_id, document.id)
+
+    assert sorted(asyncio.run(run())) == ["a", "d"]
+
+
+def test_claimed_chunks_accumulate_while_running(sessions, assistant_id):
+    async def claim(job_id, chunk_hashes):
+        async with lock_knowledge_base(assistant_id) as session:
+            return await claim_chunk_hashes(session, job_id, chunk_hashes)
+
+    async def run():
+        job = make_job(assistant_id, IngestionStatus.running, [])
+        async with sessions() as session:
+            session.add(job)
+            await session.commit()
+
+        claimed = [await claim(job.id, ["a", "b"]), await claim(job.id, ["c"])]
+        chunk_hashes = (await get_ingestion_job(job.id)).chunk_hashes
+
+        async with sessions() as session:
+            (await session.get(IngestionJob, job.id)).status = IngestionStatus.cancelled
+            await session.commit()
+        claimed.append(await claim(job.id, ["d"]))
+        return claimed, chunk_hashes
+
+    claimed, chunk_hashes = asyncio.run(run())
+
+    assert claimed == [True, True, False]
+    assert chunk_hashes == ["a", "b", "c"]
+
+
+def test_claim_is_rolled_back_when_the_locked_block_fails(sessions, assistant_id):
+    async def run():
+        job = make_job(assistant_id, IngestionStatus.running, ["a"])
+        async with sessions() as session:
+            session.add(job)
+            await session.commit()
+
+        with pytest.raises(RuntimeError):
+            async with lock_knowledge_base(assistant_id) as session:
+                await claim_chunk_hashes(session, job.id, ["b"])
+                raise RuntimeError("Chroma is unavailable")
+        # The failed block released the lock
+        async with lock_knowledge_base(assistant_id):
+            pass
+        return (await get_ingestion_job(job.id)).chunk_hashes
+
+    assert asyncio.run(run()) == ["a"]
+
+
+def test_new_version_returns_chunks_only_the_old_one_used(sessions, assistant_id):
+    async def run():
+        job = make_job(
+            assistant_id, IngestionStatus.running, ["b", "e"], file_name="faq.pdf"
+        )
+        async with sessions() as session:
+            session.add_all(
+                [
+                    make_document(assistant_id, "faq.pdf", ["a", "b", "c"]),
+                    make_document(assistant_id, "plans.pdf", ["c"]),
+                    job,
+                ]
+            )
+            await session.commit()
+
+        removed = await complete_document_ingestion(job, ["b", "e"], size_bytes=10)
+        updated = await get_ingestion_job(job.id)
+        return removed, updated
+
+    removed, job = asyncio.run(run())
+
+    assert removed == ["a"]
+    assert job.status == IngestionStatus.succeeded
+    assert job.document_id is not None
+
+
+def test_knowledge_base_lock_is_held_by_one_task_at_a_time(sessions, assistant_id):
+    events = []
+
+    async def hold(name):
+        async with lock_knowledge_base(assistant_id):
+            events.append(f"{name} acquired")
+            await asyncio.sleep(0.1)
+            events.append(f"{name} released")
+
+    async def run():
+        await asyncio.gather(hold("first"), hold("second"))
+
+    asyncio.run(run())
+
+    assert events[0].split()[0] == events[1].split()[0]
+    assert events[2].split()[0] == events[3].split()[0]
@@ -0,0 +1,6 @@
+def test_lifespan_starts_and_health_reports_ready(client):
+    # The client fixture runs the app lifespan off the main thread
+    response = client.get("/health")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
@@ -0,0 +1,23 @@
+from app.api.deps import get_current_active_superuser
+from app.main import app
+
+
+def test_cache_metrics_cover_every_cache(client):
+    app.dependency_overrides[get_current_active_superuser] = lambda: None
+    try:
+        response = client.get("api/v1/monitoring/caches")
+    finally:
+        app.dependency_overrides.pop(get_current_active_superuser)
+
+    assert response.status_code == 200
+    metrics = response.json()
+    assert set(metrics) == {
+        "query_embeddings",
+        "response_cache",
+        "assistant_configs",
+        "history",
+        "retrieval",
+        "embedding_executor",
+    }
+    assert "hit_rate" in metrics["response_cache"]
+    assert "avg_prompt_tokens" in metrics["history"]
@@ -0,0 +1,32 @@
+import app.services.rag as rag
+from app.core.cache import LRUCache
+
+
+class FakeChromaClient:
+    def __init__(self):
+        self.opened = []
+        self.deleted = []
+
+    def get_collection(self, name):
+        self.opened.append(name)
+        return object()
+
+    def get_or_create_collection(self, name):
+        return self.get_collection(name)
+
+    def delete_collection(self, name):
+        self.deleted.append(name)
+
+
+def test_collection_handles_are_cached_until_the_store_is_deleted(monkeypatch):
+    client = FakeChromaClient()
+    monkeypatch.setattr(rag, "chroma_client", client)
+    monkeypatch.setattr(rag, "collections", LRUCache(max_size=2))
+
+    first = rag.get_collection("assistant")
+    assert rag.get_collection("assistant") is first
+
+    rag.delete_vector_store("assistant")
+    assert rag.get_collection("assistant", create=True) is not first
+    assert client.opened == ["assistant", "assistant"]
+    assert client.deleted == ["assistant"]
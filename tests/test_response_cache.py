@@ -0,0 +1,47 @@
+from uuid import uuid4
+
+from app.models.assistant import Assistant
+from app.services.response_cache import ResponseCache
+
+
+def make_cache() -> ResponseCache:
+    return ResponseCache(
+        similarity_threshold=0.95,
+        ttl=60,
+        max_entries_per_assistant=2,
+        max_assistants=10,
+    )
+
+
+def test_similar_question_with_same_context_hits():
+    cache = make_cache()
+    assistant = Assistant(id=uuid4(), system_instructions="Be helpful")
+
+    cache.store(assistant, [1.0, 0.0], "opening hours", "We open at nine.")
+
+    assert cache.lookup(assistant, [0.99, 0.05], "opening hours") == "We open at nine."
+    assert cache.lookup(assistant, [0.99, 0.05], "pricing") is None
+    assert cache.lookup(assistant, [0.0, 1.0], "opening hours") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_changed_system_instructions_invalidate_entries():
+    cache = make_cache()
+    assistant = Assistant(id=uuid4(), system_instructions="Be helpful")
+    cache.store(assistant, [1.0, 0.0], "", "Hello!")
+
+    assistant.system_instructions = "Be brief"
+
+    assert cache.lookup(assistant, [1.0, 0.0], "") is None
+
+
+def test_oldest_entries_are_evicted():
+    cache = make_cache()
+    assistant = Assistant(id=uuid4(), system_instructions="Be helpful")
+    cache.store(assistant, [1.0, 0.0], "a", "first")
+    cache.store(assistant, [1.0, 0.0], "b", "second")
+    cache.store(assistant, [1.0, 0.0], "c", "third")
+
+    assert cache.lookup(assistant, [1.0, 0.0], "a") is None
+    assert cache.lookup(assistant, [1.0, 0.0], "c") == "third"
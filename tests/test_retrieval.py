@@ -0,0 +1,99 @@
+import threading
+import time
+
+import tiktoken
+
+import app.services.retrieval as retrieval
+from app.services.retrieval import (
+    BM25Index,
+    RetrievedChunk,
+    get_similarity,
+    lexical_search,
+    pack_context,
+    reciprocal_rank_fusion,
+)
+
+
+class FakeCollection:
+    def __init__(self, documents: dict[str, str]):
+        self.documents = documents
+        self.scanned = threading.Event()
+
+    def count(self):
+        return len(self.documents)
+
+    def get(self, include):
+        self.scanned.set()
+        return {
+            "ids": list(self.documents),
+            "documents": list(self.documents.values()),
+        }
+
+
+def test_bm25_ranks_matching_chunks_and_ignores_stopwords():
+    index = BM25Index(
+        ["hours", "pricing", "parking"],
+        [
+            "We are open from nine to five on weekdays. Opening hours vary on holidays.",
+            "The basic plan costs ten dollars per month.",
+            "Parking is free for customers.",
+        ],
+    )
+
+    results = index.search("What are your opening hours?", k=3)
+
+    assert [chunk_id for chunk_id, _ in results] == ["hours"]
+    assert index.search("what are your", k=3) == []
+
+
+def test_reciprocal_rank_fusion_prefers_chunks_found_by_both_searches():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=60)
+
+    assert [chunk_id for chunk_id, _ in fused] == ["c", "a", "b", "d"]
+
+
+def test_pack_context_stays_within_budget_without_metadata():
+    encoding = tiktoken.get_encoding("o200k_base")
+    chunks = [
+        RetrievedChunk(
+            "1", "Opening  hours\nare nine to five.", {"title": "faq.pdf", "page": 0}
+        ),
+        RetrievedChunk("2", "word " * 200, {"title": "long.pdf"}),
+        RetrievedChunk("3", "Parking is free.", {"title": "faq.pdf", "job_id": "x"}),
+    ]
+
+    context = pack_context(chunks, budget=40, encoding=encoding)
+
+    assert context == (
+        "[faq.pdf, page 1] Opening hours are nine to five.\n\n"
+        "[faq.pdf] Parking is free."
+    )
+
+
+def test_similarity_of_each_chroma_space():
+    assert get_similarity(0.5, "l2") == 0.75
+    assert get_similarity(0.2, "ip") == 0.8
+    assert get_similarity(0.2, "cosine") == 0.8
+
+
+def test_lexical_search_builds_missing_index_in_the_background(monkeypatch):
+    collection = FakeCollection({"hours": "Opening hours are nine to five."})
+    monkeypatch.setattr(retrieval, "get_collection", lambda name: collection)
+    retrieval.invalidate_lexical_index("faq")
+
+    # The turn that finds no index does not wait for the collection scan
+    assert lexical_search("faq", "opening hours", k=3) == []
+    assert collection.scanned.wait(timeout=5)
+    deadline = time.monotonic() + 5
+    while "faq" not in retrieval.lexical_indexes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [chunk_id for chunk_id, _ in lexical_search("faq", "hours", k=3)] == [
+        "hours"
+    ]
+
+    # A stale index is still searched while it is rebuilt
+    collection.documents["parking"] = "Parking is free."
+    assert [chunk_id for chunk_id, _ in lexical_search("faq", "hours", k=3)] == [
+        "hours"
+    ]
+    retrieval.invalidate_lexical_index("faq")
@@ -0,0 +1,62 @@
+import asyncio
+
+from app.core import telemetry as telemetry_module
+from app.core.telemetry import Histogram, Telemetry, record, span, start_turn
+
+
+def test_histogram_percentiles_and_prometheus_buckets():
+    metrics = Telemetry()
+    for milliseconds in range(1, 101):
+        metrics.observe("llm_first_token", milliseconds / 1000)
+
+    snapshot = metrics.snapshot()["llm_first_token"]
+    rendered = metrics.render_prometheus()
+
+    assert snapshot["count"] == 100
+    assert snapshot["p50"] == 0.051
+    assert snapshot["p95"] == 0.096
+    assert snapshot["p99"] == 0.1
+    assert (
+        'voice_stage_duration_seconds_bucket{stage="llm_first_token",le="0.01"} 10'
+        in rendered
+    )
+    assert (
+        'voice_stage_duration_seconds_bucket{stage="llm_first_token",le="+Inf"} 100'
+        in rendered
+    )
+    assert 'voice_stage_duration_seconds_count{stage="llm_first_token"} 100' in rendered
+
+
+def test_empty_histogram_has_no_percentiles():
+    assert Histogram().snapshot() == {"count": 0, "sum": 0.0}
+
+
+def test_turn_collects_spans_from_child_tasks(monkeypatch):
+    metrics = Telemetry()
+    monkeypatch.setattr(telemetry_module, "telemetry", metrics)
+
+    async def synthesize():
+        with span("tts_complete", characters=5):
+            await asyncio.sleep(0)
+
+    async def respond():
+        with start_turn("call", 1) as turn:
+            with span("retrieval"):
+                await asyncio.sleep(0)
+            await asyncio.create_task(synthesize())
+            turn.mark_once("first_audio")
+            turn.mark_once("first_audio")
+        return turn
+
+    turn = asyncio.run(respond())
+    # Outside of a turn stages only go to the histograms
+    record("stt_final", 0.0, 0.5)
+
+    assert [span["name"] for span in turn.spans] == [
+        "retrieval",
+        "tts_complete",
+        "first_audio",
+    ]
+    assert turn.spans[1]["characters"] == 5
+    assert metrics.snapshot()["turn"]["count"] == 1
+    assert metrics.snapshot()["stt_final"]["count"] == 1
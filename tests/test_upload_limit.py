@@ -0,0 +1,46 @@
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.core.middleware import UploadSizeLimitMiddleware
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=1024)
+
+    @app.post("/upload_document")
+    async def upload_document(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return TestClient(app)
+
+
+def test_small_upload_is_accepted():
+    response = make_client().post(
+        "/upload_document", files={"file": ("doc.pdf", b"%PDF-" + b"a" * 100)}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"size": 105}
+
+
+def test_large_upload_is_rejected_from_content_length():
+    response = make_client().post(
+        "/upload_document", files={"file": ("doc.pdf", b"a" * 4096)}
+    )
+
+    assert response.status_code == 413
+
+
+def test_streamed_upload_is_rejected_once_over_limit():
+    def body():
+        for _ in range(8):
+            yield b"a" * 512
+
+    response = make_client().post(
+        "/upload_document",
+        content=body(),
+        headers={"content-type": "multipart/form-data; boundary=x"},
+    )
+
+    assert response.status_code == 413